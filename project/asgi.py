@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once django is set up
+from solver.admission import limit_body  # noqa: E402
+from solver.stream import STREAM_PATH, stream_application  # noqa: E402
+
+# bodies over the limit of their endpoint are refused before django reads them
+django_application = limit_body(django_application)
+
+
+async def application(scope, receive, send):
+    # live camera frames are solved over a websocket, everything else is django
+    if scope["type"] == "websocket" and scope["path"] == STREAM_PATH:
+        await stream_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
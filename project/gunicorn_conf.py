@@ -0,0 +1,58 @@
+"""
+Gunicorn config of the production server.
+
+Start it with ``python manage.py runprod`` or
+``gunicorn -c project/gunicorn_conf.py``. Settings come from GUNICORN_*
+environment variables or project/.env, see project/.env.example. Variables
+already set in the environment win over the file.
+
+The application is imported and warmed in the master, then workers are
+forked from it and share its memory copy-on-write. Each worker limits its
+TensorFlow and OpenCV threads to its share of the cores and loads the model
+before it accepts requests.
+"""
+
+import environ
+import multiprocessing
+import os
+
+# gunicorn reads this before Django loads its settings
+environ.Env.read_env(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "0")) or multiprocessing.cpu_count()
+# uvicorn workers serve the ASGI application, websocket streams included
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+wsgi_app = os.environ.get("GUNICORN_APP", "project.asgi:application")
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+# restart workers now and then to bound memory growth, jittered so they do not restart together
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+preload_app = True
+accesslog = "-"
+
+# thread pool size of every worker
+threads_per_worker = int(os.environ.get("GUNICORN_WORKER_THREADS", "0"))
+
+
+def when_ready(server):
+    # master, after the application is imported and before workers are forked
+    from solver.server import warm_up_master
+
+    warm_up_master()
+    server.log.info("Warmed up master before forking %s workers", server.num_workers)
+
+
+def post_fork(server, worker):
+    from solver.server import configure_worker, worker_threads
+
+    threads = threads_per_worker or worker_threads(server.num_workers)
+    configure_worker(threads)
+    worker.log.info("Worker %s limited to %s threads", worker.pid, threads)
+
+
+def post_worker_init(worker):
+    from solver.server import warm_up_worker
+
+    if warm_up_worker():
+        worker.log.info("Worker %s loaded prediction model", worker.pid)
@@ -24,6 +24,36 @@ env = environ.Env(
     CORS_ALLOW_ALL_ORIGINS=(bool,False),
     CORS_ALLOWED_ORIGINS=(list, []),
     SECRET_KEY=(str,""),
+    SOLVER_IMAGE_QUALITY=(int, 95),
+    SOLVER_MAX_DIMENSION=(int, 0),
+    SOLVER_BATCH_MAX_FILES=(int, 32),
+    SOLVER_BATCH_WORKERS=(int, 0),
+    SOLVER_STREAM_KEYFRAME_INTERVAL=(int, 30),
+    SOLVER_STREAM_MAX_DIMENSION=(int, 640),
+    SOLVER_STREAM_QUALITY=(int, 80),
+    SOLVER_GRID_CACHE_SIZE=(int, 256),
+    SOLVER_GRID_CACHE_DISTANCE=(int, 48),
+    SOLVER_UPLOAD_MAX_BYTES=(int, 10485760),
+    SOLVER_UPLOAD_MAX_PIXELS=(int, 50000000),
+    SOLVER_PROFILE_DIR=(str, ""),
+    SOLVER_PROFILE_MAX_FILES=(int, 100),
+    SOLVER_PROFILE_TOKEN=(str, ""),
+    SOLVER_ENGINE=(str, "auto"),
+    SOLVER_MAX_NODES=(int, 1000000),
+    SOLVER_PORTFOLIO_STRATEGIES=(str, ""),
+    SOLVER_PORTFOLIO_DEADLINE_MS=(int, 0),
+    SOLVER_JOB_DIR=(str, ""),
+    SOLVER_JOB_MAX_FILES=(int, 100),
+    SOLVER_JOB_MAX_GRIDS=(int, 100000),
+    SOLVER_JOB_MAX_ATTEMPTS=(int, 3),
+    SOLVER_JOB_LEASE_SECONDS=(int, 300),
+    SOLVER_JOB_TTL_SECONDS=(int, 86400),
+    SOLVER_JOURNAL_DIR=(str, ""),
+    SOLVER_JOURNAL_BACKEND=(str, "ndjson"),
+    SOLVER_JOURNAL_UPLOADS=(bool, False),
+    SOLVER_JOURNAL_ROTATE_BYTES=(int, 67108864),
+    SOLVER_JOURNAL_MAX_FILES=(int, 100),
+    SOLVER_JOURNAL_UPLOADS_MAX_BYTES=(int, 1073741824),
 )
 
 environ.Env.read_env()
@@ -55,6 +85,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # refuses oversized bodies before anything reads them
+    "solver.admission.BodyLimitMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -93,6 +125,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # seconds to wait for the write lock, job workers and requests share the file
+        "OPTIONS": {"timeout": 20},
     }
 }
 
@@ -140,3 +174,75 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CORS_ALLOWED_ORIGINS = tuple(env.list("CORS_ALLOWED_ORIGINS"))
 CORS_ALLOW_ALL_ORIGINS = env.bool("CORS_ALLOW_ALL_ORIGINS")
+
+# Solver responses
+# default encoding quality of JPEG and WebP solutions
+SOLVER_IMAGE_QUALITY = env.int("SOLVER_IMAGE_QUALITY")
+# longest side of solution images in pixels, 0 keeps the uploaded size
+SOLVER_MAX_DIMENSION = env.int("SOLVER_MAX_DIMENSION")
+# most puzzles accepted by one batch request
+SOLVER_BATCH_MAX_FILES = env.int("SOLVER_BATCH_MAX_FILES")
+# threads used by batch requests, 0 for one per core
+SOLVER_BATCH_WORKERS = env.int("SOLVER_BATCH_WORKERS")
+# frames between full detection and recognition of a live stream
+SOLVER_STREAM_KEYFRAME_INTERVAL = env.int("SOLVER_STREAM_KEYFRAME_INTERVAL")
+# longest side of live stream frames in pixels, 0 keeps the sent size
+SOLVER_STREAM_MAX_DIMENSION = env.int("SOLVER_STREAM_MAX_DIMENSION")
+# encoding quality of live stream frames
+SOLVER_STREAM_QUALITY = env.int("SOLVER_STREAM_QUALITY")
+# solved grids remembered by perceptual hash, 0 disables the cache
+SOLVER_GRID_CACHE_SIZE = env.int("SOLVER_GRID_CACHE_SIZE")
+# most differing hash bits of a cache hit
+SOLVER_GRID_CACHE_DISTANCE = env.int("SOLVER_GRID_CACHE_DISTANCE")
+# largest uploaded photo in bytes
+SOLVER_UPLOAD_MAX_BYTES = env.int("SOLVER_UPLOAD_MAX_BYTES")
+# largest uploaded photo in decoded pixels, guards against decompression bombs
+SOLVER_UPLOAD_MAX_PIXELS = env.int("SOLVER_UPLOAD_MAX_PIXELS")
+# directory of request profiles asked for with the X-Solver-Profile header, empty disables profiling
+SOLVER_PROFILE_DIR = env.str("SOLVER_PROFILE_DIR")
+# newest profiles kept in SOLVER_PROFILE_DIR
+SOLVER_PROFILE_MAX_FILES = env.int("SOLVER_PROFILE_MAX_FILES")
+# value the X-Solver-Profile header must have, empty disables profiling
+SOLVER_PROFILE_TOKEN = env.str("SOLVER_PROFILE_TOKEN")
+# search engine of requests, 'portfolio' races SOLVER_PORTFOLIO_STRATEGIES
+SOLVER_ENGINE = env.str("SOLVER_ENGINE")
+# search nodes a puzzle may take before it is given up as too hard, 0 for no limit,
+# about 10 s of the compiled engine on 25x25 boards
+SOLVER_MAX_NODES = env.int("SOLVER_MAX_NODES")
+# comma separated engine or engine:seed strategies raced by the portfolio engine,
+# DEFAULT_STRATEGIES of solver/portfolio.py when empty
+SOLVER_PORTFOLIO_STRATEGIES = env.str("SOLVER_PORTFOLIO_STRATEGIES")
+# milliseconds a portfolio race may run before answering 503, 0 for no deadline
+SOLVER_PORTFOLIO_DEADLINE_MS = env.int("SOLVER_PORTFOLIO_DEADLINE_MS")
+# directory of job uploads and results, jobs/ next to manage.py when empty
+SOLVER_JOB_DIR = env.str("SOLVER_JOB_DIR") or str(BASE_DIR / "jobs")
+# most photos accepted by one job, each may take SOLVER_UPLOAD_MAX_BYTES of the body
+SOLVER_JOB_MAX_FILES = env.int("SOLVER_JOB_MAX_FILES")
+# most board strings accepted by one job
+SOLVER_JOB_MAX_GRIDS = env.int("SOLVER_JOB_MAX_GRIDS")
+# runs of a job before it is failed
+SOLVER_JOB_MAX_ATTEMPTS = env.int("SOLVER_JOB_MAX_ATTEMPTS")
+# seconds a job stays claimed without its worker renewing the claim
+SOLVER_JOB_LEASE_SECONDS = env.int("SOLVER_JOB_LEASE_SECONDS")
+# seconds finished jobs and their results are kept, 0 keeps them
+SOLVER_JOB_TTL_SECONDS = env.int("SOLVER_JOB_TTL_SECONDS")
+# directory of the request journal, empty disables journaling
+SOLVER_JOURNAL_DIR = env.str("SOLVER_JOURNAL_DIR")
+# journal storage, 'ndjson' for rotating files or 'sqlite' for one database
+SOLVER_JOURNAL_BACKEND = env.str("SOLVER_JOURNAL_BACKEND")
+# keep the uploaded photos so the journal can be replayed
+SOLVER_JOURNAL_UPLOADS = env.bool("SOLVER_JOURNAL_UPLOADS")
+# bytes of an ndjson journal file before a new one is started
+SOLVER_JOURNAL_ROTATE_BYTES = env.int("SOLVER_JOURNAL_ROTATE_BYTES")
+# newest ndjson journal files kept, the sqlite journal keeps as many bytes of entries
+SOLVER_JOURNAL_MAX_FILES = env.int("SOLVER_JOURNAL_MAX_FILES")
+# bytes of kept uploads, the least recently seen are removed past it
+SOLVER_JOURNAL_UPLOADS_MAX_BYTES = env.int("SOLVER_JOURNAL_UPLOADS_MAX_BYTES")
+# django refuses requests with more files, jobs take the most, AdmissionUploadHandler limits each endpoint
+DATA_UPLOAD_MAX_NUMBER_FILES = max(SOLVER_BATCH_MAX_FILES, SOLVER_JOB_MAX_FILES)
+# uploads are checked as they stream in before the default handlers store them
+FILE_UPLOAD_HANDLERS = [
+    "solver.admission.AdmissionUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
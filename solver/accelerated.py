@@ -0,0 +1,324 @@
+import numpy as np
+
+# The compiled engine is optional, install numba to enable it.
+try:
+    import numba
+except ImportError:
+    numba = None
+
+AVAILABLE = numba is not None
+
+# The kernels mirror engines._propagate, engines._choose_branch and
+# engines._dfs step for step, including the order options are tried and the
+# xorshift shuffle, so both engines return identical boards.
+#
+# Arrays:
+#   cells       uint8 (n_cells,), 0 for empty
+#   used        int64 (3 * size,), used digit bitmask of rows, cols then squares
+#   units       intp  (3 * size, size), cells of each unit
+#   cell_units  intp  (n_cells, 3), row, col and square unit of each cell
+#   counters    int64 (4,), nodes, guesses and backtracks added, max depth raised
+#   stop        uint8 (1,), set by another thread to cancel the search
+
+# search status returned by dfs
+NO_SOLUTION = 0
+SOLVED = 1
+NODE_LIMIT = 2
+CANCELLED = 3
+# nodes between checks of the stop flag, a power of 2
+CANCEL_CHECK_NODES = 256
+
+
+if AVAILABLE:
+
+    @numba.njit(cache=True, nogil=True)
+    def _popcount(x):
+        count = 0
+        while x:
+            x &= x - 1
+            count += 1
+        return count
+
+    @numba.njit(cache=True, nogil=True)
+    def _digit(bit):
+        n = 0
+        while bit > 1:
+            bit >>= 1
+            n += 1
+        return n
+
+    @numba.njit(cache=True, nogil=True)
+    def _candidates(used, cell_units, full, idx):
+        return full & ~(used[cell_units[idx, 0]] | used[cell_units[idx, 1]] | used[cell_units[idx, 2]])
+
+    @numba.njit(cache=True, nogil=True)
+    def _place(cells, used, cell_units, idx, bit):
+        cells[idx] = _digit(bit)
+        used[cell_units[idx, 0]] |= bit
+        used[cell_units[idx, 1]] |= bit
+        used[cell_units[idx, 2]] |= bit
+
+    @numba.njit(cache=True, nogil=True)
+    def _propagate(cells, used, units, cell_units, full):
+        n_cells = cells.shape[0]
+        changed = True
+        while changed:
+            changed = False
+
+            # naked singles, cell with one candidate
+            for idx in range(n_cells):
+                if cells[idx]:
+                    continue
+                candidates = _candidates(used, cell_units, full, idx)
+                if not candidates:
+                    return False
+                if not candidates & (candidates - 1):
+                    _place(cells, used, cell_units, idx, candidates)
+                    changed = True
+
+            # hidden singles, digit with one place in a unit
+            for u in range(units.shape[0]):
+                once = 0
+                twice = 0
+                for k in range(units.shape[1]):
+                    idx = units[u, k]
+                    if cells[idx]:
+                        continue
+                    candidates = _candidates(used, cell_units, full, idx)
+                    twice |= once & candidates
+                    once |= candidates
+                if (once | used[u]) != full:
+                    return False
+                singles = once & ~twice
+                if not singles:
+                    continue
+                for k in range(units.shape[1]):
+                    idx = units[u, k]
+                    if cells[idx]:
+                        continue
+                    bit = _candidates(used, cell_units, full, idx) & singles
+                    if not bit:
+                        continue
+                    if bit & (bit - 1):
+                        return False
+                    _place(cells, used, cell_units, idx, bit)
+                    changed = True
+        return True
+
+    @numba.njit(cache=True, nogil=True)
+    def _choose_branch(cells, used, units, cell_units, full, size, option_idx, option_bit):
+        """Write options in the order the python engine lists them, return their count or -1 if full."""
+        n_cells = cells.shape[0]
+        best = -1
+        best_candidates = 0
+        best_count = size + 1
+        for idx in range(n_cells):
+            if cells[idx]:
+                continue
+            candidates = _candidates(used, cell_units, full, idx)
+            count = _popcount(candidates)
+            if count < best_count:
+                best = idx
+                best_candidates = candidates
+                best_count = count
+                if count <= 2:
+                    break
+        if best < 0:
+            return -1
+
+        if best_count > 2:
+            for u in range(units.shape[0]):
+                once = 0
+                twice = 0
+                thrice = 0
+                for k in range(units.shape[1]):
+                    idx = units[u, k]
+                    if cells[idx]:
+                        continue
+                    candidates = _candidates(used, cell_units, full, idx)
+                    thrice |= twice & candidates
+                    twice |= once & candidates
+                    once |= candidates
+                pairs = twice & ~thrice
+                if pairs:
+                    bit = pairs & -pairs
+                    n = 0
+                    for k in range(units.shape[1]):
+                        idx = units[u, k]
+                        if cells[idx]:
+                            continue
+                        if _candidates(used, cell_units, full, idx) & bit:
+                            option_idx[n] = idx
+                            option_bit[n] = bit
+                            n += 1
+                    return n
+
+        n = 0
+        while best_candidates:
+            bit = best_candidates & -best_candidates
+            best_candidates ^= bit
+            option_idx[n] = best
+            option_bit[n] = bit
+            n += 1
+        return n
+
+    @numba.njit(cache=True, nogil=True)
+    def _xorshift(state):
+        state ^= (state << np.uint64(13)) & np.uint64(0xFFFFFFFF)
+        state ^= state >> np.uint64(17)
+        state ^= (state << np.uint64(5)) & np.uint64(0xFFFFFFFF)
+        return state
+
+    @numba.njit(cache=True, nogil=True)
+    def dfs(cells, used, units, cell_units, full, size, node_limit, seed, counters, stop):
+        """Search from cells in place, return status and the filled cells, counting like engines._dfs."""
+        n_cells = cells.shape[0]
+        state = np.uint64(seed)
+        depth_limit = n_cells + 1
+
+        # each frame is the state before a guess and the untried options, consumed from the end
+        stack_cells = np.empty((depth_limit, n_cells), dtype=np.uint8)
+        stack_used = np.empty((depth_limit, used.shape[0]), dtype=np.int64)
+        stack_idx = np.empty((depth_limit, size), dtype=np.int64)
+        stack_bit = np.empty((depth_limit, size), dtype=np.int64)
+        stack_n = np.zeros(depth_limit, dtype=np.int64)
+        option_idx = np.empty(size, dtype=np.int64)
+        option_bit = np.empty(size, dtype=np.int64)
+        depth = 0
+        nodes = 0
+        status = NO_SOLUTION
+
+        while True:
+            if nodes == node_limit:
+                status = NODE_LIMIT
+                break
+            if not nodes & (CANCEL_CHECK_NODES - 1) and stop[0]:
+                status = CANCELLED
+                break
+            nodes += 1
+            if not _propagate(cells, used, units, cell_units, full):
+                counters[2] += 1
+            else:
+                n = _choose_branch(cells, used, units, cell_units, full, size, option_idx, option_bit)
+                if n < 0:
+                    status = SOLVED
+                    break
+                # reversed like the python option list
+                for k in range(n):
+                    stack_idx[depth, k] = option_idx[n - 1 - k]
+                    stack_bit[depth, k] = option_bit[n - 1 - k]
+                if state:
+                    # Fisher-Yates shuffle
+                    for i in range(n - 1, 0, -1):
+                        state = _xorshift(state)
+                        j = state % np.uint64(i + 1)
+                        tmp_idx = stack_idx[depth, i]
+                        tmp_bit = stack_bit[depth, i]
+                        stack_idx[depth, i] = stack_idx[depth, j]
+                        stack_bit[depth, i] = stack_bit[depth, j]
+                        stack_idx[depth, j] = tmp_idx
+                        stack_bit[depth, j] = tmp_bit
+                stack_cells[depth, :] = cells
+                stack_used[depth, :] = used
+                stack_n[depth] = n
+                depth += 1
+                if depth > counters[3]:
+                    counters[3] = depth
+
+            # take next untried option of the deepest guess
+            while depth and stack_n[depth - 1] == 0:
+                depth -= 1
+            if not depth:
+                break
+            counters[1] += 1
+            top = depth - 1
+            stack_n[top] -= 1
+            idx = stack_idx[top, stack_n[top]]
+            bit = stack_bit[top, stack_n[top]]
+
+            cells[:] = stack_cells[top]
+            used[:] = stack_used[top]
+            _place(cells, used, cell_units, idx, bit)
+
+        counters[0] += nodes
+        return status, cells
+
+    @numba.njit(cache=True, nogil=True)
+    def count(cells, used, units, cell_units, full, size, limit):
+        """Count solutions from cells up to limit, branching like dfs without shuffling."""
+        n_cells = cells.shape[0]
+        depth_limit = n_cells + 1
+
+        stack_cells = np.empty((depth_limit, n_cells), dtype=np.uint8)
+        stack_used = np.empty((depth_limit, used.shape[0]), dtype=np.int64)
+        stack_idx = np.empty((depth_limit, size), dtype=np.int64)
+        stack_bit = np.empty((depth_limit, size), dtype=np.int64)
+        stack_n = np.zeros(depth_limit, dtype=np.int64)
+        option_idx = np.empty(size, dtype=np.int64)
+        option_bit = np.empty(size, dtype=np.int64)
+        depth = 0
+        found = 0
+
+        while True:
+            if _propagate(cells, used, units, cell_units, full):
+                n = _choose_branch(cells, used, units, cell_units, full, size, option_idx, option_bit)
+                if n < 0:
+                    found += 1
+                    if found >= limit:
+                        return found
+                else:
+                    for k in range(n):
+                        stack_idx[depth, k] = option_idx[k]
+                        stack_bit[depth, k] = option_bit[k]
+                    stack_cells[depth, :] = cells
+                    stack_used[depth, :] = used
+                    stack_n[depth] = n
+                    depth += 1
+
+            while depth and stack_n[depth - 1] == 0:
+                depth -= 1
+            if not depth:
+                return found
+            top = depth - 1
+            stack_n[top] -= 1
+            idx = stack_idx[top, stack_n[top]]
+            bit = stack_bit[top, stack_n[top]]
+
+            cells[:] = stack_cells[top]
+            used[:] = stack_used[top]
+            _place(cells, used, cell_units, idx, bit)
+
+    @numba.njit(cache=True, nogil=True)
+    def minimize(cells, order, symmetric, units, cell_units, full, size):
+        """Blank the cells in order while the puzzle keeps a unique solution, with their mirror cells if symmetric."""
+        n_cells = cells.shape[0]
+        last = n_cells - 1
+        work = np.empty_like(cells)
+        used = np.empty(3 * size, dtype=np.int64)
+        for idx in order:
+            if not cells[idx]:
+                continue
+            mirror = last - idx
+            digit = cells[idx]
+            mirror_digit = cells[mirror]
+            cells[idx] = 0
+            if symmetric:
+                cells[mirror] = 0
+
+            used[:] = 0
+            for k in range(n_cells):
+                if cells[k]:
+                    bit = np.int64(1) << cells[k]
+                    for u in range(3):
+                        used[cell_units[k, u]] |= bit
+            work[:] = cells
+            if count(work, used, units, cell_units, full, size, 2) != 1:
+                cells[idx] = digit
+                if symmetric:
+                    cells[mirror] = mirror_digit
+        return cells
+
+else:
+    dfs = None
+    count = None
+    minimize = None
@@ -0,0 +1,346 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from io import BytesIO
+import json
+import struct
+from typing import Callable, NamedTuple, Optional, Union
+
+from .pipeline import PipelineError
+
+
+########################################################################
+# leading bytes of the accepted image types
+JPEG_MAGIC = b"\xff\xd8\xff"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+# jpeg frame markers holding the image size, every SOFn but DHT, JPG and DAC
+JPEG_SOF_MARKERS = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+# jpeg markers without a length, TEM and RST0-7
+JPEG_STANDALONE_MARKERS = frozenset((0x01, *range(0xD0, 0xD8)))
+# bytes searched for the image size, jpeg metadata and thumbnails come first
+HEADER_MAX_BYTES = 512 * 2**10
+# bytes read at a time from uploads
+READ_CHUNK_SIZE = 64 * 2**10
+# multipart boundaries and form fields on top of the files of a request
+BODY_OVERHEAD = 64 * 2**10
+# url names of endpoints taking several files and the setting of their most files, others take one
+ENDPOINT_MAX_FILES = {"solve-batch": "SOLVER_BATCH_MAX_FILES", "jobs": "SOLVER_JOB_MAX_FILES"}
+# url names of endpoints taking board strings in a json body and the setting of their most grids
+ENDPOINT_MAX_GRIDS = {"jobs": "SOLVER_JOB_MAX_GRIDS"}
+# json bytes of the largest board string, 25x25, with its quotes, comma and spacing
+GRID_MAX_BYTES = 25 * 25 + 8
+########################################################################
+
+
+class ImageHeader(NamedTuple):
+    """Type and size of an image read from its first bytes."""
+
+    format: str
+    width: int
+    height: int
+
+
+def not_an_image() -> PipelineError:
+    return PipelineError(
+        "Invalid file type, image must be a JPEG or PNG file.",
+        "File content is not a JPEG or PNG image.",
+    )
+
+
+def unreadable_header() -> PipelineError:
+    return PipelineError("Image header could not be read.", "File is truncated or not a valid JPEG or PNG image.")
+
+
+def too_large(max_bytes: int) -> PipelineError:
+    return PipelineError("Puzzle file too large.", f"Files must be at most {max_bytes} bytes.", 413)
+
+
+def too_many_files(max_files: int) -> PipelineError:
+    return PipelineError("Too many puzzle files.", f"At most {max_files} puzzles may be sent at once.")
+
+
+def sniff_image(head: bytes) -> Optional[ImageHeader]:
+    """Return type and size from the first bytes of a JPEG or PNG, None while more bytes are needed."""
+    if head.startswith(PNG_MAGIC):
+        if len(head) < 24:
+            return None
+        if head[12:16] != b"IHDR":
+            raise unreadable_header()
+        width, height = struct.unpack(">II", head[16:24])
+        return ImageHeader("png", width, height)
+    if head.startswith(JPEG_MAGIC):
+        return _sniff_jpeg(head)
+    if PNG_MAGIC.startswith(head) or JPEG_MAGIC.startswith(head):
+        return None
+    raise not_an_image()
+
+
+def _sniff_jpeg(head: bytes) -> Optional[ImageHeader]:
+    """Walk jpeg segments up to the frame header."""
+    offset = 2
+    while offset < len(head):
+        if head[offset] != 0xFF:
+            raise unreadable_header()
+        # markers may be padded with fill bytes
+        while offset < len(head) and head[offset] == 0xFF:
+            offset += 1
+        if offset >= len(head):
+            return None
+        marker = head[offset]
+        offset += 1
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        # image data or end of image before any frame header
+        if marker in (0xD9, 0xDA):
+            raise unreadable_header()
+        if offset + 2 > len(head):
+            return None
+        (length,) = struct.unpack(">H", head[offset:offset + 2])
+        if length < 2:
+            raise unreadable_header()
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 7 > len(head):
+                return None
+            height, width = struct.unpack(">HH", head[offset + 3:offset + 7])
+            return ImageHeader("jpeg", width, height)
+        offset += length
+    return None
+
+
+def check_header(head: bytes, complete: bool, max_pixels: int) -> Optional[ImageHeader]:
+    """Sniff head and check the image size against max_pixels, None while more bytes are needed.
+
+    Raise PipelineError for non-images, for images with no readable size in
+    the first HEADER_MAX_BYTES or once complete, and for images whose decoded
+    size would be over max_pixels.
+    """
+    header = sniff_image(head)
+    if header is None:
+        if complete or len(head) >= HEADER_MAX_BYTES:
+            raise unreadable_header()
+        return None
+    if header.width == 0 or header.height == 0:
+        raise unreadable_header()
+    if header.width * header.height > max_pixels:
+        raise PipelineError(
+            "Image dimensions too large.",
+            f"Images must have at most {max_pixels} pixels, got {header.width}x{header.height}.",
+            413,
+        )
+    return header
+
+
+class RejectedUpload(UploadedFile):
+    """Upload refused by AdmissionUploadHandler, holding the error instead of the data."""
+
+    def __init__(self, name: str, content_type: str, error: PipelineError):
+        super().__init__(BytesIO(), name, content_type, 0)
+        self.error = error
+
+
+def read_upload(
+    upload: Union[bytes, UploadedFile],
+    max_bytes: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+) -> bytes:
+    """Return the bytes of an upload once its header and size pass, reading files in chunks and stopping at the first failure."""
+    max_bytes = settings.SOLVER_UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    max_pixels = settings.SOLVER_UPLOAD_MAX_PIXELS if max_pixels is None else max_pixels
+
+    if isinstance(upload, RejectedUpload):
+        raise upload.error
+    if isinstance(upload, (bytes, bytearray, memoryview)):
+        data = bytes(upload)
+        if len(data) > max_bytes:
+            raise too_large(max_bytes)
+        check_header(data[:HEADER_MAX_BYTES], len(data) <= HEADER_MAX_BYTES, max_pixels)
+        return data
+
+    if upload.size is not None and upload.size > max_bytes:
+        raise too_large(max_bytes)
+    chunks = []
+    received = 0
+    header = None
+    for chunk in upload.chunks(READ_CHUNK_SIZE):
+        received += len(chunk)
+        if received > max_bytes:
+            raise too_large(max_bytes)
+        chunks.append(chunk)
+        if header is None:
+            header = check_header(b"".join(chunks)[:HEADER_MAX_BYTES], False, max_pixels)
+    if header is None:
+        check_header(b"".join(chunks), True, max_pixels)
+    return b"".join(chunks)
+
+
+class AdmissionUploadHandler(FileUploadHandler):
+    """First upload handler, checking the header and size of every file while it streams in.
+
+    A file that fails is not passed on to the later handlers, the rest of
+    it is dropped as it arrives, and it is replaced by a RejectedUpload
+    carrying the error so batch results keep their order.
+    """
+
+    chunk_size = READ_CHUNK_SIZE
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = settings.SOLVER_UPLOAD_MAX_BYTES
+        self.max_pixels = settings.SOLVER_UPLOAD_MAX_PIXELS
+        self.max_files = None if request is None else max_files(request.path_info)
+        self.files = 0
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.files += 1
+        self.head = b""
+        self.header = None
+        self.error = None
+        # files past what the endpoint takes are dropped unread, views answer for the count
+        if self.max_files is not None and self.files > self.max_files:
+            self.error = too_many_files(self.max_files)
+        # size sent with the part, rarely given by clients
+        if content_length is not None and content_length > self.max_bytes:
+            self.error = too_large(self.max_bytes)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error is not None:
+            return None
+        if start + len(raw_data) > self.max_bytes:
+            self.reject(too_large(self.max_bytes))
+            return None
+        if self.header is None:
+            self.head += raw_data
+            try:
+                self.header = check_header(self.head, False, self.max_pixels)
+            except PipelineError as e:
+                self.reject(e)
+                return None
+            if self.header is not None:
+                self.head = b""
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.error is None and self.header is None:
+            try:
+                check_header(self.head, True, self.max_pixels)
+            except PipelineError as e:
+                self.reject(e)
+        if self.error is not None:
+            return RejectedUpload(self.file_name, self.content_type, self.error)
+        return None
+
+    def reject(self, error: PipelineError) -> None:
+        self.error = error
+        self.head = b""
+
+
+def _url_name(path: str) -> Optional[str]:
+    try:
+        return resolve(path).url_name
+    except Resolver404:
+        return None
+
+
+def max_files(path: str) -> int:
+    """Return most files a request to path may upload, one unless its endpoint is in ENDPOINT_MAX_FILES."""
+    setting = ENDPOINT_MAX_FILES.get(_url_name(path))
+    return 1 if setting is None else getattr(settings, setting)
+
+
+def max_body_bytes(path: str, content_type: str = "") -> int:
+    """Return largest request body of path, its most files at the largest size.
+
+    Bodies other than multipart forms to endpoints in ENDPOINT_MAX_GRIDS
+    carry board strings, they may only take their most grids at the
+    largest size, since the json parser reads them whole before the view
+    counts the grids.
+    """
+    setting = ENDPOINT_MAX_GRIDS.get(_url_name(path))
+    if setting is not None and not content_type.startswith("multipart/"):
+        return getattr(settings, setting) * GRID_MAX_BYTES + BODY_OVERHEAD
+    return settings.SOLVER_UPLOAD_MAX_BYTES * max_files(path) + BODY_OVERHEAD
+
+
+def body_too_large(max_bytes: int) -> bytes:
+    return json.dumps({
+        "message": "Request body too large.",
+        "error": f"Request bodies must be at most {max_bytes} bytes.",
+    }).encode()
+
+
+class BodyLimitMiddleware:
+    """Answer 413 to requests whose Content-Length is over max_body_bytes of their path and type, before the body is read.
+
+    Covers WSGI servers and the development server. Under ASGI, limit_body
+    refuses them before Django reads the body at all.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        length = request.META.get("CONTENT_LENGTH") or ""
+        max_bytes = max_body_bytes(request.path_info, request.META.get("CONTENT_TYPE", ""))
+        if length.isdigit() and int(length) > max_bytes:
+            return HttpResponse(body_too_large(max_bytes), content_type="application/json", status=413)
+        return self.get_response(request)
+
+
+def limit_body(application, max_bytes: Callable[[str, str], int] = max_body_bytes):
+    """Wrap an ASGI application to answer 413 to request bodies over max_bytes of their path and content type.
+
+    Django reads the whole body before a view or upload handler runs, so
+    bodies declaring a larger Content-Length are refused unread, and bodies
+    that grow past the limit are cut off as soon as they do.
+    """
+
+    async def refuse(send, limit):
+        body = body_too_large(limit)
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def limited(scope, receive, send):
+        if scope["type"] != "http":
+            await application(scope, receive, send)
+            return
+        headers = dict(scope.get("headers", []))
+        limit = max_bytes(
+            scope["path"][len(scope.get("root_path", "")):],
+            headers.get(b"content-type", b"").decode("latin-1"),
+        )
+        length = headers.get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            await refuse(send, limit)
+            return
+
+        state = {"received": 0, "exceeded": False, "started": False}
+
+        async def limited_receive():
+            if state["exceeded"]:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    # django stops reading and answers nothing
+                    state["exceeded"] = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message):
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        await application(scope, limited_receive, tracked_send)
+        if state["exceeded"] and not state["started"]:
+            await refuse(send, limit)
+
+    return limited
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    # readers keep reading while a worker writes, and commits skip the fsync of the log
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
 
 
 class SolverConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "solver"
+
+    def ready(self):
+        connection_created.connect(configure_sqlite)
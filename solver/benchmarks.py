@@ -0,0 +1,318 @@
+import cv2
+import os
+import random
+import time
+import numpy as np
+from typing import Callable, Dict, List, Tuple
+
+from .board import Board
+from .corpus import CORPUS_EXTENSION, open_corpus
+from .engines import SearchStats, get_engine
+from .generator import read_corpus
+from .sudoku_solver import Sudoku
+from .topology import get_topology
+
+
+########################################################################
+# share of cells left as clues when making benchmark puzzles
+CLUE_RATIOS = {2: 0.4, 3: 0.4, 4: 0.5, 5: 0.55}
+# detected corners may be this share of the grid side away from the reference
+CORNER_TOLERANCE = 0.04
+########################################################################
+
+
+def make_solution(box_size: int, rng: random.Random) -> Board:
+    """Shuffle the rows, cols, bands, stacks and digits of a patterned solved board."""
+    b = box_size
+    size = b * b
+    bands = rng.sample(range(b), b)
+    stacks = rng.sample(range(b), b)
+    rows = [band * b + r for band in bands for r in rng.sample(range(b), b)]
+    cols = [stack * b + c for stack in stacks for c in rng.sample(range(b), b)]
+    digits = [0] + rng.sample(range(1, size + 1), size)
+    cells = bytearray(
+        digits[(b * (r % b) + r // b + c) % size + 1] for r in rows for c in cols
+    )
+    return Board(cells, size)
+
+
+def make_puzzle(box_size: int, rng: random.Random, clue_ratio: float | None = None) -> Board:
+    """Blank random cells of a random solution, the puzzle may have several solutions."""
+    board = make_solution(box_size, rng)
+    if clue_ratio is None:
+        clue_ratio = CLUE_RATIOS[box_size]
+    n_blank = round(len(board) * (1 - clue_ratio))
+    for idx in rng.sample(range(len(board)), n_blank):
+        board[idx] = 0
+    return board
+
+
+def time_engine(puzzles: List[Board], engine: str = "auto") -> Dict[str, float]:
+    """Solve each puzzle with the engine and return timing summary in milliseconds with mean search counters."""
+    search = get_engine(engine)
+    # compile or warm caches outside the timings
+    search(puzzles[0])
+    timings = []
+    solved = 0
+    stats = SearchStats(engine)
+    for puzzle in puzzles:
+        start_time = time.perf_counter()
+        result = search(puzzle, stats)
+        timings.append((time.perf_counter() - start_time) * 1000)
+        if result is not None and Sudoku._is_solved(result):
+            solved += 1
+    timings = np.array(timings)
+    return {
+        "count": len(puzzles),
+        "solved": solved,
+        "mean_ms": float(timings.mean()),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "max_ms": float(timings.max()),
+        "nodes": stats.nodes / len(puzzles),
+        "backtracks": stats.backtracks / len(puzzles),
+    }
+
+
+def benchmark_sizes(box_sizes=(2, 3, 4, 5), count: int = 20, engines=("auto",), seed: int = 0) -> List[Dict]:
+    """Time each engine on the same random puzzles of every box size, speedup is relative to the first engine."""
+    results = []
+    for box_size in box_sizes:
+        get_topology(box_size)
+        rng = random.Random(seed + box_size)
+        puzzles = [make_puzzle(box_size, rng) for _ in range(count)]
+        baseline = None
+        for engine in engines:
+            summary = time_engine(puzzles, engine)
+            if baseline is None:
+                baseline = summary["mean_ms"]
+            summary.update({
+                "size": box_size * box_size,
+                "engine": engine,
+                "speedup": baseline / summary["mean_ms"],
+            })
+            results.append(summary)
+    return results
+
+
+def benchmark_corpus(paths: List[str], count: int | None = None, engines=("auto",)) -> List[Dict]:
+    """Time each engine on the puzzles of csv or binary corpus files, the first count of each when given."""
+    results = []
+    for path in paths:
+        if path.endswith(CORPUS_EXTENSION):
+            puzzles = [puzzle for puzzle, _ in open_corpus(path).boards(0, count)]
+        else:
+            puzzles = [puzzle for puzzle, _ in read_corpus(path, count)]
+        if not puzzles:
+            continue
+        baseline = None
+        for engine in engines:
+            summary = time_engine(puzzles, engine)
+            if baseline is None:
+                baseline = summary["mean_ms"]
+            summary.update({
+                "size": puzzles[0].size,
+                "corpus": os.path.splitext(os.path.basename(path))[0],
+                "engine": engine,
+                "speedup": baseline / summary["mean_ms"],
+            })
+            results.append(summary)
+    return results
+
+
+def detection_cases(paths: List[str], seed: int = 0) -> List[Tuple[str, np.ndarray, np.ndarray, float]]:
+    """Degrade each photo and erase one corner of its outline, returning (name, thresholded image, reference corners, side).
+
+    Reference corners come from biggest_contour on the untouched photo, photos
+    where it finds nothing are skipped.
+    """
+    # utilities loads tensorflow, keep it out of the solver benchmarks
+    from .utilities import biggest_contour, find_contours, preprocess_image, reorder
+
+    rng = np.random.default_rng(seed)
+    cases = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        border = biggest_contour(find_contours(preprocess_image(img)))
+        if not border.size:
+            continue
+        reference = reorder(border).reshape(4, 2).astype(float)
+        side = float(np.linalg.norm(reference[3] - reference[0]) / np.sqrt(2))
+        height, width = img.shape[:2]
+        rotation = cv2.getRotationMatrix2D((width / 2, height / 2), 8, 1.0)
+        variants = [
+            ("clean", img, reference),
+            ("rotated", cv2.warpAffine(img, rotation, (width, height), borderValue=(255, 255, 255)), np.c_[reference, np.ones(4)] @ rotation.T),
+            ("blurred", cv2.GaussianBlur(img, (0, 0), max(height, width) / 400), reference),
+            ("noisy", np.clip(img + rng.normal(0, 25, img.shape), 0, 255).astype(np.uint8), reference),
+        ]
+        for variant, image, corners in variants:
+            img_proc = preprocess_image(image)
+            cases.append((f"{path} {variant}", img_proc, corners, side))
+            # break the outline at the top left corner
+            x, y = corners[0].round().astype(int)
+            r = max(int(side * 0.06), 2)
+            erased = img_proc.copy()
+            erased[max(y - r, 0) : y + r, max(x - r, 0) : x + r] = 0
+            cases.append((f"{path} {variant} erased corner", erased, corners, side))
+    return cases
+
+
+def benchmark_detection(paths: List[str], repeat: int = 3, seed: int = 0) -> List[Dict]:
+    """Compare biggest_contour with detect_grid on detection_cases for detection rate and time."""
+    from .utilities import biggest_contour, detect_grid, find_contours, reorder
+
+    def contour(img_proc):
+        return biggest_contour(find_contours(img_proc))
+
+    def detector(img_proc):
+        return detect_grid(img_proc)[0]
+
+    methods: Dict[str, Callable[[np.ndarray], np.ndarray]] = {"contour": contour, "detector": detector}
+    cases = detection_cases(paths, seed)
+    results = []
+    for name, method in methods.items():
+        timings = []
+        detected = 0
+        for _, img_proc, corners, side in cases:
+            start_time = time.perf_counter()
+            for _ in range(repeat):
+                try:
+                    border = method(img_proc)
+                except ValueError:
+                    border = np.array([])
+            timings.append((time.perf_counter() - start_time) * 1000 / repeat)
+            if border.size == 8:
+                error = np.abs(reorder(border).reshape(4, 2) - corners).max()
+                detected += error <= side * CORNER_TOLERANCE
+        timings = np.array(timings)
+        results.append({
+            "method": name,
+            "count": len(cases),
+            "detected": int(detected),
+            "rate": detected / max(len(cases), 1),
+            "mean_ms": float(timings.mean()),
+            "p95_ms": float(np.percentile(timings, 95)),
+            "max_ms": float(timings.max()),
+        })
+    return results
+
+
+def photo_variants(img: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+    """Return copies of a photo as it might be uploaded again, recompressed, resized, cropped or relit."""
+    height, width = img.shape[:2]
+    variants = []
+    for quality in (30, 60, 90):
+        encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1]
+        variants.append((f"jpeg {quality}", cv2.imdecode(encoded, cv2.IMREAD_COLOR)))
+    for scale in (0.5, 0.75, 1.5):
+        variants.append((f"resized {scale}", cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)))
+    variants.append(("cropped 2%", img[int(height * 0.02) :, int(width * 0.02) :]))
+    variants.append(("relit", cv2.convertScaleAbs(img, alpha=0.8, beta=30)))
+    return variants
+
+
+def benchmark_grid_cache(paths: List[str], max_distance: int | None = None) -> Dict:
+    """Store each photo in a GridCache, then look up variants of every photo.
+
+    Hits on another photo's entry count as false matches, verification
+    rejections are hash matches turned down because the givens differ.
+    """
+    from .cache import HASH_DISTANCE, GridCache, grid_key
+    from .pipeline import PipelineError, locate_image
+
+    cache = GridCache(max_entries=len(paths) + 1, max_distance=max_distance or HASH_DISTANCE)
+    owners = {}
+    for path in paths:
+        img = cv2.imread(path)
+        try:
+            located = locate_image(img)
+        except PipelineError:
+            continue
+        key = grid_key(located.warped, located.cells)
+        cache.store(key, [], [], [])
+        owners[key.hash] = path
+    cache.counts["stores"] = 0
+
+    timings = []
+    false_matches = 0
+    undetected = 0
+    for path in paths:
+        if path not in owners.values():
+            continue
+        for _, variant in photo_variants(cv2.imread(path)):
+            try:
+                located = locate_image(variant)
+            except PipelineError:
+                undetected += 1
+                continue
+            start_time = time.perf_counter()
+            entry = cache.lookup(grid_key(located.warped, located.cells))
+            timings.append((time.perf_counter() - start_time) * 1000)
+            if entry is not None and owners[entry.key.hash] != path:
+                false_matches += 1
+
+    stats = cache.stats()
+    stats.update({
+        "photos": len(owners),
+        "undetected": undetected,
+        "false_matches": false_matches,
+        "mean_ms": float(np.mean(timings)) if timings else 0.0,
+    })
+    return stats
+
+
+def benchmark_synthetic(directory: str, model=None, limit: int | None = None) -> Dict:
+    """Run locate_puzzle and, given a model, cell prediction over a rendered dataset.
+
+    Grids count as detected when every corner is within CORNER_TOLERANCE of
+    the grid side from the truth. Cell accuracy is over detected grids, and
+    grids count as read when all 81 predictions match.
+    """
+    from .pipeline import PipelineError, locate_puzzle
+    from .synthetic import read_dataset
+    from .utilities import predict_batch
+
+    locate_ms, predict_ms = [], []
+    count = detected = read = cells_right = cells_total = 0
+    start_time = time.perf_counter()
+    for label in read_dataset(directory, limit):
+        count += 1
+        with open(label["path"], "rb") as file:
+            data = file.read()
+        begin = time.perf_counter()
+        try:
+            located = locate_puzzle(data)
+        except PipelineError:
+            locate_ms.append((time.perf_counter() - begin) * 1000)
+            continue
+        locate_ms.append((time.perf_counter() - begin) * 1000)
+        corners = label["corners"]
+        side = float(np.linalg.norm(corners[3] - corners[0]) / np.sqrt(2))
+        if np.abs(located.border.reshape(4, 2) - corners).max() > side * CORNER_TOLERANCE:
+            continue
+        detected += 1
+        if model is None:
+            continue
+        begin = time.perf_counter()
+        values, _ = predict_batch(np.stack(located.cells), model)
+        predict_ms.append((time.perf_counter() - begin) * 1000)
+        right = int(np.count_nonzero(values == np.ravel(label["grid"])))
+        cells_right += right
+        cells_total += values.size
+        read += right == values.size
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "count": count,
+        "detected": detected,
+        "detection_rate": detected / max(count, 1),
+        "read": read if model is not None else None,
+        "cell_accuracy": cells_right / cells_total if cells_total else None,
+        "locate_mean_ms": float(np.mean(locate_ms)) if locate_ms else 0.0,
+        "locate_p95_ms": float(np.percentile(locate_ms, 95)) if locate_ms else 0.0,
+        "predict_mean_ms": float(np.mean(predict_ms)) if predict_ms else None,
+        "images_per_second": count / max(elapsed, 1e-9),
+    }
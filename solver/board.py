@@ -0,0 +1,106 @@
+from math import isqrt
+import numpy as np
+from typing import Iterator, List, Tuple
+
+from .topology import box_size_for
+
+
+########################################################################
+# digits above 9 are written as letters, 10 is 'A' up to 25 as 'P'
+ALPHABET = b"0123456789ABCDEFGHIJKLMNOP"
+_DECODE = bytes.maketrans(
+    ALPHABET + ALPHABET[10:].lower() + b".",
+    bytes(range(len(ALPHABET))) + bytes(range(10, len(ALPHABET))) + b"\x00",
+)
+_ENCODE = bytes.maketrans(bytes(range(len(ALPHABET))), ALPHABET)
+########################################################################
+
+
+class Board:
+    """Sudoku board of size x size cells stored as bytes in row-major order, 0 marks an empty cell."""
+
+    __slots__ = ("cells", "size")
+
+    def __init__(self, cells: bytearray | memoryview | None = None, size: int = 9):
+        if cells is None:
+            cells = bytearray(size * size)
+        box_size_for(size)
+        if len(cells) != size * size:
+            raise ValueError(f"Board must contain {size * size} cells.")
+        self.cells = cells
+        self.size = size
+
+    @property
+    def box_size(self) -> int:
+        return box_size_for(self.size)
+
+    @classmethod
+    def from_string(cls, board: str) -> "Board":
+        """Create board from string of size**2 characters, '0' or '.' for empty cells."""
+        cells = bytearray(board.encode("ascii").translate(_DECODE))
+        size = isqrt(len(cells))
+        if size * size != len(cells):
+            raise ValueError("Board string must contain a square number of cells.")
+        if cells and max(cells) > size:
+            raise ValueError(f"Board string may only contain '.' and digits up to {size}.")
+        return cls(cells, size)
+
+    @classmethod
+    def from_list(cls, board: List[List[int]]) -> "Board":
+        """Create board from nested list of integers."""
+        size = len(board)
+        if any(len(row) != size for row in board):
+            raise ValueError(f"Board must be {size} rows of {size} cells.")
+        return cls(bytearray(value for row in board for value in row), size)
+
+    @classmethod
+    def from_numpy(cls, array: np.ndarray) -> "Board":
+        """Wrap contiguous uint8 array of cells without copying."""
+        if array.dtype != np.uint8 or not array.flags.c_contiguous:
+            array = np.ascontiguousarray(array, dtype=np.uint8)
+        return cls(memoryview(array).cast("B"), isqrt(array.size))
+
+    def to_string(self) -> str:
+        """Return string of size**2 characters, '0' for empty cells."""
+        return bytes(self.cells).translate(_ENCODE).decode("ascii")
+
+    def to_list(self) -> List[List[int]]:
+        """Return nested list of integers."""
+        cells = self.cells
+        size = self.size
+        return [list(cells[i : i + size]) for i in range(0, size * size, size)]
+
+    def to_numpy(self) -> np.ndarray:
+        """Return size x size uint8 view sharing memory with the board."""
+        return np.frombuffer(self.cells, dtype=np.uint8).reshape(self.size, self.size)
+
+    def copy(self) -> "Board":
+        return Board(bytearray(self.cells), self.size)
+
+    def empties(self) -> List[int]:
+        """Return indexes of empty cells."""
+        return [idx for idx, value in enumerate(self.cells) if value == 0]
+
+    def __getitem__(self, key: int | Tuple[int, int]) -> int:
+        if isinstance(key, tuple):
+            key = self.size * key[0] + key[1]
+        return self.cells[key]
+
+    def __setitem__(self, key: int | Tuple[int, int], value: int) -> None:
+        if isinstance(key, tuple):
+            key = self.size * key[0] + key[1]
+        self.cells[key] = value
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.cells)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Board):
+            return self.size == other.size and self.cells == other.cells
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Board('{self.to_string()}')"
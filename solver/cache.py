@@ -0,0 +1,141 @@
+from collections import OrderedDict
+import cv2
+from django.conf import settings
+from functools import lru_cache
+import numpy as np
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+
+########################################################################
+# warped grid is shrunk to HASH_SIZE square, the HASH_KEEP square of lowest frequencies less DC gives 255 bits
+HASH_SIZE = 64
+HASH_KEEP = 16
+# hashes of recompressed, resized or slightly cropped photos of one grid differ in up to ~36 bits, distinct grids in 96 or more
+HASH_DISTANCE = 48
+# share of dark pixels in the middle of a prepared cell above which it holds a given
+INK_THRESHOLD = 0.08
+# overlap of given digit shapes needed to trust a hash match, per cell and on average
+MIN_CELL_IOU = 0.35
+MIN_MEAN_IOU = 0.6
+########################################################################
+
+
+class GridKey(NamedTuple):
+    """Perceptual hash of a warped grid with the ink of its cells, used to find and verify cached grids."""
+
+    hash: int
+    # cells holding a given
+    occupied: np.ndarray
+    # 16x16 dark pixel masks of every cell
+    shapes: np.ndarray
+
+
+class CacheEntry(NamedTuple):
+    """Recognized and solved grid stored under its key."""
+
+    key: GridKey
+    unsolved: List[List[int]]
+    solved: List[List[int]]
+    confidences: List[List[float]]
+
+
+def grid_hash(warped: np.ndarray) -> int:
+    """Return DCT perceptual hash of a grayscale warped grid as an int."""
+    small = cv2.resize(warped, (HASH_SIZE, HASH_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    coefficients = cv2.dct(small)[:HASH_KEEP, :HASH_KEEP].ravel()[1:]
+    bits = coefficients > np.median(coefficients)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def grid_key(warped: np.ndarray, cells: List[np.ndarray]) -> GridKey:
+    """Return key of a warped grid and its 81 cells prepared for the model."""
+    cells = np.stack(cells).astype(np.float32)
+    occupied = (cells[:, 6:26, 6:26] < 0.5).mean(axis=(1, 2)) > INK_THRESHOLD
+    shapes = np.stack([cv2.resize(cell, (16, 16), interpolation=cv2.INTER_AREA) for cell in cells]) < 0.5
+    return GridKey(grid_hash(warped), occupied, shapes)
+
+
+class GridCache:
+    """Recently solved grids looked up by perceptual hash, tolerant to recompression, resizing and small crops.
+
+    A hash match is only returned when the same cells hold givens and the
+    given digits overlap, so near-identical layouts of different puzzles
+    are rejected instead of answered with the wrong solution.
+    """
+
+    def __init__(self, max_entries: int = 256, max_distance: int = HASH_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = {"lookups": 0, "hits": 0, "misses": 0, "rejected": 0, "stores": 0, "evictions": 0}
+
+    def lookup(self, key: GridKey) -> Optional[CacheEntry]:
+        """Return closest cached grid within max_distance that passes verification."""
+        with self.lock:
+            self.counts["lookups"] += 1
+            candidates = sorted(
+                (distance, stored)
+                for stored, distance in ((stored, (stored ^ key.hash).bit_count()) for stored in self.entries)
+                if distance <= self.max_distance
+            )
+            for _, stored in candidates:
+                entry = self.entries[stored]
+                if self.verify(entry.key, key):
+                    self.entries.move_to_end(stored)
+                    self.counts["hits"] += 1
+                    return entry
+                self.counts["rejected"] += 1
+            self.counts["misses"] += 1
+            return None
+
+    def store(
+        self,
+        key: GridKey,
+        unsolved: List[List[int]],
+        solved: List[List[int]],
+        confidences: List[List[float]],
+    ) -> None:
+        """Remember solved grid, evicting the least recently used beyond max_entries."""
+        with self.lock:
+            self.entries[key.hash] = CacheEntry(key, unsolved, solved, confidences)
+            self.entries.move_to_end(key.hash)
+            self.counts["stores"] += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counts["evictions"] += 1
+
+    @staticmethod
+    def verify(cached: GridKey, key: GridKey) -> bool:
+        """Givens must sit in the same cells and look alike."""
+        if not np.array_equal(cached.occupied, key.occupied):
+            return False
+        if not cached.occupied.any():
+            return True
+        a = cached.shapes[cached.occupied]
+        b = key.shapes[key.occupied]
+        iou = (a & b).sum(axis=(1, 2)) / np.maximum((a | b).sum(axis=(1, 2)), 1)
+        return iou.min() >= MIN_CELL_IOU and iou.mean() >= MIN_MEAN_IOU
+
+    def stats(self) -> Dict:
+        """Return counters with entry count and hit rate."""
+        with self.lock:
+            stats = dict(self.counts)
+            stats["entries"] = len(self.entries)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            for name in self.counts:
+                self.counts[name] = 0
+
+
+@lru_cache(maxsize=1)
+def get_grid_cache() -> Optional[GridCache]:
+    """Return the process wide cache, None when SOLVER_GRID_CACHE_SIZE is 0."""
+    if settings.SOLVER_GRID_CACHE_SIZE <= 0:
+        return None
+    return GridCache(settings.SOLVER_GRID_CACHE_SIZE, settings.SOLVER_GRID_CACHE_DISTANCE)
@@ -0,0 +1,279 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from itertools import chain, islice
+import json
+from math import isqrt
+import numpy as np
+import os
+import struct
+from typing import Dict, Iterator, Optional, Tuple
+
+from .board import _DECODE, Board
+from .engines import SearchStats, get_engine
+from .topology import box_size_for
+
+
+########################################################################
+# binary corpus layout, all integers little endian:
+#   header  magic, version, board size, count, then offset and length of
+#           the metadata json, the puzzles and the solutions (0 when absent)
+#   blocks  count x size**2 uint8 cells per block, 0 for empty cells
+CORPUS_MAGIC = b"SUDOKUC\x00"
+CORPUS_VERSION = 1
+CORPUS_HEADER = struct.Struct("<8sHHQQQQQQQ")
+CORPUS_HEADER_SIZE = 128
+# blocks start on cache line boundaries
+CORPUS_ALIGNMENT = 64
+CORPUS_EXTENSION = ".grids"
+# csv rows converted at a time
+CONVERT_CHUNK_ROWS = 65536
+########################################################################
+
+
+def _align(offset: int) -> int:
+    return -(-offset // CORPUS_ALIGNMENT) * CORPUS_ALIGNMENT
+
+
+class Corpus:
+    """Puzzles and solutions of a binary corpus file, memory-mapped read-only.
+
+    puzzles and solutions are count x size**2 uint8 arrays backed by the
+    file, so opening costs a header read and slices are read from disk only
+    when touched. solutions is None for corpora without them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            header = file.read(CORPUS_HEADER_SIZE)
+            if len(header) < CORPUS_HEADER.size:
+                raise ValueError(f"{path} is not a puzzle corpus.")
+            (
+                magic, version, size, count,
+                meta_offset, meta_length, puzzles_offset, puzzles_length, solutions_offset, solutions_length,
+            ) = CORPUS_HEADER.unpack_from(header)
+            if magic != CORPUS_MAGIC:
+                raise ValueError(f"{path} is not a puzzle corpus.")
+            if version != CORPUS_VERSION:
+                raise ValueError(f"{path} has corpus version {version}, expected {CORPUS_VERSION}.")
+            file.seek(meta_offset)
+            self.metadata: Dict = json.loads(file.read(meta_length) or b"{}")
+
+        box_size_for(size)
+        self.size = size
+        self.count = count
+        shape = (count, size * size)
+        if puzzles_length != count * size * size or solutions_length not in (0, puzzles_length):
+            raise ValueError(f"{path} has blocks of the wrong length.")
+        if os.path.getsize(path) < max(puzzles_offset + puzzles_length, solutions_offset + solutions_length):
+            raise ValueError(f"{path} is truncated.")
+        self.puzzles = self._map(puzzles_offset, shape)
+        self.solutions = self._map(solutions_offset, shape) if solutions_length else None
+
+    def _map(self, offset: int, shape: Tuple[int, int]) -> np.ndarray:
+        # np.memmap refuses empty maps
+        if not shape[0]:
+            return np.empty(shape, dtype=np.uint8)
+        return np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset, shape=shape)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> Board:
+        """Return puzzle at index as a board viewing the mapped cells."""
+        return Board.from_numpy(self.puzzles[index])
+
+    def boards(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[Board, Optional[Board]]]:
+        """Yield (puzzle, solution) boards of a slice, solution None when the corpus has none."""
+        for index in range(*slice(start, stop).indices(self.count)):
+            solution = None if self.solutions is None else Board.from_numpy(self.solutions[index])
+            yield Board.from_numpy(self.puzzles[index]), solution
+
+
+def open_corpus(path: str) -> Corpus:
+    """Memory-map a binary corpus file."""
+    return Corpus(path)
+
+
+def write_corpus(path: str, puzzles: np.ndarray, solutions: Optional[np.ndarray] = None, metadata: Optional[Dict] = None) -> None:
+    """Write count x size**2 arrays of puzzles and solutions as a binary corpus file."""
+    puzzles = np.ascontiguousarray(puzzles, dtype=np.uint8)
+    with CorpusWriter(path, isqrt(puzzles.shape[1]), solutions is not None, metadata) as writer:
+        writer.append(puzzles, solutions)
+
+
+class CorpusWriter:
+    """Write a binary corpus in chunks of boards without knowing the count up front.
+
+    Puzzles are written to their place in the file and solutions to a
+    temporary file, then moved after the puzzles on close. The file only
+    appears under its name once complete.
+    """
+
+    def __init__(self, path: str, size: int, with_solutions: bool = True, metadata: Optional[Dict] = None):
+        box_size_for(size)
+        self.path = path
+        self.size = size
+        self.count = 0
+        self.with_solutions = with_solutions
+        self.metadata = json.dumps(metadata or {}).encode()
+        self.meta_offset = CORPUS_HEADER_SIZE
+        self.puzzles_offset = _align(self.meta_offset + len(self.metadata))
+        self.file = None
+        self.solutions_file = None
+
+    def __enter__(self):
+        self.file = open(self.path + ".tmp", "wb")
+        self.file.seek(self.puzzles_offset)
+        if self.with_solutions:
+            self.solutions_file = open(self.path + ".solutions.tmp", "w+b")
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def append(self, puzzles: np.ndarray, solutions: Optional[np.ndarray] = None) -> None:
+        """Append n x size**2 arrays of puzzles and their solutions."""
+        cells = self.size * self.size
+        puzzles = np.ascontiguousarray(puzzles, dtype=np.uint8)
+        if puzzles.ndim != 2 or puzzles.shape[1] != cells:
+            raise ValueError(f"Puzzles must be an array of rows of {cells} cells.")
+        if self.with_solutions and (solutions is None or np.shape(solutions) != puzzles.shape):
+            raise ValueError("Each puzzle needs a solution.")
+        for block in (puzzles, solutions if self.with_solutions else None):
+            if block is not None and np.size(block) and np.max(block) > self.size:
+                raise ValueError(f"Cells may only hold digits up to {self.size}.")
+        if self.with_solutions:
+            self.solutions_file.write(np.ascontiguousarray(solutions, dtype=np.uint8).tobytes())
+        self.file.write(puzzles.tobytes())
+        self.count += len(puzzles)
+
+    def close(self) -> None:
+        length = self.count * self.size * self.size
+        solutions_offset = 0
+        if self.with_solutions:
+            solutions_offset = _align(self.puzzles_offset + length)
+            self.file.seek(solutions_offset)
+            self.solutions_file.seek(0)
+            while chunk := self.solutions_file.read(2**24):
+                self.file.write(chunk)
+        # empty blocks leave the file short of their offsets
+        self.file.truncate(max(self.puzzles_offset, solutions_offset) + length)
+        self.file.seek(0)
+        self.file.write(CORPUS_HEADER.pack(
+            CORPUS_MAGIC, CORPUS_VERSION, self.size, self.count,
+            self.meta_offset, len(self.metadata),
+            self.puzzles_offset, length,
+            solutions_offset, length if self.with_solutions else 0,
+        ))
+        self.file.seek(self.meta_offset)
+        self.file.write(self.metadata)
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+        self._remove_solutions()
+
+    def discard(self) -> None:
+        self.file.close()
+        os.remove(self.path + ".tmp")
+        self._remove_solutions()
+
+    def _remove_solutions(self) -> None:
+        if self.solutions_file is not None:
+            self.solutions_file.close()
+            os.remove(self.path + ".solutions.tmp")
+
+
+def _decode_rows(rows, size: int) -> np.ndarray:
+    """Return board strings as a rows x size**2 uint8 array in one translate."""
+    cells = size * size
+    if any(len(row) != cells for row in rows):
+        raise ValueError(f"Board strings must be {cells} characters long.")
+    array = np.frombuffer("".join(rows).encode("ascii").translate(_DECODE), dtype=np.uint8).reshape(len(rows), cells)
+    if array.max() > size:
+        raise ValueError(f"Board strings may only contain '.' and digits up to {size}.")
+    return array
+
+
+def convert_csv(
+    source: str,
+    path: str,
+    quizzes: str = "quizzes",
+    solutions: Optional[str] = "solutions",
+    limit: Optional[int] = None,
+    chunk_rows: int = CONVERT_CHUNK_ROWS,
+) -> int:
+    """Convert a csv of board strings, like the Kaggle dataset or generate_puzzles output, to a binary corpus.
+
+    Rows are read in chunks so memory stays flat for any file size. Pass
+    solutions=None for csv files without solutions. Returns the puzzles
+    written.
+    """
+    with open(source, newline="") as file:
+        reader = csv.DictReader(file)
+        columns = reader.fieldnames or []
+        expected = [quizzes] if solutions is None else [quizzes, solutions]
+        if not set(expected) <= set(columns):
+            raise ValueError(f"{source} has columns {columns}, expected {expected}.")
+        first = next(reader, None)
+        if first is None:
+            raise ValueError(f"{source} has no puzzles.")
+        size = isqrt(len(first[quizzes]))
+        metadata = {"source": os.path.basename(source)}
+        with CorpusWriter(path, size, solutions is not None, metadata) as writer:
+            rows = []
+            for row in islice(chain([first], reader), limit):
+                rows.append(row)
+                if len(rows) >= chunk_rows:
+                    _append_rows(writer, rows, quizzes, solutions, size)
+                    rows = []
+            _append_rows(writer, rows, quizzes, solutions, size)
+        return writer.count
+
+
+def _append_rows(writer: CorpusWriter, rows, quizzes: str, solutions: Optional[str], size: int) -> None:
+    if not rows:
+        return
+    writer.append(
+        _decode_rows([row[quizzes] for row in rows], size),
+        None if solutions is None else _decode_rows([row[solutions] for row in rows], size),
+    )
+
+
+def solve_corpus(
+    corpus: Corpus,
+    start: int = 0,
+    stop: Optional[int] = None,
+    engine: str = "auto",
+    workers: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+) -> Dict:
+    """Solve a slice of a corpus in a thread pool, returning the solutions array and how many match.
+
+    The compiled engine releases the GIL, so threads scale with cores for
+    it. Unsolved puzzles are left as zeros. matched counts solutions equal
+    to the stored ones, None for corpora without solutions.
+    """
+    search = get_engine(engine)
+    indexes = range(*slice(start, stop).indices(corpus.count))
+    solved = np.zeros((len(indexes), corpus.size * corpus.size), dtype=np.uint8)
+
+    def solve(offset):
+        puzzle_stats = None if stats is None else SearchStats()
+        result = search(Board.from_numpy(corpus.puzzles[indexes[offset]]), puzzle_stats)
+        if result is not None:
+            solved[offset] = np.frombuffer(result.cells, dtype=np.uint8)
+        return puzzle_stats
+
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        for puzzle_stats in pool.map(solve, range(len(indexes))):
+            if puzzle_stats is not None:
+                stats.merge(puzzle_stats)
+
+    unsolved = int(np.count_nonzero(~solved.any(axis=1)))
+    matched = None
+    if corpus.solutions is not None:
+        matched = int(np.count_nonzero((solved == corpus.solutions[indexes.start:indexes.stop:indexes.step]).all(axis=1)))
+    return {"solutions": solved, "count": len(indexes), "unsolved": unsolved, "matched": matched}
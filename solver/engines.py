@@ -0,0 +1,682 @@
+import heapq
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import accelerated
+from .board import Board
+from .topology import get_topology
+
+
+########################################################################
+# nodes allowed in the first bitset run, later runs follow the Luby sequence
+RESTART_NODES = 100
+# nodes between checks of a Cancel flag
+CANCEL_CHECK_NODES = accelerated.CANCEL_CHECK_NODES
+########################################################################
+
+
+# Search engines take a conflict free board and return a new filled board, or
+# None when they fail. Callers verify the result with Sudoku._is_solved.
+# Engines add their counters to stats when one is passed, and give up,
+# returning None, once a Cancel passed to them is set. They raise SearchLimit
+# once they have searched max_nodes nodes without an answer.
+
+
+class SearchStats:
+    """Counters of a search, each engine fills those it has.
+
+    nodes are states searched (heap pops for the heap engine), guesses are
+    digits placed by choice, backtracks undo a guess or abandon a
+    contradiction, max_depth is the most guesses held at once and restarts
+    count bitset runs cut off by their node limit. The heap engine also
+    counts pushes, re-pushes of deferred cells and the longest
+    bifurcation_length reached.
+    """
+
+    __slots__ = (
+        "engine",
+        "nodes",
+        "guesses",
+        "backtracks",
+        "max_depth",
+        "restarts",
+        "pushes",
+        "repushes",
+        "max_bifurcation",
+        "elapsed_ms",
+    )
+
+    def __init__(self, engine: str = ""):
+        self.engine = engine
+        self.nodes = 0
+        self.guesses = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.restarts = 0
+        self.pushes = 0
+        self.repushes = 0
+        self.max_bifurcation = 0
+        self.elapsed_ms = 0.0
+
+    def as_dict(self) -> Dict:
+        stats = {name: getattr(self, name) for name in self.__slots__}
+        stats["elapsed_ms"] = round(self.elapsed_ms, 3)
+        return stats
+
+    def merge(self, other: "SearchStats") -> None:
+        """Add the counters of another search, keeping the larger maxima."""
+        for name in self.__slots__[1:]:
+            if name.startswith("max_"):
+                setattr(self, name, max(getattr(self, name), getattr(other, name)))
+            else:
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def __repr__(self):
+        counters = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"SearchStats({counters})"
+
+
+class SearchLimit(Exception):
+    """Search stopped after its max_nodes, or its deadline_ms, without finding a board or proving there is none."""
+
+    def __init__(self, max_nodes: Optional[int] = None, deadline_ms: Optional[float] = None):
+        if deadline_ms is not None:
+            super().__init__(f"Search stopped after {deadline_ms} ms.")
+        else:
+            super().__init__(f"Search stopped after {max_nodes} nodes.")
+        self.max_nodes = max_nodes
+        self.deadline_ms = deadline_ms
+
+
+class Cancel:
+    """Flag another thread sets to stop searches sharing it, engines check it every CANCEL_CHECK_NODES nodes.
+
+    The flag is a one byte array so the compiled engine can read it
+    without the GIL. Cancelled searches return None.
+    """
+
+    __slots__ = ("flag",)
+
+    def __init__(self):
+        self.flag = np.zeros(1, dtype=np.uint8)
+
+    def set(self) -> None:
+        self.flag[0] = 1
+
+    def is_set(self) -> bool:
+        return bool(self.flag[0])
+
+
+def heap_search(
+    board: Board,
+    stats: Optional[SearchStats] = None,
+    cancel: Optional[Cancel] = None,
+    max_nodes: Optional[int] = None,
+) -> Optional[Board]:
+    """Heap ordered bifurcation search, gives up once bifurcation length exceeds board size."""
+    topo = get_topology(board.box_size)
+    size = topo.size
+    cell_units = topo.cell_units
+    full = topo.full_mask
+
+    board = board.copy()
+    cells = board.cells
+
+    # used digits of each row, col and square as bitmasks
+    rows = [0] * size
+    cols = [0] * size
+    squares = [0] * size
+    empties = []
+    for idx in range(topo.n_cells):
+        n = cells[idx]
+        if n == 0:
+            empties.append(idx)
+        else:
+            r, c, s = cell_units[idx]
+            rows[r] |= 1 << n
+            cols[c] |= 1 << n
+            squares[s] |= 1 << n
+
+    heap = []
+    count = 0
+    for idx in empties:
+        r, c, s = cell_units[idx]
+        possibilities = full & ~(rows[r] | cols[c] | squares[s])
+        if possibilities.bit_count() == 1:
+            rows[r] |= possibilities
+            cols[c] |= possibilities
+            squares[s] |= possibilities
+            cells[idx] = possibilities.bit_length() - 1
+        else:
+            heapq.heappush(heap, (count, possibilities.bit_count(), idx))
+
+    solution = []
+    count += 1
+    bifurcation_length = 1
+    possibilities = 0
+    # counters are kept in locals and added to stats on return, pops are pushes less what is left
+    pushes = len(heap)
+    repushes = guesses = backtracks = max_depth = max_bifurcation = 0
+    result = None
+    limited = False
+    pops = 0
+    while heap:
+        if pops == max_nodes:
+            limited = True
+            break
+        pops += 1
+        if cancel is not None and not pops & (CANCEL_CHECK_NODES - 1) and cancel.is_set():
+            break
+        item_count, _, idx = heapq.heappop(heap)
+
+        if item_count > count:
+            count = item_count
+            bifurcation_length += 1
+            if bifurcation_length > max_bifurcation:
+                max_bifurcation = bifurcation_length
+
+        if bifurcation_length > size:
+            break
+
+        if item_count < count:
+            heapq.heappush(heap, (count, possibilities.bit_count(), idx))
+            repushes += 1
+            continue
+
+        r, c, s = cell_units[idx]
+        possibilities = full & ~(rows[r] | cols[c] | squares[s])
+
+        while not possibilities:
+            if not solution:
+                break
+            # backtrack adding attempted squares back minus n
+            heapq.heappush(heap, (count + 1, 0, idx))
+            repushes += 1
+            backtracks += 1
+            # backtrack until possibilities are not empty
+            idx, bit, possibilities = solution.pop()
+            r, c, s = cell_units[idx]
+            rows[r] ^= bit
+            cols[c] ^= bit
+            squares[s] ^= bit
+        if not possibilities:
+            break
+
+        if possibilities.bit_count() <= bifurcation_length:
+            # take lowest remaining digit
+            bit = possibilities & -possibilities
+            possibilities ^= bit
+            rows[r] |= bit
+            cols[c] |= bit
+            squares[s] |= bit
+            solution.append((idx, bit, possibilities))
+            guesses += 1
+            if len(solution) > max_depth:
+                max_depth = len(solution)
+            bifurcation_length = 1
+            continue
+
+        heapq.heappush(heap, (count + 1, possibilities.bit_count(), idx))
+        repushes += 1
+    else:
+        for idx, bit, _ in solution:
+            cells[idx] = bit.bit_length() - 1
+        result = board
+
+    if stats is not None:
+        stats.nodes += pushes + repushes - len(heap)
+        stats.guesses += guesses
+        stats.backtracks += backtracks
+        stats.max_depth = max(stats.max_depth, max_depth)
+        stats.pushes += pushes + repushes
+        stats.repushes += repushes
+        stats.max_bifurcation = max(stats.max_bifurcation, max_bifurcation)
+    if limited:
+        raise SearchLimit(max_nodes)
+    return result
+
+
+def _propagate(cells: bytearray, used: List[int], topo) -> bool:
+    """Fill naked and hidden singles in place, return False on contradiction."""
+    full = topo.full_mask
+    units = topo.units
+    cell_units = topo.cell_units
+    size = topo.size
+
+    changed = True
+    while changed:
+        changed = False
+
+        # naked singles, cell with one candidate
+        for idx in range(topo.n_cells):
+            if cells[idx]:
+                continue
+            r, c, s = cell_units[idx]
+            c += size
+            s += 2 * size
+            candidates = full & ~(used[r] | used[c] | used[s])
+            if not candidates:
+                return False
+            if not candidates & (candidates - 1):
+                cells[idx] = candidates.bit_length() - 1
+                used[r] |= candidates
+                used[c] |= candidates
+                used[s] |= candidates
+                changed = True
+
+        # hidden singles, digit with one place in a unit
+        for u, unit in enumerate(units):
+            once = twice = 0
+            for idx in unit:
+                if cells[idx]:
+                    continue
+                r, c, s = cell_units[idx]
+                candidates = full & ~(used[r] | used[c + size] | used[s + 2 * size])
+                twice |= once & candidates
+                once |= candidates
+            if (once | used[u]) != full:
+                return False
+            singles = once & ~twice
+            if not singles:
+                continue
+            for idx in unit:
+                if cells[idx]:
+                    continue
+                r, c, s = cell_units[idx]
+                c += size
+                s += 2 * size
+                candidates = full & ~(used[r] | used[c] | used[s])
+                bit = candidates & singles
+                if not bit:
+                    continue
+                if bit & (bit - 1):
+                    return False
+                cells[idx] = bit.bit_length() - 1
+                used[r] |= bit
+                used[c] |= bit
+                used[s] |= bit
+                changed = True
+    return True
+
+
+def _choose_branch(cells: bytearray, used: List[int], topo) -> Optional[List[Tuple[int, int]]]:
+    """Return (cell, digit bit) options to branch on, or None if the board is full.
+
+    Branches on the empty cell with fewest candidates, or on a digit with only
+    two places in a unit when every cell has more than two candidates.
+    """
+    size = topo.size
+    full = topo.full_mask
+    cell_units = topo.cell_units
+
+    best = -1
+    best_candidates = 0
+    best_count = size + 1
+    for idx in range(topo.n_cells):
+        if cells[idx]:
+            continue
+        r, c, s = cell_units[idx]
+        candidates = full & ~(used[r] | used[c + size] | used[s + 2 * size])
+        count = candidates.bit_count()
+        if count < best_count:
+            best, best_candidates, best_count = idx, candidates, count
+            if count <= 2:
+                break
+    if best < 0:
+        return None
+
+    if best_count > 2:
+        for unit in topo.units:
+            once = twice = thrice = 0
+            for idx in unit:
+                if cells[idx]:
+                    continue
+                r, c, s = cell_units[idx]
+                candidates = full & ~(used[r] | used[c + size] | used[s + 2 * size])
+                thrice |= twice & candidates
+                twice |= once & candidates
+                once |= candidates
+            pairs = twice & ~thrice
+            if pairs:
+                bit = pairs & -pairs
+                options = []
+                for idx in unit:
+                    if cells[idx]:
+                        continue
+                    r, c, s = cell_units[idx]
+                    if full & ~(used[r] | used[c + size] | used[s + 2 * size]) & bit:
+                        options.append((idx, bit))
+                return options
+
+    options = []
+    while best_candidates:
+        bit = best_candidates & -best_candidates
+        best_candidates ^= bit
+        options.append((best, bit))
+    return options
+
+
+def _luby(i: int) -> int:
+    """Return i-th term (from 1) of the Luby restart sequence 1, 1, 2, 1, 1, 2, 4, ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while (1 << k) - 1 != i:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+
+def _xorshift(state: int) -> int:
+    """Next state of a 32 bit xorshift generator, reproducible by compiled engines."""
+    state ^= (state << 13) & 0xFFFFFFFF
+    state ^= state >> 17
+    state ^= (state << 5) & 0xFFFFFFFF
+    return state
+
+
+def _dfs(
+    cells: bytearray,
+    used: List[int],
+    topo,
+    node_limit: int,
+    state: int,
+    counters: Optional[List[int]] = None,
+    cancel: Optional[Cancel] = None,
+) -> Tuple[Optional[bytearray], bool]:
+    """Search from the given state, shuffling options when state is not 0.
+
+    Returns the filled cells or None, and whether the search finished within
+    node_limit, cancelled searches count as finished. Nodes, guesses,
+    backtracks and max depth are added to counters when given.
+    """
+    size = topo.size
+    cell_units = topo.cell_units
+
+    # each frame is the state before a guess and the untried (cell, digit bit) options
+    stack = []
+    nodes = guesses = backtracks = max_depth = 0
+    result, finished = None, True
+    while True:
+        if nodes == node_limit:
+            finished = False
+            break
+        if cancel is not None and not nodes & (CANCEL_CHECK_NODES - 1) and cancel.is_set():
+            break
+        nodes += 1
+        if _propagate(cells, used, topo):
+            options = _choose_branch(cells, used, topo)
+            if options is None:
+                result = cells
+                break
+            options.reverse()
+            if state:
+                # Fisher-Yates shuffle
+                for i in range(len(options) - 1, 0, -1):
+                    state = _xorshift(state)
+                    j = state % (i + 1)
+                    options[i], options[j] = options[j], options[i]
+            stack.append((cells, used, options))
+            if len(stack) > max_depth:
+                max_depth = len(stack)
+        else:
+            backtracks += 1
+
+        # take next untried option of the deepest guess
+        while stack and not stack[-1][2]:
+            stack.pop()
+        if not stack:
+            break
+        saved_cells, saved_used, options = stack[-1]
+        idx, bit = options.pop()
+        guesses += 1
+
+        cells = bytearray(saved_cells)
+        used = saved_used.copy()
+        r, c, s = cell_units[idx]
+        cells[idx] = bit.bit_length() - 1
+        used[r] |= bit
+        used[c + size] |= bit
+        used[s + 2 * size] |= bit
+
+    if counters is not None:
+        counters[0] += nodes
+        counters[1] += guesses
+        counters[2] += backtracks
+        counters[3] = max(counters[3], max_depth)
+    return result, finished
+
+
+def _run_state(run: int, seed: int) -> int:
+    """Shuffle state of a restart run, the first run of an unseeded search keeps the option order."""
+    if not seed and run == 1:
+        return 0
+    return ((run + seed) * 2654435761) & 0xFFFFFFFF or 1
+
+
+def _used_digits(cells: bytearray, topo) -> List[int]:
+    """Return used digits of rows, cols then squares as bitmasks."""
+    size = topo.size
+    used = [0] * (3 * size)
+    for idx in range(topo.n_cells):
+        n = cells[idx]
+        if n:
+            r, c, s = topo.cell_units[idx]
+            used[r] |= 1 << n
+            used[c + size] |= 1 << n
+            used[s + 2 * size] |= 1 << n
+    return used
+
+
+def _used_array(cells: np.ndarray, topo) -> np.ndarray:
+    """Return _used_digits as the int64 array of the compiled kernels."""
+    used = np.zeros(3 * topo.size, dtype=np.int64)
+    filled = np.flatnonzero(cells)
+    np.bitwise_or.at(
+        used,
+        topo.cell_unit_index[filled].ravel(),
+        np.repeat(np.left_shift(1, cells[filled], dtype=np.int64), 3),
+    )
+    return used
+
+
+def bitset_search(
+    board: Board,
+    stats: Optional[SearchStats] = None,
+    seed: int = 0,
+    cancel: Optional[Cancel] = None,
+    max_nodes: Optional[int] = None,
+) -> Optional[Board]:
+    """Depth first search on candidate bitmasks with singles propagation and fewest options first.
+
+    Runs are cut off after a Luby sequence of node limits and restarted with
+    shuffled options, which avoids the long tail of unlucky early guesses on
+    16x16 and 25x25 boards. The first run is unshuffled and every run is
+    seeded from its number, so results are deterministic. A seed shuffles
+    every run, picking one of several solutions at random. Runs stop for
+    good, raising SearchLimit, once max_nodes nodes are searched in all.
+    """
+    topo = get_topology(board.box_size)
+    size = topo.size
+
+    cells = bytearray(board.cells)
+    used = _used_digits(cells, topo)
+
+    # nodes, guesses, backtracks and max depth
+    counters = [0, 0, 0, 0]
+    run = 1
+    while True:
+        state = _run_state(run, seed)
+        node_limit = _run_limit(run, counters[0], max_nodes)
+        result, finished = _dfs(bytearray(cells), used.copy(), topo, node_limit, state, counters, cancel)
+        if finished or counters[0] == max_nodes:
+            break
+        run += 1
+
+    if stats is not None:
+        _add_counters(stats, counters, run - 1)
+    if not finished:
+        raise SearchLimit(max_nodes)
+    return None if result is None else Board(result, size)
+
+
+def _run_limit(run: int, nodes: int, max_nodes: Optional[int]) -> int:
+    """Node limit of a restart run, cut to what is left of max_nodes."""
+    node_limit = RESTART_NODES * _luby(run)
+    return node_limit if max_nodes is None else min(node_limit, max_nodes - nodes)
+
+
+def _add_counters(stats: SearchStats, counters, restarts: int) -> None:
+    """Add nodes, guesses, backtracks and max depth counted by a bitset search to stats."""
+    stats.nodes += int(counters[0])
+    stats.guesses += int(counters[1])
+    stats.backtracks += int(counters[2])
+    stats.max_depth = max(stats.max_depth, int(counters[3]))
+    stats.restarts += restarts
+
+
+def numba_search(
+    board: Board,
+    stats: Optional[SearchStats] = None,
+    seed: int = 0,
+    cancel: Optional[Cancel] = None,
+    max_nodes: Optional[int] = None,
+) -> Optional[Board]:
+    """Compiled bitset_search, returns the same boards and counts when numba is installed."""
+    topo = get_topology(board.box_size)
+    size = topo.size
+
+    cells = np.frombuffer(bytearray(board.cells), dtype=np.uint8)
+    used = _used_array(cells, topo)
+
+    # nodes, guesses, backtracks and max depth
+    counters = np.zeros(4, dtype=np.int64)
+    stop = np.zeros(1, dtype=np.uint8) if cancel is None else cancel.flag
+    run = 1
+    while True:
+        state = _run_state(run, seed)
+        status, result = accelerated.dfs(
+            cells.copy(),
+            used.copy(),
+            topo.unit_index,
+            topo.cell_unit_index,
+            topo.full_mask,
+            size,
+            _run_limit(run, int(counters[0]), max_nodes),
+            state,
+            counters,
+            stop,
+        )
+        if status != accelerated.NODE_LIMIT or counters[0] == max_nodes:
+            break
+        run += 1
+
+    if stats is not None:
+        _add_counters(stats, counters, run - 1)
+    if status == accelerated.NODE_LIMIT:
+        raise SearchLimit(max_nodes)
+    return Board(bytearray(result), size) if status == accelerated.SOLVED else None
+
+
+def head_start(board: Board, stats: Optional[SearchStats] = None, node_limit: int = RESTART_NODES) -> Tuple[bool, Optional[Board]]:
+    """Run the first, unshuffled run of the default engine, return whether it finished and the board it found.
+
+    Finished runs return what the default engine would, so most puzzles are
+    answered here before costlier searches are started on the rest.
+    """
+    topo = get_topology(board.box_size)
+    counters = None if stats is None else [0, 0, 0, 0]
+    if accelerated.AVAILABLE:
+        cells = np.frombuffer(bytearray(board.cells), dtype=np.uint8)
+        counters = np.zeros(4, dtype=np.int64)
+        status, result = accelerated.dfs(
+            cells, _used_array(cells, topo), topo.unit_index, topo.cell_unit_index, topo.full_mask, topo.size,
+            node_limit, 0, counters, np.zeros(1, dtype=np.uint8),
+        )
+        finished = status != accelerated.NODE_LIMIT
+        result = bytearray(result) if status == accelerated.SOLVED else None
+    else:
+        cells = bytearray(board.cells)
+        result, finished = _dfs(cells, _used_digits(cells, topo), topo, node_limit, 0, counters)
+    if stats is not None:
+        _add_counters(stats, counters, 0)
+    return finished, None if result is None else Board(result, topo.size)
+
+
+def _count(cells: bytearray, used: List[int], topo, limit: int) -> int:
+    """Count solutions from the given state up to limit, branching like _dfs."""
+    size = topo.size
+    cell_units = topo.cell_units
+
+    stack = []
+    found = 0
+    while True:
+        if _propagate(cells, used, topo):
+            options = _choose_branch(cells, used, topo)
+            if options is None:
+                found += 1
+                if found >= limit:
+                    return found
+            else:
+                stack.append((cells, used, options))
+
+        while stack and not stack[-1][2]:
+            stack.pop()
+        if not stack:
+            return found
+        saved_cells, saved_used, options = stack[-1]
+        idx, bit = options.pop()
+
+        cells = bytearray(saved_cells)
+        used = saved_used.copy()
+        r, c, s = cell_units[idx]
+        cells[idx] = bit.bit_length() - 1
+        used[r] |= bit
+        used[c + size] |= bit
+        used[s + 2 * size] |= bit
+
+
+def count_solutions(board: Board, limit: int = 2) -> int:
+    """Return number of solutions of a conflict free board, counting stops at limit.
+
+    The default limit of 2 tells unique puzzles apart. Each branch fixes a
+    cell's digit or a digit's cell, so no solution is counted twice.
+    """
+    topo = get_topology(board.box_size)
+    if accelerated.AVAILABLE:
+        cells = np.frombuffer(bytearray(board.cells), dtype=np.uint8).copy()
+        used = _used_array(cells, topo)
+        return int(accelerated.count(cells, used, topo.unit_index, topo.cell_unit_index, topo.full_mask, topo.size, limit))
+
+    cells = bytearray(board.cells)
+    return _count(cells, _used_digits(cells, topo), topo, limit)
+
+
+def portfolio_search(board: Board, stats: Optional[SearchStats] = None, max_nodes: Optional[int] = None) -> Optional[Board]:
+    """Race seeded engines on board, first answer wins, see portfolio.race."""
+    # portfolio imports the engines from here
+    from .portfolio import portfolio_search as search
+    return search(board, stats, max_nodes)
+
+
+########################################################################
+ENGINES: Dict[str, Callable[[Board, Optional[SearchStats]], Optional[Board]]] = {
+    "heap": heap_search,
+    "bitset": bitset_search,
+}
+if accelerated.AVAILABLE:
+    ENGINES["numba"] = numba_search
+ENGINES["portfolio"] = portfolio_search
+DEFAULT_ENGINE = "numba" if accelerated.AVAILABLE else "bitset"
+########################################################################
+
+
+def get_engine(name: str = "auto") -> Callable[[Board, Optional[SearchStats]], Optional[Board]]:
+    """Return search engine by name, 'auto' picks the compiled engine when available."""
+    if name == "auto":
+        name = DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine '{name}', expected one of {sorted(ENGINES)}.")
+    return ENGINES[name]
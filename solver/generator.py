@@ -0,0 +1,410 @@
+import csv
+from itertools import combinations
+import json
+from multiprocessing import Pool
+import numpy as np
+import os
+import random
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import accelerated
+from .board import Board
+from .engines import DEFAULT_ENGINE, SearchStats, count_solutions, get_engine
+from .topology import get_topology
+
+
+########################################################################
+# techniques of the grader from simplest to hardest
+TECHNIQUES = (
+    "naked_single",
+    "hidden_single",
+    "locked_candidates",
+    "naked_pair",
+    "hidden_pair",
+    "naked_triple",
+    "hidden_triple",
+    "search",
+)
+# tier of the hardest technique needed, puzzles needing search are split by nodes searched
+TIERS = ("easy", "medium", "hard", "expert", "extreme")
+TECHNIQUE_TIERS = {
+    "naked_single": "easy",
+    "hidden_single": "easy",
+    "locked_candidates": "medium",
+    "naked_pair": "hard",
+    "hidden_pair": "hard",
+    "naked_triple": "hard",
+    "hidden_triple": "hard",
+    "search": "expert",
+}
+EXTREME_NODES = 6
+# columns of corpus files, quizzes and solutions as in the Kaggle sudoku dataset
+CORPUS_COLUMNS = ("quizzes", "solutions", "clues", "technique", "nodes", "backtracks", "index")
+# puzzles made per task of the worker pool
+CHUNK_SIZE = 64
+# puzzles made per puzzle asked of each tier before giving up on the rest, 9x9 hard puzzles are 1 in 16
+# and some tiers never come up on small boards
+MAX_PUZZLES_FACTOR = 100
+########################################################################
+
+
+def puzzle_seed(seed: int, index: int) -> int:
+    """Seed of the index-th puzzle of a corpus, so every puzzle can be made again on its own."""
+    return (seed << 40) + index
+
+
+def random_solution(box_size: int, rng: random.Random) -> Board:
+    """Fill the independent diagonal squares with random digits and complete them with a seeded search.
+
+    Diagonal squares always complete from 9x9 up, on 4x4 boards they may
+    clash and are drawn again.
+    """
+    topo = get_topology(box_size)
+    search = get_engine()
+    while True:
+        board = Board(bytearray(topo.n_cells), topo.size)
+        for k in range(0, topo.size, box_size + 1):
+            for idx, digit in zip(topo.squares[k], rng.sample(range(1, topo.size + 1), topo.size)):
+                board[idx] = digit
+        solution = search(board, seed=rng.getrandbits(32) | 1)
+        if solution is not None:
+            return solution
+
+
+def minimize(solution: Board, rng: random.Random, symmetric: bool = False) -> Board:
+    """Remove clues of a solution in random order while the puzzle keeps a unique solution.
+
+    No clue of the result can be removed without losing uniqueness. With
+    symmetric, clues are removed in pairs mirrored through the center.
+    """
+    puzzle = solution.copy()
+    last = len(puzzle) - 1
+    order = list(range(len(puzzle)))
+    rng.shuffle(order)
+    if accelerated.AVAILABLE:
+        # one compiled loop instead of a count_solutions call per clue
+        topo = get_topology(puzzle.box_size)
+        cells = np.frombuffer(bytearray(puzzle.cells), dtype=np.uint8).copy()
+        accelerated.minimize(
+            cells, np.array(order, dtype=np.int64), symmetric,
+            topo.unit_index, topo.cell_unit_index, topo.full_mask, topo.size,
+        )
+        return Board(bytearray(cells), puzzle.size)
+
+    for idx in order:
+        if not puzzle[idx]:
+            continue
+        removed = [(idx, puzzle[idx])]
+        if symmetric and last - idx != idx:
+            removed.append((last - idx, puzzle[last - idx]))
+        for cell, _ in removed:
+            puzzle[cell] = 0
+        if count_solutions(puzzle, 2) != 1:
+            for cell, digit in removed:
+                puzzle[cell] = digit
+    return puzzle
+
+
+class LogicalSolver:
+    """Fill a board with human techniques, always applying the simplest that makes progress.
+
+    Candidates are kept as bitmasks like the engines. hardest is the index
+    in TECHNIQUES of the hardest technique used, and steps counts uses of
+    each technique.
+    """
+
+    def __init__(self, board: Board):
+        self.topo = get_topology(board.box_size)
+        self.cells = bytearray(board.cells)
+        self.candidates = [0] * self.topo.n_cells
+        self.hardest = -1
+        self.steps = {name: 0 for name in TECHNIQUES[:-1]}
+        full = self.topo.full_mask
+        for idx in range(self.topo.n_cells):
+            if not self.cells[idx]:
+                self.candidates[idx] = full
+        for idx in range(self.topo.n_cells):
+            if self.cells[idx]:
+                self.eliminate_peers(idx, 1 << self.cells[idx])
+        self.techniques: List[Tuple[str, Callable[[], bool]]] = [
+            ("naked_single", self.naked_single),
+            ("hidden_single", self.hidden_single),
+            ("locked_candidates", self.locked_candidates),
+            ("naked_pair", lambda: self.naked_subset(2)),
+            ("hidden_pair", lambda: self.hidden_subset(2)),
+            ("naked_triple", lambda: self.naked_subset(3)),
+            ("hidden_triple", lambda: self.hidden_subset(3)),
+        ]
+
+    def eliminate_peers(self, idx: int, bit: int) -> None:
+        for peer in self.topo.peers[idx]:
+            self.candidates[peer] &= ~bit
+
+    def place(self, idx: int, bit: int) -> None:
+        self.cells[idx] = bit.bit_length() - 1
+        self.candidates[idx] = 0
+        self.eliminate_peers(idx, bit)
+
+    def solve(self) -> bool:
+        """Apply techniques until the board is full or none helps, return whether it is full."""
+        while 0 in self.cells:
+            for level, (name, technique) in enumerate(self.techniques):
+                if technique():
+                    self.steps[name] += 1
+                    self.hardest = max(self.hardest, level)
+                    break
+            else:
+                return False
+        return True
+
+    def naked_single(self) -> bool:
+        """Place every cell left with one candidate."""
+        progress = False
+        for idx, candidates in enumerate(self.candidates):
+            if candidates and not candidates & (candidates - 1):
+                self.place(idx, candidates)
+                progress = True
+        return progress
+
+    def hidden_single(self) -> bool:
+        """Place a digit with one cell left in a unit."""
+        for unit in self.topo.units:
+            once = twice = 0
+            for idx in unit:
+                twice |= once & self.candidates[idx]
+                once |= self.candidates[idx]
+            singles = once & ~twice
+            if singles:
+                bit = singles & -singles
+                for idx in unit:
+                    if self.candidates[idx] & bit:
+                        self.place(idx, bit)
+                        return True
+        return False
+
+    def locked_candidates(self) -> bool:
+        """Remove a digit confined to where a square meets a row or col from the rest of the other unit."""
+        size = self.topo.size
+        squares = self.topo.squares
+        lines = self.topo.rows + self.topo.cols
+        for square in squares:
+            for line in lines:
+                shared = set(square) & set(line)
+                if not shared:
+                    continue
+                inside = 0
+                for idx in shared:
+                    inside |= self.candidates[idx]
+                for first, second in ((square, line), (line, square)):
+                    outside_first = 0
+                    for idx in first:
+                        if idx not in shared:
+                            outside_first |= self.candidates[idx]
+                    # digits of first only where it meets second
+                    locked = inside & ~outside_first
+                    progress = False
+                    for idx in second:
+                        if idx not in shared and self.candidates[idx] & locked:
+                            self.candidates[idx] &= ~locked
+                            progress = True
+                    if progress:
+                        return True
+        return False
+
+    def naked_subset(self, n: int) -> bool:
+        """Remove the digits of n cells of a unit holding only those n digits from the rest of the unit."""
+        for unit in self.topo.units:
+            empty = [idx for idx in unit if self.candidates[idx]]
+            if len(empty) <= n:
+                continue
+            small = [idx for idx in empty if self.candidates[idx].bit_count() <= n]
+            for subset in combinations(small, n):
+                digits = 0
+                for idx in subset:
+                    digits |= self.candidates[idx]
+                if digits.bit_count() != n:
+                    continue
+                progress = False
+                for idx in empty:
+                    if idx not in subset and self.candidates[idx] & digits:
+                        self.candidates[idx] &= ~digits
+                        progress = True
+                if progress:
+                    return True
+        return False
+
+    def hidden_subset(self, n: int) -> bool:
+        """Keep only n digits in the n cells of a unit that are the only places for them."""
+        for unit in self.topo.units:
+            empty = [idx for idx in unit if self.candidates[idx]]
+            if len(empty) <= n:
+                continue
+            places = {}
+            for idx in empty:
+                candidates = self.candidates[idx]
+                while candidates:
+                    bit = candidates & -candidates
+                    candidates ^= bit
+                    places.setdefault(bit, []).append(idx)
+            digits = [bit for bit, cells in places.items() if len(cells) <= n]
+            for subset in combinations(digits, n):
+                cells = set()
+                for bit in subset:
+                    cells.update(places[bit])
+                if len(cells) != n:
+                    continue
+                mask = sum(subset)
+                progress = False
+                for idx in cells:
+                    if self.candidates[idx] & ~mask:
+                        self.candidates[idx] &= mask
+                        progress = True
+                if progress:
+                    return True
+        return False
+
+
+def grade(puzzle: Board) -> Dict:
+    """Return tier, hardest technique and search effort of a unique puzzle.
+
+    The hardest technique is the one the logical solver needed, or search
+    when techniques alone get stuck. Nodes and backtracks are those of the
+    default engine solving the puzzle.
+    """
+    solver = LogicalSolver(puzzle)
+    technique = TECHNIQUES[max(solver.hardest, 0)] if solver.solve() else "search"
+    stats = SearchStats()
+    get_engine()(puzzle, stats)
+    tier = TECHNIQUE_TIERS[technique]
+    if tier == "expert" and stats.nodes > EXTREME_NODES:
+        tier = "extreme"
+    return {"tier": tier, "technique": technique, "nodes": stats.nodes, "backtracks": stats.backtracks}
+
+
+def generate_puzzle(box_size: int, seed: int, symmetric: bool = False) -> Dict:
+    """Make and grade one minimal unique puzzle, the same for the same seed."""
+    rng = random.Random(seed)
+    solution = random_solution(box_size, rng)
+    puzzle = minimize(solution, rng, symmetric)
+    graded = grade(puzzle)
+    graded.update({
+        "quizzes": puzzle.to_string(),
+        "solutions": solution.to_string(),
+        "clues": sum(1 for value in puzzle if value),
+    })
+    return graded
+
+
+def _generate_chunk(task: Tuple[int, int, int, int, bool]) -> List[Dict]:
+    box_size, seed, start, count, symmetric = task
+    puzzles = []
+    for index in range(start, start + count):
+        puzzle = generate_puzzle(box_size, puzzle_seed(seed, index), symmetric)
+        puzzle["index"] = index
+        puzzles.append(puzzle)
+    return puzzles
+
+
+def generate_puzzles(
+    box_size: int = 3,
+    seed: int = 0,
+    symmetric: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Dict]:
+    """Yield graded puzzles in index order without end, made by a pool of worker processes.
+
+    Every puzzle comes from its own seed, so the sequence depends only on
+    seed, box_size and symmetric and not on the number of workers.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = 0
+    if workers == 1:
+        while True:
+            yield from _generate_chunk((box_size, seed, start, chunk_size, symmetric))
+            start += chunk_size
+
+    with Pool(workers) as pool:
+        while True:
+            # a few chunks per worker at a time keeps the queue bounded
+            tasks = [(box_size, seed, start + k * chunk_size, chunk_size, symmetric) for k in range(2 * workers)]
+            start += len(tasks) * chunk_size
+            for puzzles in pool.imap(_generate_chunk, tasks):
+                yield from puzzles
+
+
+def generate_corpus(
+    directory: str,
+    count: int,
+    tiers: Sequence[str] = TIERS,
+    box_size: int = 3,
+    seed: int = 0,
+    symmetric: bool = False,
+    workers: Optional[int] = None,
+    max_puzzles: Optional[int] = None,
+    progress: Optional[Callable[[Dict[str, int], int], None]] = None,
+) -> Dict[str, int]:
+    """Write count puzzles of each tier to <tier>.csv in directory, with the settings in manifest.json.
+
+    Puzzles are taken in index order, so the same arguments write the same
+    files. Stops after max_puzzles puzzles are made, count * MAX_PUZZLES_FACTOR
+    by default, and returns the count written per tier, tiers left short are
+    listed as unfilled in the manifest. progress is called with the counts
+    and the puzzles made after every thousand puzzles.
+    """
+    if max_puzzles is None:
+        max_puzzles = count * MAX_PUZZLES_FACTOR
+    for tier in tiers:
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}', expected one of {list(TIERS)}.")
+    os.makedirs(directory, exist_ok=True)
+    counts = {tier: 0 for tier in tiers}
+    made = 0
+    files = {tier: open(os.path.join(directory, f"{tier}.csv"), "w", newline="") for tier in tiers}
+    try:
+        writers = {tier: csv.writer(file) for tier, file in files.items()}
+        for writer in writers.values():
+            writer.writerow(CORPUS_COLUMNS)
+        puzzles = generate_puzzles(box_size, seed, symmetric, workers)
+        try:
+            for puzzle in puzzles:
+                if min(counts.values()) >= count or made >= max_puzzles:
+                    break
+                made += 1
+                tier = puzzle["tier"]
+                if tier in counts and counts[tier] < count:
+                    writers[tier].writerow([puzzle[column] for column in CORPUS_COLUMNS])
+                    counts[tier] += 1
+                if progress is not None and made % 1000 == 0:
+                    progress(counts, made)
+        finally:
+            # stops the worker pool
+            puzzles.close()
+    finally:
+        for file in files.values():
+            file.close()
+
+    with open(os.path.join(directory, "manifest.json"), "w") as file:
+        json.dump({
+            "box_size": box_size,
+            "seed": seed,
+            "symmetric": symmetric,
+            "count": count,
+            "counts": counts,
+            "unfilled": [tier for tier, n in counts.items() if n < count],
+            "puzzles_made": made,
+            "engine": DEFAULT_ENGINE,
+            "extreme_nodes": EXTREME_NODES,
+        }, file, indent=2)
+    return counts
+
+
+def read_corpus(path: str, limit: Optional[int] = None) -> List[Tuple[Board, Board]]:
+    """Return (puzzle, solution) boards of a corpus file, the first limit when given."""
+    boards = []
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            if limit is not None and len(boards) >= limit:
+                break
+            boards.append((Board.from_string(row["quizzes"]), Board.from_string(row["solutions"])))
+    return boards
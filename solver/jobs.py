@@ -0,0 +1,422 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connection
+from django.db.models import Count, F, Min, Sum
+from django.utils import timezone
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import zipfile
+
+from .admission import read_upload
+from .board import Board
+from .cache import get_grid_cache
+from .engines import SearchStats, get_engine
+from .models import Job
+from .pipeline import PipelineError, archive_name, check_extension, solve_batch, solve_grid
+from .utilities import get_prediction_model
+
+logger = logging.getLogger(__name__)
+
+
+########################################################################
+# files of a job directory, the uploads are <index>.upload next to them
+INPUTS_FILE = "inputs.json"
+# files written by a run of a job into its own attempt-<n>/ subdirectory
+RESULTS_FILE = "results.json"
+ARCHIVE_FILE = "solutions.zip"
+# seconds before the first retry of a failed job, doubled on every attempt
+RETRY_DELAY_SECONDS = 5
+# seconds an idle worker waits before looking for jobs again
+POLL_SECONDS = 1.0
+# seconds between sweeps of expired leases and results
+SWEEP_SECONDS = 60
+# due jobs a worker tries to claim before polling again
+CLAIM_CANDIDATES = 8
+# seconds of finished jobs the throughput metrics cover
+METRICS_WINDOW_SECONDS = 300
+# rows deleted at a time, sqlite limits query parameters
+DELETE_CHUNK = 500
+########################################################################
+
+
+# Jobs are rows of the default database with their uploads and results in
+# SOLVER_JOB_DIR/<id>/. Submitting writes the files before the row, so a
+# worker never sees a partial job. Workers claim a job by switching its
+# status with a conditional update, the one whose update matches wins, and
+# keep renewing a lease while they run it. Jobs whose lease runs out, like
+# those of a killed worker, are queued again until SOLVER_JOB_MAX_ATTEMPTS.
+# Each run writes its results into a directory of its attempt, which only
+# becomes the result of the job when the run's update to done matches, so a
+# worker that lost its lease never touches the files of the one that took over.
+
+
+def job_directory(job_id) -> str:
+    return os.path.join(settings.SOLVER_JOB_DIR, str(job_id))
+
+
+def attempt_directory(job: Job) -> str:
+    return os.path.join(job_directory(job.id), f"attempt-{job.attempts}")
+
+
+def _write_json(path: str, data) -> None:
+    # replaced in one step so readers see the old or the new file
+    with open(path + ".tmp", "w") as file:
+        json.dump(data, file)
+    os.replace(path + ".tmp", path)
+
+
+def _read_json(path: str):
+    with open(path) as file:
+        return json.load(file)
+
+
+def _submit(job: Job, write_inputs) -> Job:
+    directory = job_directory(job.id)
+    os.makedirs(directory)
+    try:
+        write_inputs(directory)
+        job.run_after = timezone.now()
+        job.save(force_insert=True)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return job
+
+
+def submit_photos(uploads: Sequence[Tuple[str, Union[bytes, UploadedFile]]], options: Dict) -> Job:
+    """Queue (name, bytes or uploaded file) photos to be solved with the response options of the batch endpoint.
+
+    Uploads failing their extension, header or size checks are kept as
+    failed results in their place, the rest are written to the job
+    directory.
+    """
+    job = Job(kind=Job.PHOTOS, options=options, items=len(uploads))
+
+    def write_inputs(directory):
+        inputs = []
+        for index, (name, upload) in enumerate(uploads):
+            entry = {"name": name}
+            try:
+                check_extension(name)
+                data = read_upload(upload)
+            except PipelineError as e:
+                entry.update(status=e.status, message=e.message, error=e.error)
+            else:
+                entry["file"] = f"{index:06d}.upload"
+                with open(os.path.join(directory, entry["file"]), "wb") as file:
+                    file.write(data)
+            inputs.append(entry)
+        _write_json(os.path.join(directory, INPUTS_FILE), inputs)
+
+    return _submit(job, write_inputs)
+
+
+def submit_grids(grids: Sequence[str], engine: Optional[str] = None) -> Job:
+    """Queue board strings to be solved by engine, SOLVER_ENGINE by default, raising ValueError on malformed boards."""
+    engine = settings.SOLVER_ENGINE if engine is None else engine
+    get_engine(engine)
+    for index, grid in enumerate(grids):
+        if not isinstance(grid, str):
+            raise ValueError(f"Grid {index} is not a board string.")
+        try:
+            Board.from_string(grid)
+        except ValueError as e:
+            raise ValueError(f"Grid {index}: {e}")
+    job = Job(kind=Job.GRIDS, options={"engine": engine}, items=len(grids))
+    return _submit(job, lambda directory: _write_json(os.path.join(directory, INPUTS_FILE), list(grids)))
+
+
+def job_status(job: Job) -> Dict:
+    """Return the status, counts and times of a job as sent to clients."""
+    expires_at = None
+    if job.finished_at is not None and settings.SOLVER_JOB_TTL_SECONDS:
+        expires_at = job.finished_at + timedelta(seconds=settings.SOLVER_JOB_TTL_SECONDS)
+
+    def iso(value):
+        return None if value is None else value.isoformat()
+
+    return {
+        "id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "items": job.items,
+        "solved": job.solved,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": iso(job.created_at),
+        "started_at": iso(job.started_at),
+        "finished_at": iso(job.finished_at),
+        "expires_at": iso(expires_at),
+    }
+
+
+def result_path(job: Job) -> Optional[str]:
+    """Return path of the results of a done job, the zip of solution images or the results json."""
+    if job.status != Job.DONE:
+        return None
+    archive = os.path.join(attempt_directory(job), ARCHIVE_FILE)
+    return archive if os.path.exists(archive) else os.path.join(attempt_directory(job), RESULTS_FILE)
+
+
+def claim(worker: str) -> Optional[Job]:
+    """Take the oldest due queued job for worker, None when there is none."""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by("run_after")
+    for job_id in due.values_list("id", flat=True)[:CLAIM_CANDIDATES]:
+        lease_expires = now + timedelta(seconds=settings.SOLVER_JOB_LEASE_SECONDS)
+        # counted on claim so attempts of killed workers count too
+        claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, started_at=now, lease_expires=lease_expires, attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def requeue_expired() -> int:
+    """Queue running jobs whose lease ran out again, failing those out of attempts, returning the jobs queued."""
+    now = timezone.now()
+    expired = Job.objects.filter(status=Job.RUNNING, lease_expires__lt=now)
+    expired.filter(attempts__gte=settings.SOLVER_JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, error="Worker stopped before the job finished.", finished_at=now, lease_expires=None,
+    )
+    return expired.update(status=Job.QUEUED, worker="", run_after=now, lease_expires=None)
+
+
+def cleanup_expired(ttl_seconds: Optional[int] = None) -> int:
+    """Delete finished jobs and their files older than ttl_seconds, SOLVER_JOB_TTL_SECONDS by default, 0 keeps them."""
+    ttl_seconds = settings.SOLVER_JOB_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    if ttl_seconds <= 0:
+        return 0
+    cutoff = timezone.now() - timedelta(seconds=ttl_seconds)
+    expired = list(
+        Job.objects.filter(status__in=(Job.DONE, Job.FAILED), finished_at__lt=cutoff).values_list("id", flat=True)
+    )
+    for start in range(0, len(expired), DELETE_CHUNK):
+        chunk = expired[start:start + DELETE_CHUNK]
+        Job.objects.filter(id__in=chunk).delete()
+        for job_id in chunk:
+            shutil.rmtree(job_directory(job_id), ignore_errors=True)
+    return len(expired)
+
+
+def queue_metrics(window_seconds: int = METRICS_WINDOW_SECONDS) -> Dict:
+    """Return queue depth by status, age of the oldest queued job and throughput of the last window_seconds."""
+    now = timezone.now()
+    counts = dict(Job.objects.values_list("status").annotate(Count("id")).order_by())
+    queued = Job.objects.filter(status=Job.QUEUED).aggregate(items=Sum("items"), oldest=Min("created_at"))
+    finished = list(
+        Job.objects.filter(
+            status__in=(Job.DONE, Job.FAILED), finished_at__gte=now - timedelta(seconds=window_seconds)
+        ).values_list("items", "created_at", "started_at", "finished_at")
+    )
+    waits = [(started - created).total_seconds() for _, created, started, _ in finished if started is not None]
+    runs = [(done - started).total_seconds() for _, _, started, done in finished if started is not None]
+    return {
+        **{status: counts.get(status, 0) for status, _ in Job.STATUSES},
+        "queued_items": queued["items"] or 0,
+        "oldest_queued_s": None if queued["oldest"] is None else round((now - queued["oldest"]).total_seconds(), 3),
+        "window_s": window_seconds,
+        "finished_jobs": len(finished),
+        "jobs_per_minute": round(len(finished) * 60 / window_seconds, 3),
+        "items_per_second": round(sum(items for items, *_ in finished) / window_seconds, 3),
+        "mean_wait_ms": round(sum(waits) / len(waits) * 1000, 3) if waits else None,
+        "mean_run_ms": round(sum(runs) / len(runs) * 1000, 3) if runs else None,
+    }
+
+
+def _solve_photos(job: Job, directory: str, output: str) -> List[Dict]:
+    """Run the pipeline over the uploads of a job in batches of SOLVER_BATCH_MAX_FILES, writing images to the archive in output."""
+    inputs = _read_json(os.path.join(directory, INPUTS_FILE))
+    results = []
+    archive = None
+    if job.options["format"] != "json":
+        archive = zipfile.ZipFile(os.path.join(output, ARCHIVE_FILE + ".tmp"), "w", zipfile.ZIP_STORED)
+    try:
+        batch = max(settings.SOLVER_BATCH_MAX_FILES, 1)
+        for start in range(0, len(inputs), batch):
+            chunk = list(enumerate(inputs[start:start + batch], start))
+            uploads = []
+            for _, entry in chunk:
+                if "file" in entry:
+                    with open(os.path.join(directory, entry["file"]), "rb") as file:
+                        uploads.append((entry["name"], file.read()))
+            solved = iter(solve_batch(
+                uploads,
+                get_prediction_model(),
+                job.options,
+                settings.SOLVER_BATCH_WORKERS or None,
+                get_grid_cache(),
+            ) if uploads else [])
+            for index, entry in chunk:
+                if "file" not in entry:
+                    results.append({"index": index, "name": entry["name"], "status": entry["status"], "message": entry["message"], "error": entry["error"]})
+                    continue
+                result = next(solved)
+                result["index"] = index
+                image = result.pop("image", None)
+                result.pop("content_type", None)
+                if image is not None:
+                    result["file"] = archive_name(index, result["name"], job.options["format"])
+                    archive.writestr(result["file"], image)
+                results.append(result)
+    except BaseException:
+        if archive is not None:
+            archive.close()
+            os.remove(archive.filename)
+        raise
+    if archive is not None:
+        archive.writestr("status.json", json.dumps(_response(results)))
+        archive.close()
+        os.replace(archive.filename, os.path.join(output, ARCHIVE_FILE))
+    return results
+
+
+def _solve_grids(job: Job, directory: str) -> List[Dict]:
+    """Solve the board strings of a job in a thread pool.
+
+    Each grid stops after SOLVER_MAX_NODES search nodes, its result then has status 503.
+    """
+    grids = _read_json(os.path.join(directory, INPUTS_FILE))
+
+    def solve(item):
+        index, grid = item
+        result = {"index": index, "status": 200, "message": "", "error": ""}
+        stats = SearchStats()
+        try:
+            solved = solve_grid(Board.from_string(grid).to_list(), stats, job.options["engine"])
+        except PipelineError as e:
+            result.update(status=e.status, message=e.message, error=e.error)
+        else:
+            result["solved"] = Board.from_list(solved).to_string()
+        result["search_stats"] = stats.as_dict()
+        return result
+
+    with ThreadPoolExecutor(settings.SOLVER_BATCH_WORKERS or os.cpu_count()) as pool:
+        return list(pool.map(solve, enumerate(grids)))
+
+
+def _response(results: List[Dict]) -> Dict:
+    solved = sum(result["status"] == 200 for result in results)
+    timed_out = sum(result["status"] == 503 for result in results)
+    message = f"Solved {solved} of {len(results)} puzzles."
+    if timed_out:
+        message += f" {timed_out} took too long to solve."
+    return {"message": message, "error": "", "results": results}
+
+
+class _Lease(threading.Thread):
+    """Renew the lease of a running job every third of SOLVER_JOB_LEASE_SECONDS until stopped."""
+
+    def __init__(self, job: Job, worker: str):
+        super().__init__(name=f"lease-{job.id}", daemon=True)
+        self.job = job
+        self.worker = worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        lease = settings.SOLVER_JOB_LEASE_SECONDS
+        try:
+            while not self.stopped.wait(lease / 3):
+                Job.objects.filter(id=self.job.id, status=Job.RUNNING, worker=self.worker, attempts=self.job.attempts).update(
+                    lease_expires=timezone.now() + timedelta(seconds=lease),
+                )
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job: Job, worker: str) -> bool:
+    """Run a claimed job, writing its results, or queue it again after a delay when it raises.
+
+    Returns whether the job finished. Jobs reclaimed by another worker after
+    this one lost its lease are left to that worker, with the results of this
+    run deleted. Runs are told apart by their attempt as well as the worker,
+    since a restarted worker may get the name of the one that stopped.
+    """
+    directory = job_directory(job.id)
+    output = attempt_directory(job)
+    lease = _Lease(job, worker)
+    lease.start()
+    try:
+        os.makedirs(output, exist_ok=True)
+        results = _solve_photos(job, directory, output) if job.kind == Job.PHOTOS else _solve_grids(job, directory)
+        _write_json(os.path.join(output, RESULTS_FILE), _response(results))
+    except Exception as e:
+        lease.stop()
+        shutil.rmtree(output, ignore_errors=True)
+        logger.exception("Job %s failed on attempt %d.", job.id, job.attempts)
+        now = timezone.now()
+        if job.attempts < settings.SOLVER_JOB_MAX_ATTEMPTS:
+            fields = {
+                "status": Job.QUEUED,
+                "run_after": now + timedelta(seconds=RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)),
+            }
+        else:
+            fields = {"status": Job.FAILED, "finished_at": now}
+        Job.objects.filter(id=job.id, status=Job.RUNNING, worker=worker, attempts=job.attempts).update(
+            error=str(e) or type(e).__name__, worker="", lease_expires=None, **fields,
+        )
+        return False
+    lease.stop()
+    solved = sum(result["status"] == 200 for result in results)
+    finished = bool(Job.objects.filter(id=job.id, status=Job.RUNNING, worker=worker, attempts=job.attempts).update(
+        status=Job.DONE, solved=solved, error="", finished_at=timezone.now(), lease_expires=None,
+    ))
+    if not finished:
+        shutil.rmtree(output, ignore_errors=True)
+    return finished
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"[-64:]
+
+
+def work(stop: Optional[threading.Event] = None, burst: bool = False, poll_seconds: float = POLL_SECONDS) -> int:
+    """Claim and run jobs until stop is set, or until none is due when burst, returning the jobs finished.
+
+    Expired leases and results are swept every SWEEP_SECONDS.
+    """
+    stop = threading.Event() if stop is None else stop
+    worker = worker_name()
+    finished = 0
+    swept = None
+    while not stop.is_set():
+        if swept is None or time.monotonic() - swept >= SWEEP_SECONDS:
+            requeue_expired()
+            cleanup_expired()
+            swept = time.monotonic()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll_seconds)
+            continue
+        finished += run_job(job, worker)
+    return finished
+
+
+def run_worker(threads: int, burst: bool = False, poll_seconds: float = POLL_SECONDS) -> int:
+    """Entry point of a worker process, SIGTERM and SIGINT stop it once the running job is done."""
+    from .server import configure_worker
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    configure_worker(threads)
+    try:
+        return work(stop, burst, poll_seconds)
+    finally:
+        connection.close()
@@ -0,0 +1,504 @@
+import atexit
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from functools import lru_cache, wraps
+import hashlib
+from io import BytesIO
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Union
+import uuid
+
+from .admission import HEADER_MAX_BYTES, RejectedUpload, sniff_image
+from .pipeline import PipelineError, StageTimer
+
+logger = logging.getLogger(__name__)
+
+
+########################################################################
+# entries waiting for the writer, requests past this are counted as dropped
+QUEUE_SIZE = 10000
+# entries written at once, and seconds a partial batch may wait
+BATCH_SIZE = 256
+FLUSH_SECONDS = 1.0
+# journal storage, rotating ndjson files or one sqlite database
+JOURNAL_BACKENDS = ("ndjson", "sqlite")
+JOURNAL_DATABASE = "journal.sqlite3"
+# uploads kept by SOLVER_JOURNAL_UPLOADS, named by their sha256
+UPLOADS_DIRECTORY = "uploads"
+# uploads linked by requests for the writer, and seconds before orphans of stopped workers are removed
+PENDING_PREFIX = ".pending-"
+PENDING_SECONDS = 3600
+# seconds between removals of the oldest uploads and database entries past their budget
+PRUNE_SECONDS = 60
+# bytes hashed at a time
+HASH_CHUNK_SIZE = 2**20
+# response bodies read for their message, larger ones are left out
+MESSAGE_MAX_BYTES = 64 * 2**10
+########################################################################
+
+
+# The journal records what each photo request looked like: its uploads,
+# options, stage timings, status and message. The request thread only
+# copies what it needs and hands the entry to a queue. A writer thread
+# sniffs image sizes, hashes and stores uploads, and writes the entries in
+# batches, so the request path never waits on the disk. When the writer
+# falls behind, entries are dropped and counted rather than queued
+# without bound. Both sinks and the kept uploads are bounded: the oldest
+# entries and the least recently seen uploads are removed past their
+# budgets.
+
+
+def mark_stage(request, stage: str) -> None:
+    """Close stage of a journaled request, nothing when the request is not journaled."""
+    timer = getattr(request, "journal_timer", None)
+    if timer is not None:
+        timer.mark(stage)
+
+
+def journal_stages(request) -> Optional[Dict[str, float]]:
+    """Return stage timings of a journaled request for the pipeline to fill, None when not journaled."""
+    timer = getattr(request, "journal_timer", None)
+    return None if timer is None else timer.stages
+
+
+class _NdjsonSink:
+    """Append entries to journal-<time>-<pid>.ndjson files, starting a new file past rotate_bytes."""
+
+    def __init__(self, directory: str, rotate_bytes: int, max_files: int):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.max_files = max_files
+        self.file = None
+
+    def write(self, entries: List[Dict]) -> None:
+        if self.file is None or self.file.tell() >= self.rotate_bytes:
+            self._rotate()
+        self.file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self.file.flush()
+
+    def _rotate(self) -> None:
+        if self.file is not None:
+            self.file.close()
+        name = f"journal-{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10**9:09d}-{os.getpid()}.ndjson"
+        self.file = open(os.path.join(self.directory, name), "a")
+        files = journal_files(self.directory)
+        for name in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # removed by another worker
+                pass
+
+    def prune(self) -> None:
+        # files are removed as they rotate
+        pass
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+class _SqliteSink:
+    """Insert entries into JOURNAL_DATABASE, one transaction per batch, shared by every worker in WAL mode.
+
+    prune deletes the oldest entries past max_bytes of entry json.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(os.path.join(directory, JOURNAL_DATABASE), timeout=20)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS requests ("
+            "id INTEGER PRIMARY KEY, time REAL, endpoint TEXT, status INTEGER, elapsed_ms REAL, entry TEXT)"
+        )
+        self.connection.commit()
+
+    def write(self, entries: List[Dict]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO requests (time, endpoint, status, elapsed_ms, entry) VALUES (?, ?, ?, ?, ?)",
+                [(entry["time"], entry["endpoint"], entry["status"], entry["elapsed_ms"], json.dumps(entry)) for entry in entries],
+            )
+
+    def prune(self) -> None:
+        with self.connection:
+            # the newest entry past the budget counting from the newest, it and everything older go
+            self.connection.execute(
+                "DELETE FROM requests WHERE id <= ("
+                "SELECT id FROM (SELECT id, SUM(LENGTH(entry)) OVER (ORDER BY id DESC) AS kept FROM requests) "
+                "WHERE kept > ? ORDER BY id DESC LIMIT 1)",
+                (self.max_bytes,),
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class JournalWriter:
+    """Write journal entries to directory from a background thread in batches of BATCH_SIZE.
+
+    submit never blocks, it returns False and counts the entry as dropped
+    when QUEUE_SIZE entries are already waiting. With keep_uploads the
+    upload bytes are stored once per content in UPLOADS_DIRECTORY. The
+    ndjson sink keeps max_files files of rotate_bytes, the sqlite sink as
+    many bytes of entries, and the least recently seen uploads past
+    max_upload_bytes are removed, every PRUNE_SECONDS.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        backend: str = "ndjson",
+        keep_uploads: bool = False,
+        rotate_bytes: int = 64 * 2**20,
+        max_files: int = 100,
+        max_upload_bytes: int = 2**30,
+        queue_size: int = QUEUE_SIZE,
+    ):
+        if backend not in JOURNAL_BACKENDS:
+            raise ValueError(f"Journal backend must be one of {JOURNAL_BACKENDS}.")
+        self.directory = directory
+        self.backend = backend
+        self.keep_uploads = keep_uploads
+        self.rotate_bytes = rotate_bytes
+        self.max_files = max_files
+        self.max_upload_bytes = max_upload_bytes
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        os.makedirs(os.path.join(directory, UPLOADS_DIRECTORY) if keep_uploads else directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="solver-journal", daemon=True)
+        self.thread.start()
+
+    def submit(self, entry: Dict, uploads: List[Union[bytes, str]], body: Optional[bytes] = None) -> bool:
+        """Queue an entry with the captured bytes or pending file paths of its uploads and its json response body."""
+        try:
+            self.queue.put_nowait(("entry", (entry, uploads, body)))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until entries submitted before are written, False on timeout."""
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            self.queue.put(("close", None))
+            self.thread.join()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {"written": self.written, "dropped": self.dropped, "failed": self.failed, "waiting": self.queue.qsize()}
+
+    def _run(self) -> None:
+        if self.backend == "sqlite":
+            sink = _SqliteSink(self.directory, self.rotate_bytes * self.max_files)
+        else:
+            sink = _NdjsonSink(self.directory, self.rotate_bytes, self.max_files)
+        batch = []
+        pruned = None
+        try:
+            while True:
+                try:
+                    kind, item = self.queue.get(timeout=FLUSH_SECONDS if batch else None)
+                except queue.Empty:
+                    kind, item = "flush", None
+                if kind == "entry":
+                    batch.append(item)
+                    if len(batch) < BATCH_SIZE:
+                        continue
+                self._write(sink, batch)
+                batch = []
+                if pruned is None or time.monotonic() - pruned >= PRUNE_SECONDS:
+                    self._prune(sink)
+                    pruned = time.monotonic()
+                if kind == "flush" and item is not None:
+                    item.set()
+                elif kind == "close":
+                    return
+        finally:
+            sink.close()
+
+    def _write(self, sink, batch) -> None:
+        if not batch:
+            return
+        try:
+            entries = [self._complete(*item) for item in batch]
+            sink.write(entries)
+        except Exception:
+            # the journal never takes the server down
+            logger.exception("Failed to write %d journal entries.", len(batch))
+            with self.lock:
+                self.failed += len(batch)
+            return
+        with self.lock:
+            self.written += len(entries)
+
+    def _prune(self, sink) -> None:
+        try:
+            sink.prune()
+            if self.keep_uploads:
+                prune_uploads(self.directory, self.max_upload_bytes)
+        except Exception:
+            logger.exception("Failed to prune the journal.")
+
+    def _complete(self, entry: Dict, uploads: List[Union[bytes, str]], body: Optional[bytes]) -> Dict:
+        """Add image type and size, stored upload hashes and the response message to an entry."""
+        for upload, data in zip(entry["uploads"], uploads):
+            if isinstance(data, str):
+                self._store_pending(upload, data)
+                continue
+            self._sniff(upload, data[:HEADER_MAX_BYTES])
+            if self.keep_uploads and data and len(data) == upload["size"]:
+                upload["sha256"] = hashlib.sha256(data).hexdigest()
+                path = upload_path(self.directory, upload["sha256"])
+                if os.path.exists(path):
+                    # seen again, pruning removes the least recently seen first
+                    os.utime(path)
+                else:
+                    with open(path + ".tmp", "wb") as file:
+                        file.write(data)
+                    os.replace(path + ".tmp", path)
+        if body is not None:
+            try:
+                message = json.loads(body).get("message")
+            except (ValueError, AttributeError):
+                message = None
+            if message is not None:
+                entry["message"] = message
+        return entry
+
+    @staticmethod
+    def _sniff(upload: Dict, head: bytes) -> None:
+        try:
+            header = sniff_image(head)
+        except PipelineError:
+            header = None
+        if header is not None:
+            upload.update(format=header.format, width=header.width, height=header.height)
+
+    def _store_pending(self, upload: Dict, pending: str) -> None:
+        """Hash an upload linked by the request and move it to its content path."""
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with open(pending, "rb") as file:
+                    self._sniff(upload, file.read(HEADER_MAX_BYTES))
+                    file.seek(0)
+                    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                        size += len(chunk)
+            except FileNotFoundError:
+                # pruned as left by a stopped worker
+                return
+            if size != upload["size"]:
+                return
+            upload["sha256"] = digest.hexdigest()
+            path = upload_path(self.directory, upload["sha256"])
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                os.replace(pending, path)
+                os.utime(path)
+        finally:
+            try:
+                os.remove(pending)
+            except FileNotFoundError:
+                pass
+
+
+def upload_path(directory: str, sha256: str) -> str:
+    return os.path.join(directory, UPLOADS_DIRECTORY, sha256)
+
+
+def prune_uploads(directory: str, max_bytes: int) -> int:
+    """Remove the least recently seen kept uploads until they take at most max_bytes, returning the files removed.
+
+    Pending uploads are left to their writer unless older than PENDING_SECONDS.
+    """
+    files = []
+    removed = 0
+    for entry in os.scandir(os.path.join(directory, UPLOADS_DIRECTORY)):
+        try:
+            stat = entry.stat()
+            if not entry.name.startswith(PENDING_PREFIX) and not entry.name.endswith(".tmp"):
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+            elif time.time() - stat.st_mtime >= PENDING_SECONDS:
+                # left by a stopped worker
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # removed by another worker
+            pass
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def _capture(writer: JournalWriter, upload) -> Union[bytes, str]:
+    """Return what the writer needs of an upload without copying it on the request thread.
+
+    Only the header is read unless uploads are kept. Kept uploads held in
+    memory share their buffer with the writer, and those Django streamed to
+    a temporary file, which it deletes after the request, are hard linked
+    into UPLOADS_DIRECTORY for the writer to hash and move.
+    """
+    if not writer.keep_uploads:
+        upload.seek(0)
+        head = upload.read(HEADER_MAX_BYTES)
+        upload.seek(0)
+        return head
+    if isinstance(upload, TemporaryUploadedFile):
+        pending = os.path.join(writer.directory, UPLOADS_DIRECTORY, PENDING_PREFIX + uuid.uuid4().hex)
+        try:
+            os.link(upload.temporary_file_path(), pending)
+            return pending
+        except OSError:
+            # on another file system, read it instead
+            pass
+    if isinstance(upload.file, BytesIO):
+        # shares the buffer until the file is written to again
+        return upload.file.getvalue()
+    upload.seek(0)
+    data = upload.read()
+    upload.seek(0)
+    return data
+
+
+@lru_cache(maxsize=1)
+def get_journal() -> Optional[JournalWriter]:
+    """Return the writer of this process, None when SOLVER_JOURNAL_DIR is empty."""
+    if not settings.SOLVER_JOURNAL_DIR:
+        return None
+    writer = JournalWriter(
+        settings.SOLVER_JOURNAL_DIR,
+        settings.SOLVER_JOURNAL_BACKEND,
+        settings.SOLVER_JOURNAL_UPLOADS,
+        settings.SOLVER_JOURNAL_ROTATE_BYTES,
+        settings.SOLVER_JOURNAL_MAX_FILES,
+        settings.SOLVER_JOURNAL_UPLOADS_MAX_BYTES,
+    )
+    # entries still queued are written when the worker exits
+    atexit.register(writer.close)
+    return writer
+
+
+def journal_request(method):
+    """Journal a view method when SOLVER_JOURNAL_DIR is set, timing the stages it marks."""
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        writer = get_journal()
+        if writer is None:
+            return method(self, request, *args, **kwargs)
+        started = time.time()
+        start_time = time.perf_counter()
+        request.journal_timer = StageTimer()
+        response = method(self, request, *args, **kwargs)
+        elapsed = (time.perf_counter() - start_time) * 1000
+
+        entries = []
+        captured = []
+        for field, files in request.FILES.lists():
+            for upload in files:
+                entry = {"field": field, "name": upload.name, "size": upload.size, "content_type": upload.content_type}
+                if isinstance(upload, RejectedUpload):
+                    entry["rejected"] = upload.error.message
+                    captured.append(b"")
+                    entries.append(entry)
+                    continue
+                captured.append(_capture(writer, upload))
+                entries.append(entry)
+
+        content_type = response.get("Content-Type", "")
+        body = None
+        if content_type.startswith("application/json") and not response.streaming and len(response.content) <= MESSAGE_MAX_BYTES:
+            body = response.content
+        submitted = writer.submit(
+            {
+                "time": started,
+                "pid": os.getpid(),
+                "endpoint": type(self).__name__,
+                "method": request.method,
+                "path": request.path,
+                "query": request.META.get("QUERY_STRING", ""),
+                "accept": request.META.get("HTTP_ACCEPT", ""),
+                "form": {key: value for key, value in request.POST.items()},
+                "uploads": entries,
+                "status": response.status_code,
+                "elapsed_ms": round(elapsed, 3),
+                "stages": request.journal_timer.stages,
+                "response_type": content_type,
+                "response_bytes": None if response.streaming else len(response.content),
+            },
+            captured,
+            body,
+        )
+        if not submitted:
+            for pending in captured:
+                if isinstance(pending, str):
+                    os.remove(pending)
+        return response
+
+    return wrapper
+
+
+def journal_files(directory: str) -> List[str]:
+    """Return ndjson journal file names, oldest first."""
+    try:
+        return sorted(name for name in os.listdir(directory) if name.startswith("journal-") and name.endswith(".ndjson"))
+    except FileNotFoundError:
+        return []
+
+
+def read_journal(directory: str, limit: Optional[int] = None) -> List[Dict]:
+    """Return entries of the ndjson files and database of a journal directory, oldest first."""
+    entries = []
+    for name in journal_files(directory):
+        with open(os.path.join(directory, name)) as file:
+            for line in file:
+                # the writer may be halfway through a line
+                if line.endswith("\n"):
+                    entries.append(json.loads(line))
+    database = os.path.join(directory, JOURNAL_DATABASE)
+    if os.path.exists(database):
+        connection = sqlite3.connect(database, timeout=20)
+        try:
+            entries.extend(json.loads(row[0]) for row in connection.execute("SELECT entry FROM requests ORDER BY time"))
+        finally:
+            connection.close()
+    entries.sort(key=lambda entry: entry["time"])
+    return entries[:limit]
+
+
+def replayable(entries: List[Dict], directory: str) -> Iterator[Dict]:
+    """Yield entries whose every upload was kept, the ones replay can send again."""
+    for entry in entries:
+        uploads = entry["uploads"]
+        if uploads and all("sha256" in upload and os.path.exists(upload_path(directory, upload["sha256"])) for upload in uploads):
+            yield entry
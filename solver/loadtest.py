@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import os
+import requests
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+########################################################################
+# seconds to wait for a started server to answer
+SERVER_START_TIMEOUT = 300
+########################################################################
+
+
+def run_load(
+    url: str,
+    puzzle: bytes,
+    concurrency: int = 4,
+    duration: float = 30.0,
+    name: str = "puzzle.jpg",
+) -> Dict:
+    """Post the puzzle from concurrency clients for duration seconds and return throughput and latency summary."""
+    deadline = time.perf_counter() + duration
+
+    def client(_):
+        session = requests.Session()
+        latencies = []
+        statuses = {}
+        while time.perf_counter() < deadline:
+            start_time = time.perf_counter()
+            try:
+                response = session.post(url, files={"puzzle": (name, puzzle)}, timeout=120)
+                status = response.status_code
+            except requests.RequestException:
+                status = 0
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+        return latencies, statuses
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+
+    statuses = {}
+    for _, counts in results:
+        for status, count in counts.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return summarize([latency for result in results for latency in result[0]], statuses, elapsed)
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> Dict:
+    """Return request count, statuses, throughput and mean, p50, p95 and p99 latency."""
+    latencies = np.array(latencies)
+    return {
+        "requests": len(latencies),
+        "statuses": statuses,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": float(latencies.mean()) if len(latencies) else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+        "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+    }
+
+
+def replay_entries(
+    entries: List[Dict],
+    base_url: str,
+    directory: str,
+    speed: float = 1.0,
+    concurrency: int = 16,
+) -> Dict:
+    """Send journaled requests again with their kept uploads, options and Accept header, returning the summary of run_load.
+
+    Requests start at their recorded offsets divided by speed, or as fast as
+    concurrency clients allow when speed is 0. late_p95_ms is how far
+    behind their schedule requests started, the recorded_* figures are the
+    throughput and latency of the journaled requests. Entries whose uploads
+    were pruned since they were read are counted as skipped and left out of
+    both the replayed and the recorded figures.
+    """
+    # journal pulls in the vision pipeline, load tests of a url do not need it
+    from .journal import upload_path
+
+    entries = sorted(entries, key=lambda entry: entry["time"])
+    local = threading.local()
+    statuses = {}
+    latencies = []
+    late = []
+    lock = threading.Lock()
+
+    def send(entry, due):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        files = []
+        try:
+            for upload in entry["uploads"]:
+                with open(upload_path(directory, upload["sha256"]), "rb") as file:
+                    files.append((upload["field"], (upload["name"], file.read(), upload["content_type"])))
+        except FileNotFoundError:
+            # pruned by the journal writer after the entry was read
+            return False
+        url = base_url.rstrip("/") + entry["path"] + (f"?{entry['query']}" if entry["query"] else "")
+        headers = {"Accept": entry["accept"]} if entry["accept"] else {}
+        start_time = time.perf_counter()
+        try:
+            response = session.post(url, data=entry["form"], files=files, headers=headers, timeout=120)
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        latency = (time.perf_counter() - start_time) * 1000
+        with lock:
+            latencies.append(latency)
+            late.append(max(start_time - due, 0.0) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+        return True
+
+    start_time = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(concurrency) as pool:
+        for entry in entries:
+            due = start_time
+            if speed > 0:
+                due += (entry["time"] - entries[0]["time"]) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(send, entry, due))
+    elapsed = time.perf_counter() - start_time
+    sent = [entry for entry, future in zip(entries, futures) if future.result()]
+
+    summary = summarize(latencies, statuses, elapsed)
+    recorded = np.array([entry["elapsed_ms"] for entry in sent])
+    summary.update({
+        "skipped": len(futures) - len(sent),
+        "late_p95_ms": float(np.percentile(late, 95)) if late else 0.0,
+        "recorded_throughput": len(sent) / max(sent[-1]["time"] - sent[0]["time"], 1e-9) if len(sent) > 1 else 0.0,
+        "recorded_p50_ms": float(np.percentile(recorded, 50)) if len(recorded) else 0.0,
+        "recorded_p95_ms": float(np.percentile(recorded, 95)) if len(recorded) else 0.0,
+        "recorded_p99_ms": float(np.percentile(recorded, 99)) if len(recorded) else 0.0,
+    })
+    return summary
+
+
+def start_server(workers: int, port: int, env: Optional[Dict] = None) -> subprocess.Popen:
+    """Start runprod with the given workers in the background and wait until it answers."""
+    manage = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "manage.py")
+    process = subprocess.Popen(
+        [sys.executable, manage, "runprod", "--workers", str(workers), "--bind", f"127.0.0.1:{port}"],
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.perf_counter() + SERVER_START_TIMEOUT
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}.")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/v1/solve/", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not start in time.")
+
+
+def scale_workers(
+    worker_counts: List[int],
+    puzzle: bytes,
+    path: str = "/api/v1/solve/",
+    duration: float = 30.0,
+    port: int = 8765,
+    clients_per_worker: int = 2,
+    name: str = "puzzle.jpg",
+) -> List[Dict]:
+    """Load a fresh server for every worker count, speedup is relative to the first count."""
+    results = []
+    baseline = None
+    for workers in worker_counts:
+        process = start_server(workers, port)
+        try:
+            url = f"http://127.0.0.1:{port}{path}"
+            # first requests of each worker are not timed
+            run_load(url, puzzle, workers * clients_per_worker, min(duration, 3.0), name)
+            summary = run_load(url, puzzle, workers * clients_per_worker, duration, name)
+        finally:
+            process.terminate()
+            process.wait()
+        if baseline is None:
+            baseline = summary["throughput"]
+        summary.update({
+            "workers": workers,
+            "clients": workers * clients_per_worker,
+            "speedup": summary["throughput"] / baseline if baseline else 0.0,
+        })
+        results.append(summary)
+    return results
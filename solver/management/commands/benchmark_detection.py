@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import glob
+import os
+
+from ...benchmarks import benchmark_detection
+
+
+class Command(BaseCommand):
+    help = "Compare grid detection of biggest_contour and detect_grid on degraded puzzle photos."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="Photos to test, defaults to the unsolved photos in data/puzzles.",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per photo.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the added noise.")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [
+            path
+            for path in sorted(glob.glob(os.path.join(settings.BASE_DIR, "data/puzzles/*.jpg")))
+            if "_" not in os.path.basename(path)
+        ]
+        results = benchmark_detection(paths, options["repeat"], options["seed"])
+
+        self.stdout.write(f"{'method':>9} {'detected':>9} {'rate':>6} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for result in results:
+            self.stdout.write(
+                f"{result['method']:>9} {result['detected']:>4}/{result['count']:<4} {result['rate']:>6.1%} "
+                f"{result['mean_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['max_ms']:>9.3f}"
+            )
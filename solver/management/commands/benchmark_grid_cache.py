@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import glob
+import os
+
+from ...benchmarks import benchmark_grid_cache
+
+
+class Command(BaseCommand):
+    help = "Measure grid cache hits and false matches on recompressed, resized, cropped and relit puzzle photos."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="Photos to test, defaults to the unsolved photos in data/puzzles.",
+        )
+        parser.add_argument("--distance", type=int, default=None, help="Most differing hash bits of a hit.")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [
+            path
+            for path in sorted(glob.glob(os.path.join(settings.BASE_DIR, "data/puzzles/*.jpg")))
+            if "_" not in os.path.basename(path)
+        ]
+        stats = benchmark_grid_cache(paths, options["distance"])
+
+        self.stdout.write(f"photos cached      {stats['photos']}")
+        self.stdout.write(f"variants looked up {stats['lookups']} ({stats['undetected']} without a grid)")
+        self.stdout.write(f"hits               {stats['hits']} ({stats['hit_rate']:.1%})")
+        self.stdout.write(f"misses             {stats['misses']}")
+        self.stdout.write(f"rejected matches   {stats['rejected']}")
+        self.stdout.write(f"false matches      {stats['false_matches']}")
+        self.stdout.write(f"key and lookup     {stats['mean_ms']:.3f} ms")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from ...benchmarks import benchmark_corpus, benchmark_sizes
+from ...engines import ENGINES
+from ...topology import box_size_for
+
+
+class Command(BaseCommand):
+    help = "Time the solver engines on random puzzles of each board size, or on the puzzles of corpus files."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[4, 9, 16, 25], help="Board sizes to benchmark.")
+        parser.add_argument("--count", type=int, default=50, help="Puzzles per board size or corpus file.")
+        parser.add_argument(
+            "--engines",
+            nargs="+",
+            default=[name for name in ENGINES if name not in ("heap", "portfolio")],
+            choices=["auto", *ENGINES],
+            help="Engines to compare, speedup is relative to the first.",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the random puzzles.")
+        parser.add_argument("--corpus", nargs="+", default=[], help="Corpus csv files written by generate_puzzles to time instead.")
+
+    def handle(self, *args, **options):
+        if options["corpus"]:
+            results = benchmark_corpus(options["corpus"], options["count"], options["engines"])
+        else:
+            box_sizes = [box_size_for(size) for size in options["sizes"]]
+            results = benchmark_sizes(box_sizes, options["count"], options["engines"], options["seed"])
+
+        self.stdout.write(f"{'puzzles':>9} {'engine':>9} {'solved':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'speedup':>8} {'nodes':>9} {'backtracks':>10}")
+        for result in results:
+            size = result["size"]
+            label = result.get("corpus", f"{size}x{size}")
+            self.stdout.write(
+                f"{label:>9} {result['engine']:>9} {result['solved']:>4}/{result['count']:<4} "
+                f"{result['mean_ms']:>9.3f} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['max_ms']:>9.3f} {result['speedup']:>7.1f}x "
+                f"{result['nodes']:>9.1f} {result['backtracks']:>10.1f}"
+            )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from ...benchmarks import benchmark_synthetic
+
+
+class Command(BaseCommand):
+    help = "Measure grid detection and digit reading accuracy and throughput on rendered puzzle photos."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Directory written by render_puzzles.")
+        parser.add_argument("--limit", type=int, default=None, help="Images to test, all by default.")
+        parser.add_argument("--no-predict", action="store_true", help="Only locate grids, without loading the model.")
+
+    def handle(self, *args, **options):
+        model = None
+        if not options["no_predict"]:
+            from ...utilities import get_prediction_model
+            model = get_prediction_model()
+        result = benchmark_synthetic(options["directory"], model, options["limit"])
+
+        self.stdout.write(f"images       {result['count']} ({result['images_per_second']:.1f}/s)")
+        self.stdout.write(f"detected     {result['detected']} ({result['detection_rate']:.1%})")
+        self.stdout.write(f"locate ms    mean {result['locate_mean_ms']:.1f}, p95 {result['locate_p95_ms']:.1f}")
+        if model is not None:
+            accuracy = result["cell_accuracy"]
+            self.stdout.write(f"grids read   {result['read']}/{result['detected']}")
+            self.stdout.write(f"cell accuracy {'-' if accuracy is None else f'{accuracy:.2%}'}")
+            if result["predict_mean_ms"] is not None:
+                self.stdout.write(f"predict ms   mean {result['predict_mean_ms']:.1f}")
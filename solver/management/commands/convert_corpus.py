@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+import os
+import time
+
+from ...corpus import CORPUS_EXTENSION, convert_csv
+
+
+class Command(BaseCommand):
+    help = "Convert a csv of puzzle strings to a memory-mappable binary corpus."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Csv file with a column of puzzle strings.")
+        parser.add_argument("out", nargs="?", default=None, help=f"Binary corpus file, the source with {CORPUS_EXTENSION} by default.")
+        parser.add_argument("--quizzes", default="quizzes", help="Column of the puzzles.")
+        parser.add_argument("--solutions", default="solutions", help="Column of the solutions.")
+        parser.add_argument("--no-solutions", action="store_true", help="Leave the solutions out.")
+        parser.add_argument("--limit", type=int, default=None, help="Convert only the first puzzles.")
+
+    def handle(self, *args, **options):
+        out = options["out"] or os.path.splitext(options["source"])[0] + CORPUS_EXTENSION
+        solutions = None if options["no_solutions"] else options["solutions"]
+        start_time = time.perf_counter()
+        try:
+            count = convert_csv(options["source"], out, options["quizzes"], solutions, options["limit"])
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        elapsed = time.perf_counter() - start_time
+        self.stdout.write(f"Wrote {count} puzzles to {out} ({os.path.getsize(out)} bytes) in {elapsed:.1f}s")
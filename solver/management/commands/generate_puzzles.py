@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+import time
+
+from ...generator import MAX_PUZZLES_FACTOR, TIERS, generate_corpus
+from ...topology import box_size_for
+
+
+class Command(BaseCommand):
+    help = "Generate minimal unique puzzles graded by difficulty, writing a csv corpus per tier."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--out", required=True, help="Directory of the corpus files.")
+        parser.add_argument("--count", type=int, default=1000, help="Puzzles per tier.")
+        parser.add_argument("--tiers", nargs="+", default=list(TIERS), choices=TIERS, help="Tiers to write.")
+        parser.add_argument("--size", type=int, default=9, help="Board size.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus, the same seed writes the same puzzles.")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes, all cores by default.")
+        parser.add_argument("--symmetric", action="store_true", help="Keep clues symmetric through the center.")
+        parser.add_argument(
+            "--max-puzzles",
+            type=int,
+            default=None,
+            help=f"Stop after making this many puzzles, {MAX_PUZZLES_FACTOR} times --count by default.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            box_size = box_size_for(options["size"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        start_time = time.perf_counter()
+
+        def progress(counts, made):
+            rate = made / (time.perf_counter() - start_time)
+            self.stderr.write(f"{made} puzzles, {rate:.0f}/s, " + ", ".join(f"{tier} {n}" for tier, n in counts.items()))
+
+        counts = generate_corpus(
+            options["out"],
+            options["count"],
+            options["tiers"],
+            box_size,
+            options["seed"],
+            options["symmetric"],
+            options["workers"],
+            options["max_puzzles"],
+            progress,
+        )
+        elapsed = time.perf_counter() - start_time
+        for tier, n in counts.items():
+            self.stdout.write(f"{tier:>8} {n:>9}")
+        self.stdout.write(f"Wrote {sum(counts.values())} puzzles to {options['out']} in {elapsed:.1f}s")
+        unfilled = [tier for tier, n in counts.items() if n < options["count"]]
+        if unfilled:
+            self.stderr.write(f"Gave up before filling {', '.join(unfilled)}, raise --max-puzzles to find more.")
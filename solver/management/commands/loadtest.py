@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import os
+
+from ...loadtest import run_load, scale_workers
+
+
+class Command(BaseCommand):
+    help = "Post a puzzle photo concurrently and report throughput and latency, optionally for several worker counts."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--puzzle",
+            default=os.path.join(settings.BASE_DIR, "data/puzzles/3.jpg"),
+            help="Photo to post.",
+        )
+        parser.add_argument("--url", default="http://127.0.0.1:8000/api/v1/solve/", help="Endpoint of a running server.")
+        parser.add_argument("--concurrency", type=int, default=4, help="Clients posting at once.")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds of load per run.")
+        parser.add_argument(
+            "--workers",
+            nargs="+",
+            type=int,
+            default=None,
+            help="Start runprod with each worker count in turn instead of using --url, with two clients per worker.",
+        )
+        parser.add_argument("--port", type=int, default=8765, help="Port of the servers started for --workers.")
+        parser.add_argument("--path", default="/api/v1/solve/?format=json", help="Endpoint of the servers started for --workers.")
+
+    def handle(self, *args, **options):
+        with open(options["puzzle"], "rb") as file:
+            puzzle = file.read()
+        name = os.path.basename(options["puzzle"])
+
+        if options["workers"]:
+            results = scale_workers(
+                options["workers"], puzzle, options["path"], options["duration"], options["port"], name=name
+            )
+        else:
+            results = [run_load(options["url"], puzzle, options["concurrency"], options["duration"], name)]
+
+        self.stdout.write(f"{'workers':>8} {'requests':>9} {'req/s':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'speedup':>8}  statuses")
+        for result in results:
+            statuses = ", ".join(f"{status}: {count}" for status, count in sorted(result["statuses"].items()))
+            self.stdout.write(
+                f"{result.get('workers', '-'):>8} {result['requests']:>9} {result['throughput']:>8.2f} {result['mean_ms']:>9.1f} "
+                f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result.get('speedup', 1.0):>7.2f}x  {statuses}"
+            )
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import os
+
+from ...profiling import ProfileRing, profile_summary
+
+
+class Command(BaseCommand):
+    help = "List request profiles in SOLVER_PROFILE_DIR and show the functions with the most samples in one of them."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("profile", nargs="?", default=None, help="Profile file name or path, the newest when left out.")
+        parser.add_argument("--top", type=int, default=20, help="Functions shown.")
+        parser.add_argument("--list", action="store_true", help="Only list the kept profiles, oldest first.")
+
+    def handle(self, *args, **options):
+        ring = ProfileRing(settings.SOLVER_PROFILE_DIR or ".", settings.SOLVER_PROFILE_MAX_FILES)
+        if options["list"]:
+            for name in ring.files():
+                self.stdout.write(name)
+            return
+
+        path = options["profile"]
+        if path is None:
+            files = ring.files()
+            if not files:
+                raise CommandError(f"No profiles in '{ring.directory}'.")
+            path = files[-1]
+        if not os.path.exists(path):
+            path = os.path.join(ring.directory, path)
+        with open(path) as file:
+            summary = profile_summary(file.read(), options["top"])
+
+        self.stdout.write(os.path.basename(path))
+        self.stdout.write(f"{'total':>7} {'own':>7}  function")
+        for row in summary:
+            self.stdout.write(f"{row['share']:>6.1%} {row['own']:>7}  {row['frame']}")
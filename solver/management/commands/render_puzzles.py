@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from itertools import islice
+import time
+
+from ...board import Board
+from ...corpus import CORPUS_EXTENSION, open_corpus
+from ...generator import generate_puzzles, read_corpus
+from ...synthetic import write_dataset
+
+
+class Command(BaseCommand):
+    help = "Render 9x9 puzzles as synthetic photos with their ground truth grids and corners."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--out", required=True, help="Directory of the images and labels.jsonl.")
+        parser.add_argument("--count", type=int, default=1000, help="Images to render.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the puzzles and of how they are drawn.")
+        parser.add_argument("--corpus", default=None, help="Csv or binary corpus to draw puzzles from instead of generating them.")
+        parser.add_argument("--workers", type=int, default=None, help="Render threads, all cores by default.")
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        if options["corpus"] is None:
+            puzzles = islice(generate_puzzles(3, options["seed"], workers=1), count)
+            grids = [Board.from_string(puzzle["quizzes"]).to_list() for puzzle in puzzles]
+        elif options["corpus"].endswith(CORPUS_EXTENSION):
+            grids = [puzzle.to_list() for puzzle, _ in open_corpus(options["corpus"]).boards(0, count)]
+        else:
+            grids = [puzzle.to_list() for puzzle, _ in read_corpus(options["corpus"], count)]
+        if any(len(grid) != 9 for grid in grids):
+            raise CommandError("Only 9x9 puzzles can be rendered.")
+
+        start_time = time.perf_counter()
+        written = write_dataset(options["out"], grids, options["seed"], options["workers"])
+        elapsed = time.perf_counter() - start_time
+        self.stdout.write(f"Rendered {written} images to {options['out']} in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.1f}/s)")
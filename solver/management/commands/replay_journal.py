@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...journal import read_journal, replayable
+from ...loadtest import replay_entries
+
+
+class Command(BaseCommand):
+    help = "Send the journaled requests with kept uploads to a server again and report throughput and latency."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", nargs="?", default=None, help="Journal directory, SOLVER_JOURNAL_DIR by default.")
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server the requests are sent to, their paths are kept.")
+        parser.add_argument("--speed", type=float, default=1.0, help="Multiple of the recorded rate, 0 sends as fast as the clients allow.")
+        parser.add_argument("--concurrency", type=int, default=16, help="Most requests in flight at once.")
+        parser.add_argument("--endpoint", default=None, help="Only replay requests of this view, like Sudoku_API.")
+        parser.add_argument("--limit", type=int, default=None, help="Replay at most this many requests.")
+
+    def handle(self, *args, **options):
+        directory = options["directory"] or settings.SOLVER_JOURNAL_DIR
+        if not directory:
+            raise CommandError("Pass a journal directory or set SOLVER_JOURNAL_DIR.")
+        entries = read_journal(directory)
+        if options["endpoint"]:
+            entries = [entry for entry in entries if entry["endpoint"] == options["endpoint"]]
+        runnable = list(replayable(entries, directory))[:options["limit"]]
+        if not runnable:
+            raise CommandError(f"No journaled request in {directory} kept its uploads, set SOLVER_JOURNAL_UPLOADS to keep them.")
+        self.stdout.write(f"Replaying {len(runnable)} of {len(entries)} journaled requests")
+
+        result = replay_entries(runnable, options["url"], directory, options["speed"], options["concurrency"])
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(result["statuses"].items()))
+        self.stdout.write(f"{'':>9} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        self.stdout.write(
+            f"{'recorded':>9} {result['requests']:>9} {result['recorded_throughput']:>8.2f} "
+            f"{result['recorded_p50_ms']:>9.1f} {result['recorded_p95_ms']:>9.1f} {result['recorded_p99_ms']:>9.1f}"
+        )
+        self.stdout.write(
+            f"{'replayed':>9} {result['requests']:>9} {result['throughput']:>8.2f} "
+            f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}"
+        )
+        self.stdout.write(f"Statuses {statuses}, mean {result['mean_ms']:.1f} ms, p95 start delay {result['late_p95_ms']:.1f} ms")
+        if result["skipped"]:
+            self.stderr.write(f"Skipped {result['skipped']} requests whose uploads were pruned while replaying.")
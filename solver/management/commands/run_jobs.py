@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+import multiprocessing
+import os
+import signal
+
+from ...jobs import POLL_SECONDS, cleanup_expired, requeue_expired, run_worker
+from ...server import worker_threads
+
+
+class Command(BaseCommand):
+    help = "Run worker processes that solve queued jobs until stopped."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes.")
+        parser.add_argument("--threads", type=int, default=None, help="TensorFlow and OpenCV threads per worker, defaults to cores / workers.")
+        parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="Seconds an idle worker waits between looking for jobs.")
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is due instead of waiting for more.")
+        parser.add_argument("--cleanup", action="store_true", help="Queue jobs of stopped workers again and delete expired results, then exit.")
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            requeued = requeue_expired()
+            deleted = cleanup_expired()
+            self.stdout.write(f"Queued {requeued} stopped jobs again, deleted {deleted} expired jobs")
+            return
+
+        workers = max(options["workers"], 1)
+        threads = options["threads"] or worker_threads(workers)
+        if workers == 1:
+            finished = run_worker(threads, options["burst"], options["poll"])
+            self.stdout.write(f"Finished {finished} jobs")
+            return
+
+        # forked before TensorFlow starts, every worker opens its own database connection
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=run_worker, args=(threads, options["burst"], options["poll"]), name=f"job-worker-{index}")
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        def forward(signum, frame):
+            # workers stop once their running job is done
+            for process in processes:
+                if process.is_alive():
+                    os.kill(process.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for process in processes:
+            process.join()
+        self.stdout.write(f"Stopped {workers} workers")
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import os
+import sys
+
+
+class Command(BaseCommand):
+    help = "Run the preforked production server with gunicorn and project/gunicorn_conf.py."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default=None, help="Address to listen on, defaults to GUNICORN_BIND or 0.0.0.0:8000.")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to one per core.")
+        parser.add_argument("--threads", type=int, default=None, help="TensorFlow and OpenCV threads per worker, defaults to cores / workers.")
+        parser.add_argument(
+            "--wsgi",
+            action="store_true",
+            help="Serve project.wsgi with sync workers instead of project.asgi with uvicorn workers.",
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        if options["bind"]:
+            env["GUNICORN_BIND"] = options["bind"]
+        if options["workers"]:
+            env["GUNICORN_WORKERS"] = str(options["workers"])
+        if options["threads"]:
+            env["GUNICORN_WORKER_THREADS"] = str(options["threads"])
+        if options["wsgi"]:
+            env["GUNICORN_WORKER_CLASS"] = "sync"
+            env["GUNICORN_APP"] = "project.wsgi:application"
+
+        config = os.path.join(settings.BASE_DIR, "project", "gunicorn_conf.py")
+        # replace this process so gunicorn gets the signals
+        os.chdir(settings.BASE_DIR)
+        os.execvpe(sys.executable, [sys.executable, "-m", "gunicorn", "-c", config], env)
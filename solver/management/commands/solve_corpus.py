@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+import time
+
+from ...corpus import open_corpus, solve_corpus
+from ...engines import ENGINES, SearchStats
+
+
+class Command(BaseCommand):
+    help = "Solve a slice of a binary corpus and check the solutions against the stored ones."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("corpus", help="Binary corpus file.")
+        parser.add_argument("--start", type=int, default=0, help="First puzzle.")
+        parser.add_argument("--stop", type=int, default=None, help="Puzzle to stop before, the end by default.")
+        parser.add_argument("--engine", default="auto", choices=["auto", *ENGINES], help="Search engine.")
+        parser.add_argument("--workers", type=int, default=None, help="Solver threads, all cores by default.")
+
+    def handle(self, *args, **options):
+        try:
+            corpus = open_corpus(options["corpus"])
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        stats = SearchStats(options["engine"])
+        start_time = time.perf_counter()
+        result = solve_corpus(corpus, options["start"], options["stop"], options["engine"], options["workers"], stats)
+        elapsed = time.perf_counter() - start_time
+
+        count = result["count"]
+        self.stdout.write(f"Solved {count - result['unsolved']}/{count} puzzles in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.0f}/s)")
+        if result["matched"] is not None:
+            self.stdout.write(f"Matched {result['matched']}/{count} stored solutions")
+        self.stdout.write(f"Mean nodes {stats.nodes / max(count, 1):.1f}, backtracks {stats.backtracks / max(count, 1):.1f}")
+        if result["matched"] is not None and result["matched"] != count:
+            raise CommandError(f"{count - result['matched']} puzzles did not match their stored solution.")
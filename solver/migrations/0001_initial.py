@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-19 16:05
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('photos', 'Photos'), ('grids', 'Grids')], max_length=8)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=8)),
+                ('options', models.JSONField(default=dict)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('solved', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('worker', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run_after', models.DateTimeField()),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('lease_expires', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='solver_job_status_2f7a7b_idx'), models.Index(fields=['status', 'finished_at'], name='solver_job_status_815f21_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,43 @@
 from django.db import models
+import uuid
 
-# Create your models here.
+
+class Job(models.Model):
+    """Queued batch of puzzle photos or grid strings, its inputs and results are files under SOLVER_JOB_DIR."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    PHOTOS = "photos"
+    GRIDS = "grids"
+    KINDS = [(PHOTOS, "Photos"), (GRIDS, "Grids")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=8, choices=KINDS)
+    status = models.CharField(max_length=8, choices=STATUSES, default=QUEUED)
+    # response format, quality and max_dimension, or the engine of grid jobs
+    options = models.JSONField(default=dict)
+    items = models.PositiveIntegerField(default=0)
+    solved = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    worker = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # queued jobs wait until then, retries back off
+    run_after = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    # running jobs whose worker stops renewing this are claimed again
+    lease_expires = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+            models.Index(fields=["status", "finished_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
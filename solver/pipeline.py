@@ -0,0 +1,299 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+import numpy as np
+import os
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from .cache import GridCache, grid_key
+from .engines import SearchLimit, SearchStats
+from .sudoku_solver import Sudoku, solve_board
+from .utilities import (
+    convert_file_to_nparray,
+    detect_grid,
+    display_numbers,
+    downscale_image,
+    encode_image,
+    overlay_solution,
+    perspective_warp,
+    predict_batch,
+    prepare_cells,
+    preprocess_image,
+    reorder,
+    split_boxes,
+)
+
+
+########################################################################
+# upload extensions accepted by the solve endpoints
+PUZZLE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# file extension of each image format inside batch archives
+ARCHIVE_EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "png": "png"}
+########################################################################
+
+
+class PipelineError(Exception):
+    """Failed stage of the vision and solver pipeline, with the message and error returned to clients."""
+
+    def __init__(self, message: str, error: str = "", status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.error = error
+        self.status = status
+
+
+class StageTimer:
+    """Milliseconds spent in each stage of a request, a mark closes the stage running since the last one."""
+
+    __slots__ = ("stages", "last")
+
+    def __init__(self, stages: Optional[Dict[str, float]] = None):
+        self.stages = {} if stages is None else stages
+        self.last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + (now - self.last) * 1000, 3)
+        self.last = now
+
+
+class Located:
+    """Decoded photo with its grid border, detection confidence, warped grid and the 81 cells prepared for the model."""
+
+    __slots__ = ("img", "border", "cells", "confidence", "warped")
+
+    def __init__(
+        self,
+        img: np.ndarray,
+        border: np.ndarray,
+        cells: List[np.ndarray],
+        confidence: float = 1.0,
+        warped: Optional[np.ndarray] = None,
+    ):
+        self.img = img
+        self.border = border
+        self.cells = cells
+        self.confidence = confidence
+        self.warped = warped
+
+
+def check_extension(name: str) -> None:
+    """Reject file names that are not JPEG or PNG."""
+    if not name.lower().endswith(PUZZLE_EXTENSIONS):
+        raise PipelineError(
+            "Invalid file type, image must be a JPEG or PNG file.",
+            "Only JPEG and PNG file types are allowed.",
+        )
+
+
+def locate_puzzle(data: bytes) -> Located:
+    """Decode image, find the grid border and prepare its cells for prediction."""
+    try:
+        img = convert_file_to_nparray(data)
+    except Exception as e:
+        raise PipelineError("Failed to convert file to numpy array.", str(e))
+    if img is None:
+        raise PipelineError("Failed to convert file to numpy array.", "File is not a readable image.")
+    return locate_image(img)
+
+
+def locate_image(img: np.ndarray) -> Located:
+    """Find the grid border of a decoded photo and prepare its cells for prediction."""
+    try:
+        img_proc = preprocess_image(img)
+    except Exception as e:
+        raise PipelineError("Failed to process image.", str(e))
+
+    try:
+        border, confidence = detect_grid(img_proc)
+        border = reorder(border)
+    except Exception as e:
+        raise PipelineError("Failed to find borders of sudoku puzzle.", str(e))
+
+    try:
+        warped = perspective_warp(border, img)
+        cells = prepare_cells(split_boxes(warped))
+    except Exception as e:
+        raise PipelineError("Failed to locate each square of the puzzle.", str(e))
+
+    return Located(img, border, cells, confidence, warped)
+
+
+def solve_grid(unsolved: List[List[int]], stats: Optional[SearchStats] = None, engine: Optional[str] = None) -> List[List[int]]:
+    """Solve predicted grid with engine, SOLVER_ENGINE by default, raising PipelineError on conflicting digits or no solution.
+
+    Grids not answered within SOLVER_MAX_NODES search nodes raise a PipelineError with status 503.
+    """
+    conflicts = Sudoku.find_conflicts(unsolved)
+    if conflicts:
+        raise PipelineError(
+            "Puzzle contains conflicting digits.",
+            f"Conflicting cells (row, col): {conflicts}",
+        )
+    try:
+        solved = solve_board(
+            unsolved, settings.SOLVER_ENGINE if engine is None else engine, stats, settings.SOLVER_MAX_NODES or None
+        )
+    except SearchLimit as e:
+        raise PipelineError("Puzzle took too long to solve.", str(e), status=503)
+    except Exception as e:
+        raise PipelineError("Puzzle unsolvable.", str(e))
+    if solved is None:
+        raise PipelineError("Puzzle unsolvable.", "Puzzle input could not be solved")
+    return solved
+
+
+def render_solution(
+    located: Located,
+    unsolved: List[List[int]],
+    solved: List[List[int]],
+    options: Dict,
+) -> Tuple[bytes, str]:
+    """Overlay solution on the photo and encode it as requested by options."""
+    try:
+        img, scale = downscale_image(located.img, options["max_dimension"])
+        border = (located.border * scale).astype(located.border.dtype)
+        img_mask = display_numbers(unsolved, solved, img.shape[:-1])
+        img_ans = overlay_solution(img, img_mask, border, img.shape[:-1])
+    except Exception as e:
+        raise PipelineError("Failed overlay solution onto puzzle.", str(e))
+    try:
+        return encode_image(img_ans, options["format"], options["quality"])
+    except Exception as e:
+        raise PipelineError(
+            f"Failed to convert solved puzzle into {options['format'].upper()}.", str(e)
+        )
+
+
+def archive_name(index: int, name: str, image_format: str) -> str:
+    """Name of the solution image of an upload inside batch archives."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f"{index:03d}_{stem}.{ARCHIVE_EXTENSIONS[image_format]}"
+
+
+def _attempt(function, *args):
+    """Return result of function, or the PipelineError it raised."""
+    try:
+        return function(*args)
+    except PipelineError as e:
+        return e
+
+
+def solve_batch(
+    uploads: List[Tuple[str, Union[bytes, UploadedFile]]],
+    model,
+    options: Dict,
+    workers: Optional[int] = None,
+    cache: Optional[GridCache] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> List[Dict]:
+    """Run the pipeline over many (name, bytes or uploaded file) uploads, returning a result per upload in order.
+
+    Admission, decoding, grid detection, solving and rendering run in a thread pool
+    (OpenCV and the compiled engine release the GIL), and the cells of every
+    located puzzle missing from the cache are predicted in one model call.
+    Milliseconds spent in each stage are added to timings when given.
+    """
+    results = [
+        {"index": index, "name": name, "status": 200, "message": "", "error": ""}
+        for index, (name, _) in enumerate(uploads)
+    ]
+
+    def fail(result, error):
+        result["status"] = error.status
+        result["message"] = error.message
+        result["error"] = error.error
+
+    # admission imports PipelineError from here
+    from .admission import read_upload
+
+    def locate(upload):
+        name, data = upload
+        check_extension(name)
+        return locate_puzzle(read_upload(data))
+
+    mark = StageTimer({} if timings is None else timings).mark
+
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        located = list(pool.map(lambda upload: _attempt(locate, upload), uploads))
+        mark("locate")
+        pending = []
+        for result, item in zip(results, located):
+            if isinstance(item, PipelineError):
+                fail(result, item)
+            else:
+                result["grid_confidence"] = round(item.confidence, 4)
+                pending.append(result["index"])
+
+        # grids solved before skip prediction and solving
+        keys = {}
+        solvable = []
+        if cache is not None and pending:
+            found = list(pool.map(lambda index: grid_key(located[index].warped, located[index].cells), pending))
+            misses = []
+            for index, key in zip(pending, found):
+                entry = cache.lookup(key)
+                results[index]["cache"] = "miss" if entry is None else "hit"
+                if entry is None:
+                    keys[index] = key
+                    misses.append(index)
+                else:
+                    results[index]["unsolved"] = entry.unsolved
+                    results[index]["confidences"] = entry.confidences
+                    results[index]["solved"] = entry.solved
+                    solvable.append(index)
+            pending = misses
+        mark("cache")
+
+        # one inference batch for the cells of every located puzzle
+        if pending:
+            try:
+                values, confidences = predict_batch(
+                    np.stack([cell for index in pending for cell in located[index].cells]), model
+                )
+            except Exception as e:
+                for index in pending:
+                    fail(results[index], PipelineError("Failed to predict every square of the puzzle.", str(e)))
+                pending = []
+            else:
+                values = values.reshape(-1, 9, 9)
+                confidences = confidences.reshape(-1, 9, 9).astype(float)
+                for k, index in enumerate(pending):
+                    results[index]["unsolved"] = values[k].tolist()
+                    results[index]["confidences"] = np.round(confidences[k], 4).tolist()
+        mark("predict")
+
+        stats = {index: SearchStats() for index in pending}
+        solved = pool.map(lambda index: _attempt(solve_grid, results[index]["unsolved"], stats[index]), pending)
+        for index, item in zip(pending, solved):
+            results[index]["search_stats"] = stats[index].as_dict()
+            if isinstance(item, PipelineError):
+                fail(results[index], item)
+            else:
+                results[index]["solved"] = item
+                solvable.append(index)
+                if index in keys:
+                    cache.store(keys[index], results[index]["unsolved"], item, results[index]["confidences"])
+        solvable.sort()
+        mark("solve")
+
+        if options["format"] != "json":
+            rendered = pool.map(
+                lambda index: _attempt(
+                    render_solution,
+                    located[index],
+                    results[index]["unsolved"],
+                    results[index]["solved"],
+                    options,
+                ),
+                solvable,
+            )
+            for index, item in zip(solvable, rendered):
+                if isinstance(item, PipelineError):
+                    fail(results[index], item)
+                else:
+                    results[index]["image"], results[index]["content_type"] = item
+            mark("render")
+
+    return results
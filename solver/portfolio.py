@@ -0,0 +1,182 @@
+from collections import Counter
+from django.conf import settings
+import queue
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from .board import Board
+from .engines import RESTART_NODES, Cancel, SearchLimit, SearchStats, get_engine, head_start
+
+
+########################################################################
+# engines raced when SOLVER_PORTFOLIO_STRATEGIES is empty, the default, name:seed shuffles the options of every run
+DEFAULT_STRATEGIES = "auto,auto:1,auto:2"
+# engines whose None means the puzzle has no solution, the heap engine also gives up on hard puzzles
+COMPLETE_ENGINES = ("auto", "bitset", "numba")
+########################################################################
+
+
+class Strategy(NamedTuple):
+    """Engine and seed raced by a portfolio, named as in the strategies setting."""
+
+    name: str
+    engine: str
+    seed: int
+
+
+def parse_strategies(spec: str) -> List[Strategy]:
+    """Parse comma separated 'engine' or 'engine:seed' strategies, raising ValueError on unknown engines."""
+    strategies = []
+    for name in (part.strip() for part in spec.split(",")):
+        if not name:
+            continue
+        engine, _, seed = name.partition(":")
+        if engine == "portfolio":
+            raise ValueError("A portfolio cannot race itself.")
+        get_engine(engine)
+        if seed and engine not in COMPLETE_ENGINES:
+            raise ValueError(f"Engine '{engine}' cannot be seeded.")
+        strategies.append(Strategy(name, engine, int(seed or 0)))
+    if not strategies:
+        raise ValueError("A portfolio needs at least one strategy.")
+    return strategies
+
+
+class PortfolioStats:
+    """Outcome counts of the races of this process, safe to update from several threads.
+
+    Puzzles finished by the head start never race. Wins count the strategy
+    answering first, timeouts the races cut off by their deadline, which
+    raise SearchLimit.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.wins = Counter()
+
+    def record(self, outcome: str, winner: Optional[str] = None) -> None:
+        with self.lock:
+            self.counts[outcome] += 1
+            if winner is not None:
+                self.wins[winner] += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            races = self.counts["races"]
+            return {
+                "head_start": self.counts["head_start"],
+                "races": races,
+                "timeouts": self.counts["timeouts"],
+                "wins": dict(self.wins),
+                "win_rates": {name: round(wins / races, 4) for name, wins in self.wins.items()} if races else {},
+            }
+
+    def clear(self) -> None:
+        with self.lock:
+            self.counts.clear()
+            self.wins.clear()
+
+
+portfolio_stats = PortfolioStats()
+
+
+def _run(
+    strategy: Strategy, board: Board, cancel: Cancel, max_nodes: Optional[int], results: queue.Queue
+) -> None:
+    """Run a strategy, putting it on results with its board, counters, whether it answered within max_nodes and its error."""
+    stats = SearchStats(strategy.name)
+    search = get_engine(strategy.engine)
+    try:
+        if strategy.engine in COMPLETE_ENGINES:
+            result = search(board, stats, seed=strategy.seed, cancel=cancel, max_nodes=max_nodes)
+        else:
+            result = search(board, stats, cancel=cancel, max_nodes=max_nodes)
+    except SearchLimit:
+        results.put((strategy, None, stats, False, None))
+    except Exception as e:
+        # raised again on the request thread
+        results.put((strategy, None, stats, False, e))
+    else:
+        results.put((strategy, result, stats, True, None))
+
+
+def race(
+    board: Board,
+    strategies: List[Strategy],
+    stats: Optional[SearchStats] = None,
+    deadline_ms: Optional[float] = None,
+    head_start_nodes: int = RESTART_NODES,
+    record: PortfolioStats = portfolio_stats,
+    max_nodes: Optional[int] = None,
+) -> Optional[Board]:
+    """Solve board with the first of several strategies to answer, cancelling the rest.
+
+    The default engine first gets a head start of head_start_nodes inline,
+    which answers easy puzzles without starting a thread, 0 skips it. The
+    strategies then run on threads of their own, so concurrent races never
+    wait on each other, until one finds a board or proves there is none. The
+    compiled engine releases the GIL, so strategies run in parallel on
+    separate cores. Losing strategies stop at their next cancel check, and
+    each strategy gives up after max_nodes nodes. Raises SearchLimit when no
+    strategy answered within deadline_ms of the call or within max_nodes.
+    stats receives the counters of the head start and the winner, with the
+    winner named in stats.engine.
+    """
+    start_time = time.perf_counter()
+    if head_start_nodes:
+        finished, result = head_start(board, stats, head_start_nodes)
+        if finished:
+            record.record("head_start")
+            return result
+
+    cancel = Cancel()
+    results: queue.Queue = queue.Queue()
+    for strategy in strategies:
+        threading.Thread(
+            target=_run, args=(strategy, board, cancel, max_nodes, results), name=f"portfolio-{strategy.name}", daemon=True
+        ).start()
+    waiting = len(strategies)
+    winner = None
+    out_of_nodes = False
+    try:
+        while waiting and winner is None:
+            timeout = None
+            if deadline_ms is not None:
+                timeout = max(deadline_ms / 1000 - (time.perf_counter() - start_time), 0)
+            try:
+                strategy, result, strategy_stats, answered, error = results.get(timeout=timeout)
+            except queue.Empty:
+                break
+            waiting -= 1
+            if error is not None:
+                raise error
+            out_of_nodes |= not answered
+            # a gave up heap search or a strategy out of nodes leaves the others to answer
+            if result is not None or (answered and strategy.engine in COMPLETE_ENGINES):
+                winner = strategy, result, strategy_stats
+    finally:
+        cancel.set()
+
+    if winner is None:
+        record.record("races")
+        if waiting:
+            record.record("timeouts")
+            raise SearchLimit(deadline_ms=deadline_ms)
+        if out_of_nodes:
+            raise SearchLimit(max_nodes)
+        return None
+    strategy, result, strategy_stats = winner
+    record.record("races", strategy.name)
+    if stats is not None:
+        stats.merge(strategy_stats)
+        stats.engine = f"portfolio/{strategy.name}"
+    return result
+
+
+def portfolio_search(board: Board, stats: Optional[SearchStats] = None, max_nodes: Optional[int] = None) -> Optional[Board]:
+    """Race the strategies of SOLVER_PORTFOLIO_STRATEGIES under SOLVER_PORTFOLIO_DEADLINE_MS, each within max_nodes."""
+    strategies = parse_strategies(settings.SOLVER_PORTFOLIO_STRATEGIES or DEFAULT_STRATEGIES)
+    deadline_ms = settings.SOLVER_PORTFOLIO_DEADLINE_MS or None
+    return race(board, strategies, stats, deadline_ms, max_nodes=max_nodes)
@@ -0,0 +1,185 @@
+from collections import Counter
+from django.conf import settings
+from functools import wraps
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+########################################################################
+# seconds between stack samples
+SAMPLE_INTERVAL = 0.002
+# deepest stack kept per sample, outer frames are dropped first
+MAX_STACK_DEPTH = 128
+# request header asking for a profile, its value must match SOLVER_PROFILE_TOKEN when that is set
+PROFILE_HEADER = "HTTP_X_SOLVER_PROFILE"
+# response header naming the written profile
+PROFILE_FILE_HEADER = "X-Solver-Profile-File"
+########################################################################
+
+_sequence = itertools.count()
+
+
+class SamplingProfiler:
+    """Sample the stack of one thread from a background thread.
+
+    Stacks start at the frame that started the profiler, leaving out the
+    server frames every sample shares. Samples are counted per stack and
+    written in the folded format read by flamegraph.pl and speedscope, one
+    "outer;...;inner count" line per stack. Sampling holds the GIL only
+    while one stack is copied, so the profiled code runs at close to full
+    speed.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_time = 0.0
+        self.root = None
+
+    def __enter__(self):
+        self.start(sys._getframe(1))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self, root=None) -> None:
+        """Start sampling, stacks are cut above root, the calling frame by default."""
+        self.root = sys._getframe(1) if root is None else root
+        self._stop.clear()
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="solver-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.elapsed = time.perf_counter() - self._start_time
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.stacks[self.stack_of(frame, self.root)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def stack_of(frame, root=None) -> Tuple[str, ...]:
+        """Return the frames of a stack up to root from outermost to innermost as 'function (file:line)'."""
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            if frame is root:
+                break
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def folded(self) -> str:
+        """Return the samples in folded stack format, most sampled stacks first."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+class ProfileRing:
+    """Directory keeping the newest max_files profiles, older ones are deleted as new ones are written.
+
+    Names start with the write time so they sort oldest first, and carry the
+    process id so several workers can share the directory.
+    """
+
+    def __init__(self, directory: str, max_files: int = 100):
+        self.directory = directory
+        self.max_files = max_files
+
+    def write(self, label: str, content: str) -> str:
+        """Write content as a new profile and return its file name."""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10**9:09d}-{os.getpid()}-{next(_sequence)}-{label}.folded"
+        path = os.path.join(self.directory, name)
+        # written under a temporary name so readers never see partial profiles
+        with open(path + ".tmp", "w") as file:
+            file.write(content)
+        os.replace(path + ".tmp", path)
+        self.trim()
+        return name
+
+    def files(self) -> List[str]:
+        """Return profile file names, oldest first."""
+        try:
+            return sorted(name for name in os.listdir(self.directory) if name.endswith(".folded"))
+        except FileNotFoundError:
+            return []
+
+    def trim(self) -> None:
+        files = self.files()
+        for name in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # removed by another worker
+                pass
+
+
+def profile_requested(request) -> bool:
+    """Whether profiling is enabled by SOLVER_PROFILE_DIR and SOLVER_PROFILE_TOKEN and the request sends the token."""
+    token = settings.SOLVER_PROFILE_TOKEN
+    if not settings.SOLVER_PROFILE_DIR or not token:
+        return False
+    value = request.META.get(PROFILE_HEADER)
+    if not value:
+        return False
+    return hmac.compare_digest(value.encode(), token.encode())
+
+
+def profile_request(method):
+    """Profile a view method when the request asks for it, naming the written profile in the response."""
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if not profile_requested(request):
+            return method(self, request, *args, **kwargs)
+        with SamplingProfiler() as profiler:
+            response = method(self, request, *args, **kwargs)
+        ring = ProfileRing(settings.SOLVER_PROFILE_DIR, settings.SOLVER_PROFILE_MAX_FILES)
+        label = f"{type(self).__name__}-{round(profiler.elapsed * 1000)}ms"
+        response[PROFILE_FILE_HEADER] = ring.write(label, profiler.folded())
+        return response
+
+    return wrapper
+
+
+def profile_summary(folded: str, top: int = 20) -> List[Dict]:
+    """Return the functions with the most samples in a folded profile, counting each function once per stack."""
+    own: Counter = Counter()
+    total: Counter = Counter()
+    samples = 0
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        count = int(count)
+        frames = stack.split(";")
+        samples += count
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [
+        {"frame": frame, "total": count, "own": own[frame], "share": count / samples}
+        for frame, count in total.most_common(top)
+    ]
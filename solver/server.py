@@ -0,0 +1,61 @@
+import logging
+import os
+import random
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Hooks of the preforked production server, see project/gunicorn_conf.py.
+#
+# TensorFlow does not survive fork once its runtime has started, any op run
+# in the master hangs the workers. The master therefore only imports and
+# warms what is fork safe (modules, numba kernels, index tables, glyphs),
+# which workers then share copy-on-write, and every worker sets its own
+# thread pools before loading the model and running one warm-up batch.
+
+
+def worker_threads(workers: int, cpus: int | None = None) -> int:
+    """Return threads each worker may use without oversubscribing the cores."""
+    cpus = cpus or os.cpu_count() or 1
+    return max(1, cpus // max(workers, 1))
+
+
+def warm_up_master() -> None:
+    """Import and compile the fork safe parts of the request path before workers are forked."""
+    from .benchmarks import make_puzzle
+    from .engines import get_engine
+    from .topology import SUPPORTED_BOX_SIZES, get_topology
+    from .utilities import glyph_atlas
+
+    rng = random.Random(0)
+    search = get_engine()
+    for box_size in SUPPORTED_BOX_SIZES:
+        get_topology(box_size)
+    # compiles the numba kernels when installed
+    search(make_puzzle(3, rng))
+    # glyphs of the common photo sizes
+    for side in (450, 640, 1080, 1920):
+        glyph_atlas((0, 255, 0), (side / 9, side / 9))
+
+
+def configure_worker(threads: int) -> None:
+    """Limit TensorFlow and OpenCV thread pools of this worker, must run before TensorFlow starts."""
+    import cv2
+    import tensorflow as tf
+
+    cv2.setNumThreads(threads)
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def warm_up_worker() -> bool:
+    """Load the model and run one batch so the first request is not slow, False if the model failed to load."""
+    from .utilities import get_prediction_model, predict_batch
+
+    try:
+        model = get_prediction_model()
+        predict_batch(np.zeros((81, 32, 32), dtype=np.float32), model)
+    except Exception:
+        logger.exception("Failed to warm up prediction model.")
+        return False
+    return True
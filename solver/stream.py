@@ -0,0 +1,126 @@
+import asyncio
+from django.conf import settings
+import json
+from typing import Dict
+from urllib.parse import parse_qs
+
+from .admission import read_upload
+from .pipeline import PipelineError
+from .tracking import GridTracker
+from .utilities import convert_file_to_nparray, encode_image
+
+
+########################################################################
+# websocket route served next to the django application
+STREAM_PATH = "/api/v1/stream/"
+# formats a stream can answer with, json sends corners and grids for the client to draw
+STREAM_FORMATS = ("jpeg", "webp", "png", "json")
+########################################################################
+
+
+def stream_options(query_string: bytes) -> Dict:
+    """Read format, quality, max_dimension and keyframe_interval from the query string, raise ValueError if invalid."""
+    query = {name: values[-1] for name, values in parse_qs(query_string.decode("latin-1")).items()}
+    image_format = query.get("format", "jpeg").lower()
+    if image_format == "jpg":
+        image_format = "jpeg"
+    if image_format not in STREAM_FORMATS:
+        raise ValueError(f"Format must be one of {list(STREAM_FORMATS)}.")
+    options = {
+        "format": image_format,
+        "quality": int(query.get("quality", settings.SOLVER_STREAM_QUALITY)),
+        "max_dimension": int(query.get("max_dimension", settings.SOLVER_STREAM_MAX_DIMENSION)),
+        "keyframe_interval": int(query.get("keyframe_interval", settings.SOLVER_STREAM_KEYFRAME_INTERVAL)),
+    }
+    if not 1 <= options["quality"] <= 100:
+        raise ValueError("Quality must be between 1 and 100.")
+    if options["max_dimension"] < 0:
+        raise ValueError("Max dimension must not be negative.")
+    if options["keyframe_interval"] < 1:
+        raise ValueError("Keyframe interval must be at least 1.")
+    return options
+
+
+def solve_frame(tracker: GridTracker, data: bytes, options: Dict) -> Dict:
+    """Run one encoded frame through the tracker, returning the status and the encoded overlay."""
+    img = convert_file_to_nparray(read_upload(data))
+    if img is None:
+        raise PipelineError("Failed to convert file to numpy array.", "Frame is not a readable image.")
+    img_ans, info = tracker.process(img)
+    if options["format"] != "json":
+        info["image"], _ = encode_image(img_ans, options["format"], options["quality"])
+    return info
+
+
+async def stream_application(scope, receive, send):
+    """Solve frames sent as binary websocket messages.
+
+    Each frame is answered with the solved overlay as a binary message, or
+    with a JSON text message for format=json and for frames without a
+    solution. Frames arriving while one is being solved are dropped except
+    the newest, so slow solves never build a backlog.
+    """
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+    try:
+        options = stream_options(scope.get("query_string", b""))
+    except ValueError:
+        await send({"type": "websocket.close", "code": 1008})
+        return
+    await send({"type": "websocket.accept"})
+
+    tracker = GridTracker(
+        keyframe_interval=options["keyframe_interval"],
+        max_dimension=options["max_dimension"],
+    )
+    latest = {"frame": 0, "data": None, "dropped": 0, "closed": False}
+    ready = asyncio.Event()
+
+    async def reader():
+        while True:
+            event = await receive()
+            if event["type"] == "websocket.disconnect":
+                latest["closed"] = True
+                ready.set()
+                return
+            if event["type"] != "websocket.receive":
+                continue
+            if latest["data"] is not None:
+                latest["dropped"] += 1
+            latest["frame"] += 1
+            latest["data"] = event.get("bytes")
+            if latest["data"] is None:
+                latest["data"] = b""
+            ready.set()
+
+    reading = asyncio.create_task(reader())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if latest["closed"]:
+                break
+            frame, data = latest["frame"], latest["data"]
+            latest["data"] = None
+
+            response_data = {"frame": frame, "dropped": latest["dropped"], "status": 200, "message": "", "error": ""}
+            try:
+                info = await asyncio.to_thread(solve_frame, tracker, data, options)
+            except PipelineError as e:
+                response_data.update({"status": e.status, "message": e.message, "error": e.error})
+                await send({"type": "websocket.send", "text": json.dumps(response_data)})
+                continue
+            except Exception as e:
+                response_data.update({"status": 500, "message": "Unexpected error.", "error": str(e)})
+                await send({"type": "websocket.send", "text": json.dumps(response_data)})
+                continue
+
+            image = info.pop("image", None)
+            if image is not None:
+                await send({"type": "websocket.send", "bytes": image})
+            else:
+                response_data.update(info)
+                await send({"type": "websocket.send", "text": json.dumps(response_data)})
+    finally:
+        reading.cancel()
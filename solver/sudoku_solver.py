@@ -1,170 +1,151 @@
-import copy
-import heapq
+from math import isqrt
+import numpy as np
 import pandas as pd
 import time
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
+
+from .board import Board
+from .engines import DEFAULT_ENGINE, SearchStats, get_engine
+from .topology import SUPPORTED_BOX_SIZES, box_size_for, get_topology
 
 
 class Sudoku:
+    # values of the standard 9x9 board, instances hold the sets of their own size
     full_set = set([i for i in range(0, 10)])
     solved_set = set([i for i in range(1, 10)])
 
     @staticmethod
-    def _is_solved(board: List[List[str]]) -> bool:
+    def _is_solved(board: List[List[int]] | Board) -> bool:
         """Returns boolean if board is solved"""
         if not board:
             return False
 
-        temp = copy.deepcopy(board)
-
-        r, c, s, e = Sudoku.generate_rcs_sets(temp)
-
-        # dict board size should be
-        if len(r) != 9 and len(c) != 9 and len(s) != 9 and len(e) == 0:
-            return False
-
-        # dict board should contain
-        for i in range(9):
-            if i not in r or i not in c or i not in s:
-                return False
-            if r[i] != Sudoku.solved_set or c[i] != Sudoku.solved_set or s[i] != Sudoku.solved_set:
+        if not isinstance(board, Board):
+            try:
+                board = Board.from_list(board)
+            except (TypeError, ValueError):
                 return False
-        return True
+
+        # every row, col and square should contain each digit once
+        topo = get_topology(board.box_size)
+        units = board.to_numpy().reshape(-1)[topo.unit_index]
+        masks = np.bitwise_or.reduce(np.left_shift(1, units, dtype=np.int64), axis=1)
+        return bool(np.all(masks == topo.full_mask))
 
     @staticmethod
-    def check_board_validity(board: List[List[str]]) -> bool:
+    def check_board_validity(board: List[List[int]]) -> bool:
         """Test if input board is valid."""
         # board is right type and size
-        if not isinstance(board, list) or len(board) != 9:
+        if not isinstance(board, list):
+            return False
+        size = len(board)
+        if not any(size == b * b for b in SUPPORTED_BOX_SIZES):
             return False
 
         # cells are right type, size and value
         for row in board:
-            if not isinstance(row, list) or len(row) != 9:
+            if not isinstance(row, list) or len(row) != size:
                 return False
             for value in row:
-                if not isinstance(value, int) or value not in Sudoku.full_set:
+                if not isinstance(value, int) or not 0 <= value <= size:
                     return False
 
         return True
 
     @staticmethod
-    def generate_rcs_sets(board: List[List[str]]) -> Tuple[Dict[int, Set[int]], Dict[int, Set[int]], Dict[int, Set[int]], Set[Tuple[int]]]:
+    def find_conflicts(board: List[List[int]] | Board) -> List[Tuple[int, int]]:
+        """Return (row, col) of every filled cell that repeats a value in its row, col or square."""
+        if not isinstance(board, Board):
+            board = Board.from_list(board)
+        topo = get_topology(board.box_size)
+        grid = board.to_numpy().reshape(-1)
+        # one-hot digits, shape (cell, digit)
+        one_hot = grid[:, None] == np.arange(1, topo.size + 1)
+        # digits repeated within each unit
+        duplicated = one_hot[topo.unit_index].sum(axis=1) > 1
+        # cell conflicts if its digit is repeated in any of its 3 units
+        conflicts = (one_hot & duplicated[topo.cell_unit_index].any(axis=1)).any(axis=1)
+        return [divmod(int(idx), topo.size) for idx in np.flatnonzero(conflicts)]
+
+    @staticmethod
+    def generate_rcs_sets(board: List[List[int]]) -> Tuple[Dict[int, Set[int]], Dict[int, Set[int]], Dict[int, Set[int]], Set[Tuple[int]]]:
         """Generate board representation of rows, cols, squares, and empties."""
-        temp = copy.deepcopy(board)
-        rows = {i: set() for i in range(0, 9)}
-        cols = {i: set() for i in range(0, 9)}
-        squares = {i: set() for i in range(0, 9)}
+        topo = get_topology(box_size_for(len(board)))
+        rows = {i: set() for i in range(0, topo.size)}
+        cols = {i: set() for i in range(0, topo.size)}
+        squares = {i: set() for i in range(0, topo.size)}
         empties = set()
-        for i in range(9):
-            for j in range(9):
-                n = temp[i][j]
-                k = 3 * (i // 3) + j // 3
-                if n == 0:
-                    empties.add((i, j, k))
-                else:
-                    rows[i].add(n)
-                    cols[j].add(n)
-                    squares[k].add(n)
+        for i, j, k in topo.cell_units:
+            n = board[i][j]
+            if n == 0:
+                empties.add((i, j, k))
+            else:
+                rows[i].add(n)
+                cols[j].add(n)
+                squares[k].add(n)
 
         return rows, cols, squares, empties
 
-    def __init__(self, unsolved: List[List[str]]):
+    def __init__(self, unsolved: List[List[int]], engine: str = "auto"):
         if not self.check_board_validity(unsolved):
             raise ValueError("Board is invalid.")
         self.unsolved_board = unsolved
+        self.board = Board.from_list(unsolved)
+        self.size = self.board.size
+        self.full_set = set(range(0, self.size + 1))
+        self.solved_set = set(range(1, self.size + 1))
+        self.engine = get_engine(engine)
+        self.engine_name = DEFAULT_ENGINE if engine == "auto" else engine
         self.solved_board = None
         self.is_solved = False
+        self.stats = None
 
-    def solve_board(self) -> None | List[List[str]]:
-        """Takes unsolved_board attribute and generates solved_board and is_solved attributes. Also returns board is solved or None if not."""
-        temp = copy.deepcopy(self.unsolved_board)
-
-        rows, cols, squares, empties = self.generate_rcs_sets(temp)
+    def solve_board(self, stats: Optional[SearchStats] = None, max_nodes: Optional[int] = None) -> None | List[List[int]]:
+        """Takes unsolved_board attribute and generates solved_board, is_solved and stats attributes. Also returns board is solved or None if not.
 
-        heap = []
-        count = 0
-        for i, j, k in empties:
-            possibilities = Sudoku.solved_set - (rows[i] | cols[j] | squares[k])
-            if len(possibilities) == 1:
-                n = possibilities.pop()
-                rows[i].add(n)
-                cols[j].add(n)
-                squares[k].add(n)
-                temp[i][j] = n
-            else:
-                heapq.heappush(heap, (count, len(possibilities), i, j, k))
-
-        solution = []
-        count += 1
-        bifurcation_length = 1
-        while heap:
-            item_count, _, i, j, k = heapq.heappop(heap)
-
-            if item_count > count:
-                count = item_count
-                bifurcation_length += 1
-                # print(f'Incrementing bifurcation length to {bifurcation_length}')
-
-            if bifurcation_length > 9:
-                return None
-
-            if item_count < count:
-                heapq.heappush(heap, (count, len(possibilities), i, j, k))
-                continue
-
-            possibilities = Sudoku.solved_set - (rows[i] | cols[j] | squares[k])
-
-            while not possibilities:
-                if not solution:
-                    # print('Failed to find solution due to empty solution stack')
-                    return None
-                # backtrack adding attempted squares back minus n
-                heapq.heappush(heap, (count + 1, len(possibilities), i, j, k))
-                # backtrack until possibilities are not empty
-                i, j, k, n, possibilities = solution.pop()
-                rows[i].remove(n)
-                cols[j].remove(n)
-                squares[k].remove(n)
-
-            if len(possibilities) <= bifurcation_length:
-                n = possibilities.pop()
-                rows[i].add(n)
-                cols[j].add(n)
-                squares[k].add(n)
-                solution.append((i, j, k, n, possibilities))
-                bifurcation_length = 1
-                continue
+        Raises SearchLimit when the engine searches max_nodes nodes without an answer.
+        """
+        self.is_solved = False
+        self.solved_board = None
+        self.stats = SearchStats(self.engine_name) if stats is None else stats
+        if not self.stats.engine:
+            self.stats.engine = self.engine_name
 
-            heapq.heappush(heap, (count + 1, len(possibilities), i, j, k))
+        # reject boards with repeated digits before searching
+        if self.find_conflicts(self.board):
+            return None
 
-        while solution:
-            i, j, k, n, possibilities = solution.pop()
-            temp[i][j] = n
+        start_time = time.perf_counter()
+        try:
+            board = self.engine(self.board, self.stats, max_nodes=max_nodes)
+        finally:
+            self.stats.elapsed_ms += (time.perf_counter() - start_time) * 1000
 
-        if self._is_solved(temp):
+        if board is not None and self._is_solved(board):
             self.is_solved = True
-            self.solved_board = temp
-            return temp
-        else:
-            self.is_solved = False
-            self.solved_board = None
-            return None
+            self.solved_board = board.to_list()
+        return self.solved_board
 
 
 def convert_board(board: str) -> List[List[int]]:
-    """Convert board from string into nested list of integers"""
-    ret_board = [[] for _ in range(9)]
+    """Convert board from string into nested list of integers, digits above 9 are letters."""
+    size = isqrt(max(len(board) - 1, 0)) + 1
+    ret_board = [[] for _ in range(size)]
     for idx, val in enumerate(board):
-        row = idx//9
-        ret_board[row].append(int(val))
+        row = idx // size
+        ret_board[row].append(0 if val == "." else int(val, 36))
     return ret_board
 
 
-def solve_board(board: List[List[str]]) -> List[List[str]]:
-    """Create instance and solve board. Return Solved board."""
-    sudoku = Sudoku(board)
-    sudoku.solve_board()
+def solve_board(
+    board: List[List[int]], engine: str = "auto", stats: Optional[SearchStats] = None, max_nodes: Optional[int] = None
+) -> List[List[int]]:
+    """Create instance and solve board. Return Solved board, adding the search counters to stats when given.
+
+    Raises SearchLimit when no answer is found within max_nodes search nodes, unlimited by default.
+    """
+    sudoku = Sudoku(board, engine)
+    sudoku.solve_board(stats, max_nodes)
     return sudoku.solved_board
 
 
@@ -0,0 +1,226 @@
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import json
+import numpy as np
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+########################################################################
+# fonts digits are drawn with, FONT_ITALIC may be added
+FONTS = (
+    cv2.FONT_HERSHEY_SIMPLEX,
+    cv2.FONT_HERSHEY_PLAIN,
+    cv2.FONT_HERSHEY_DUPLEX,
+    cv2.FONT_HERSHEY_COMPLEX,
+    cv2.FONT_HERSHEY_TRIPLEX,
+    cv2.FONT_HERSHEY_COMPLEX_SMALL,
+)
+# side of the flat grid before it is warped into the photo
+FLAT_SIDE = 900
+# file holding the ground truth of a rendered dataset, one json object per image
+LABELS_FILE = "labels.jsonl"
+########################################################################
+
+
+class RenderParams(NamedTuple):
+    """How one synthetic photo is drawn, sampled by random_params.
+
+    Corners are given as a share of the photo size. Lighting multiplies the
+    photo by a linear gradient from 1 down to 1 - gradient along angle.
+    """
+
+    width: int
+    height: int
+    font: int
+    italic: bool
+    font_scale: float
+    digit_thickness: int
+    thin_line: int
+    thick_line: int
+    paper: Tuple[int, int, int]
+    ink: Tuple[int, int, int]
+    background: Tuple[int, int, int]
+    # paper around the grid as a share of the grid side, wide sheets run off the photo
+    margin: float
+    # top left, top right, bottom left, bottom right of the grid
+    corners: Tuple[Tuple[float, float], ...]
+    gradient: float
+    gradient_angle: float
+    blur: float
+    noise: float
+    jpeg_quality: int
+
+
+class Rendered(NamedTuple):
+    """Synthetic photo as JPEG bytes, with its ground truth grid and the grid corners in reorder order."""
+
+    data: bytes
+    grid: List[List[int]]
+    corners: np.ndarray
+    params: RenderParams
+
+
+def random_params(rng: np.random.Generator) -> RenderParams:
+    """Sample resolution, font, line weights, colors, perspective, lighting, blur, noise and compression."""
+    long_side = int(rng.integers(480, 2000))
+    aspect = float(rng.choice([3 / 4, 1.0, 4 / 3, 9 / 16]))
+    width, height = (long_side, int(long_side * aspect)) if aspect < 1 else (int(long_side / aspect), long_side)
+
+    # grid spans 45% to 85% of the shorter side, each corner is pushed around for perspective
+    size = np.array([width, height])
+    scale = rng.uniform(0.45, 0.85) * min(width, height)
+    angle = np.deg2rad(rng.uniform(-12, 12))
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    square = np.array([[-0.5, -0.5], [0.5, -0.5], [-0.5, 0.5], [0.5, 0.5]])
+    offsets = ((square + rng.uniform(-0.07, 0.07, (4, 2))) * scale) @ rotation.T
+    # keep the whole grid at least 2% inside the photo
+    low = -offsets.min(axis=0) + 0.02 * size
+    high = size - offsets.max(axis=0) - 0.02 * size
+    while (low > high).any():
+        offsets *= 0.9
+        low = -offsets.min(axis=0) + 0.02 * size
+        high = size - offsets.max(axis=0) - 0.02 * size
+    corners = (rng.uniform(low, high) + offsets) / size
+
+    paper = int(rng.integers(200, 256))
+    tint = rng.integers(-12, 13, 3)
+    ink = int(rng.integers(0, 70))
+    return RenderParams(
+        width=width,
+        height=height,
+        font=int(rng.choice(FONTS)),
+        italic=bool(rng.random() < 0.2),
+        font_scale=float(rng.uniform(0.75, 1.05)),
+        digit_thickness=int(rng.integers(1, 4)),
+        thin_line=int(rng.integers(1, 4)),
+        thick_line=int(rng.integers(3, 9)),
+        paper=tuple(int(c) for c in np.clip(paper + tint, 0, 255)),
+        ink=(ink, ink, ink),
+        background=tuple(int(c) for c in rng.integers(20, 180, 3)),
+        margin=float(rng.uniform(0.05, 1.0)),
+        corners=tuple(tuple(float(v) for v in corner) for corner in corners),
+        gradient=float(rng.uniform(0, 0.55)),
+        gradient_angle=float(rng.uniform(0, 2 * np.pi)),
+        blur=float(rng.choice([0, rng.uniform(0.3, 2.0)])),
+        noise=float(rng.uniform(0, 12)),
+        jpeg_quality=int(rng.integers(40, 96)),
+    )
+
+
+def draw_flat(grid: Sequence[Sequence[int]], params: RenderParams) -> np.ndarray:
+    """Draw the grid face on, lines on the edges of a FLAT_SIDE square with digits centered in their cells."""
+    flat = np.empty((FLAT_SIDE, FLAT_SIDE, 3), np.uint8)
+    flat[...] = params.paper
+    cell = FLAT_SIDE / 9
+    font = params.font | (cv2.FONT_ITALIC if params.italic else 0)
+    # digits fill about 60% of the cell height whatever the font
+    (_, base_height), _ = cv2.getTextSize("8", font, 1.0, params.digit_thickness)
+    font_scale = params.font_scale * 0.6 * cell / base_height
+    for row in range(9):
+        for col in range(9):
+            digit = grid[row][col]
+            if not digit:
+                continue
+            (width, height), _ = cv2.getTextSize(str(digit), font, font_scale, params.digit_thickness)
+            origin = (int((col + 0.5) * cell - width / 2), int((row + 0.5) * cell + height / 2))
+            cv2.putText(flat, str(digit), origin, font, font_scale, params.ink, params.digit_thickness, cv2.LINE_AA)
+    for k in range(10):
+        weight = params.thick_line if k % 3 == 0 else params.thin_line
+        # outer lines sit inside the square so the corners stay on its edges
+        position = min(max(round(k * cell), weight // 2), FLAT_SIDE - 1 - weight // 2)
+        cv2.line(flat, (position, 0), (position, FLAT_SIDE - 1), params.ink, weight)
+        cv2.line(flat, (0, position), (FLAT_SIDE - 1, position), params.ink, weight)
+    return flat
+
+
+def render_puzzle(grid: Sequence[Sequence[int]], params: RenderParams, rng: Optional[np.random.Generator] = None) -> Rendered:
+    """Draw a 9x9 grid (0 for empty cells) as a JPEG photo of a sheet of paper.
+
+    The grid is warped onto the photo with a margin of paper around it, lit
+    by a gradient, blurred, given sensor noise from rng and JPEG encoded.
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+    width, height = params.width, params.height
+    corners = np.float32(params.corners) * np.float32([width, height])
+    flat = draw_flat(grid, params)
+    square = np.float32([[0, 0], [FLAT_SIDE, 0], [0, FLAT_SIDE], [FLAT_SIDE, FLAT_SIDE]])
+    matrix = cv2.getPerspectiveTransform(square, corners)
+
+    image = np.empty((height, width, 3), np.uint8)
+    image[...] = params.background
+    margin = params.margin * FLAT_SIDE
+    sheet = np.float32([[-margin, -margin], [FLAT_SIDE + margin, -margin], [FLAT_SIDE + margin, FLAT_SIDE + margin], [-margin, FLAT_SIDE + margin]])
+    sheet = cv2.perspectiveTransform(sheet.reshape(-1, 1, 2), matrix).round().astype(np.int32)
+    cv2.fillConvexPoly(image, sheet, params.paper, cv2.LINE_AA)
+    cv2.warpPerspective(flat, matrix, (width, height), dst=image, flags=cv2.INTER_AREA, borderMode=cv2.BORDER_TRANSPARENT)
+
+    # lighting falls off linearly along the gradient angle
+    along = (
+        np.arange(width, dtype=np.float32)[None, :] * np.float32(np.cos(params.gradient_angle))
+        + np.arange(height, dtype=np.float32)[:, None] * np.float32(np.sin(params.gradient_angle))
+    )
+    along -= along.min()
+    along *= np.float32(params.gradient) / max(float(along.max()), 1.0)
+    image = image.astype(np.float32)
+    image *= (1 - along)[..., None]
+
+    if params.blur:
+        image = cv2.GaussianBlur(image, (0, 0), params.blur)
+    if params.noise:
+        # drawn at half resolution, demosaiced sensor noise spans neighbouring pixels anyway
+        noise = rng.standard_normal((height // 2 + 1, width // 2 + 1, 3), dtype=np.float32)
+        noise *= np.float32(params.noise)
+        image += cv2.resize(noise, (width, height))
+    np.clip(image, 0, 255, out=image)
+    encoded = cv2.imencode(".jpg", image.astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, params.jpeg_quality])[1]
+    return Rendered(encoded.tobytes(), [list(row) for row in grid], corners, params)
+
+
+def _render_one(task: Tuple[str, List[List[int]], int, int]) -> Dict:
+    directory, grid, seed, index = task
+    rng = np.random.default_rng([seed, index])
+    rendered = render_puzzle(grid, random_params(rng), rng)
+    name = f"{index:06d}.jpg"
+    with open(os.path.join(directory, name), "wb") as file:
+        file.write(rendered.data)
+    return {
+        "file": name,
+        "grid": "".join(str(value) for row in grid for value in row),
+        "corners": rendered.corners.round(2).tolist(),
+        "params": rendered.params._asdict(),
+    }
+
+
+def write_dataset(
+    directory: str,
+    grids: Sequence[Sequence[Sequence[int]]],
+    seed: int = 0,
+    workers: Optional[int] = None,
+) -> int:
+    """Render each grid once into directory as <index>.jpg with its ground truth in LABELS_FILE.
+
+    Image index depends only on seed and index, so datasets are the same for
+    any number of threads. Returns the images written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(directory, [list(row) for row in grid], seed, index) for index, grid in enumerate(grids)]
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        with open(os.path.join(directory, LABELS_FILE), "w") as labels:
+            for label in pool.map(_render_one, tasks):
+                labels.write(json.dumps(label) + "\n")
+    return len(tasks)
+
+
+def read_dataset(directory: str, limit: Optional[int] = None) -> Iterator[Dict]:
+    """Yield labels of a rendered dataset with path, grid as 9x9 lists and corners as an array."""
+    with open(os.path.join(directory, LABELS_FILE)) as labels:
+        for count, line in enumerate(labels):
+            if limit is not None and count >= limit:
+                return
+            label = json.loads(line)
+            values = [int(value) for value in label["grid"]]
+            label["path"] = os.path.join(directory, label["file"])
+            label["grid"] = [values[row * 9:(row + 1) * 9] for row in range(9)]
+            label["corners"] = np.array(label["corners"])
+            yield label
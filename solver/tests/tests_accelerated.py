@@ -0,0 +1,83 @@
+from django.test import SimpleTestCase
+import random
+import unittest
+
+from .. import accelerated
+from ..benchmarks import make_puzzle
+from ..board import Board
+from ..engines import DEFAULT_ENGINE, ENGINES, SearchStats, _count, bitset_search, count_solutions, get_engine
+from ..topology import get_topology
+
+
+@unittest.skipUnless(accelerated.AVAILABLE, "numba is not installed")
+class AcceleratedEngineTestCase(SimpleTestCase):
+
+    # @unittest.skip("Skipping this test method")
+    def test_auto_engine(self):
+        """Compiled engine is registered and picked automatically."""
+        self.assertIn("numba", ENGINES)
+        self.assertEqual(DEFAULT_ENGINE, "numba")
+        self.assertIs(get_engine("auto"), ENGINES["numba"])
+
+    # @unittest.skip("Skipping this test method")
+    def test_differential(self):
+        """Compiled and python engines return identical boards over a corpus of random puzzles."""
+        numba_search = ENGINES["numba"]
+        rng = random.Random(30)
+        corpus = []
+        for box_size, clue_ratio, count in [(2, 0.3, 200), (3, 0.25, 300), (3, 0.4, 300), (4, 0.5, 40)]:
+            for _ in range(count):
+                puzzle = make_puzzle(box_size, rng, clue_ratio)
+                corpus.append(puzzle)
+                if clue_ratio < 0.3 or box_size > 3:
+                    continue
+                # change one clue, often leaving no solution
+                broken = puzzle.copy()
+                filled = [idx for idx, value in enumerate(broken) if value]
+                if filled:
+                    idx = rng.choice(filled)
+                    broken[idx] = broken[idx] % broken.size + 1
+                corpus.append(broken)
+
+        for puzzle in corpus:
+            self.assertEqual(numba_search(puzzle), bitset_search(puzzle), puzzle.to_string())
+
+    # @unittest.skip("Skipping this test method")
+    def test_differential_stats(self):
+        """Compiled and python engines count the same nodes, guesses, backtracks, depth and restarts."""
+        numba_search = ENGINES["numba"]
+        rng = random.Random(40)
+        for box_size, clue_ratio, count in [(2, 0.3, 50), (3, 0.25, 100), (4, 0.5, 20)]:
+            for _ in range(count):
+                puzzle = make_puzzle(box_size, rng, clue_ratio)
+                compiled, python = SearchStats(), SearchStats()
+                numba_search(puzzle, compiled)
+                bitset_search(puzzle, python)
+                self.assertEqual(compiled.as_dict(), python.as_dict(), puzzle.to_string())
+
+    # @unittest.skip("Skipping this test method")
+    def test_differential_seeded(self):
+        """Compiled and python engines return identical boards for the same seed."""
+        numba_search = ENGINES["numba"]
+        rng = random.Random(50)
+        for box_size, clue_ratio, count in [(2, 0.2, 50), (3, 0.1, 50), (4, 0.3, 10)]:
+            for seed in range(1, count + 1):
+                puzzle = make_puzzle(box_size, rng, clue_ratio)
+                self.assertEqual(numba_search(puzzle, seed=seed), bitset_search(puzzle, seed=seed), puzzle.to_string())
+
+    # @unittest.skip("Skipping this test method")
+    def test_differential_count(self):
+        """Compiled and python solution counts agree."""
+        rng = random.Random(60)
+        for box_size, clue_ratio, limit in [(2, 0.0, 1000), (2, 0.25, 10), (3, 0.3, 2), (3, 0.3, 20)]:
+            topo = get_topology(box_size)
+            for _ in range(30):
+                puzzle = make_puzzle(box_size, rng, clue_ratio)
+                used = [0] * (3 * topo.size)
+                for idx, n in enumerate(puzzle):
+                    if n:
+                        for unit, offset in zip(topo.cell_units[idx], (0, topo.size, 2 * topo.size)):
+                            used[unit + offset] |= 1 << n
+                python = _count(bytearray(puzzle.cells), used, topo, limit)
+                self.assertEqual(count_solutions(puzzle, limit), python, puzzle.to_string())
+        self.assertEqual(count_solutions(Board(bytearray(16), 4), 1000), 288)
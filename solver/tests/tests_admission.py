@@ -0,0 +1,234 @@
+import asyncio
+import cv2
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.http.multipartparser import MultiPartParser
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from io import BytesIO
+import json
+import numpy as np
+import os
+import struct
+import unittest
+import zlib
+
+from ..admission import (
+    BODY_OVERHEAD,
+    GRID_MAX_BYTES,
+    AdmissionUploadHandler,
+    BodyLimitMiddleware,
+    ImageHeader,
+    RejectedUpload,
+    check_header,
+    limit_body,
+    max_body_bytes,
+    max_files,
+    read_upload,
+    sniff_image,
+)
+from ..pipeline import PipelineError
+
+#############################################################################
+# Global Variables
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+unsolved_path = os.path.join(BASE_DIR, "data/puzzles/3.jpg")
+#############################################################################
+
+
+def png_header(width, height):
+    """Return signature and IHDR chunk of a PNG claiming the given size."""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+
+
+def run_limited(max_bytes, headers, chunks, path="/api/v1/solve/"):
+    """Send a request to path through limit_body, returning the messages sent and whether the application ran."""
+    called = []
+    sent = []
+
+    async def application(scope, receive, send):
+        called.append(True)
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        if chunks:
+            body = chunks.pop(0)
+            return {"type": "http.request", "body": body, "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": path, "headers": headers}
+    asyncio.run(limit_body(application, max_bytes)(scope, receive, send))
+    return sent, bool(called)
+
+
+class AdmissionTestCase(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(unsolved_path, "rb") as file:
+            cls.puzzle = file.read()
+        cls.img = cv2.imdecode(np.frombuffer(cls.puzzle, np.uint8), cv2.IMREAD_COLOR)
+        cls.png = cv2.imencode(".png", cls.img)[1].tobytes()
+
+    # @unittest.skip("Skipping this test method")
+    def test_sniff_image(self):
+        """JPEG and PNG sizes are read from their first bytes."""
+        height, width = self.img.shape[:2]
+        self.assertEqual(sniff_image(self.puzzle[:16384]), ImageHeader("jpeg", width, height))
+        self.assertEqual(sniff_image(self.png[:24]), ImageHeader("png", width, height))
+
+    # @unittest.skip("Skipping this test method")
+    def test_sniff_image_needs_more(self):
+        """Heads cut before the size ask for more bytes."""
+        for head in [b"", b"\xff", b"\x89PNG", self.png[:20], self.puzzle[:4], self.puzzle[:4096]]:
+            self.assertIsNone(sniff_image(head))
+
+    # @unittest.skip("Skipping this test method")
+    def test_sniff_image_rejects(self):
+        """Other file types and broken headers are rejected."""
+        for head in [b"not an image", b"GIF89a", b"BM" + bytes(60), b"\xff\xd8\xff\xda\x00\x08"]:
+            with self.assertRaises(PipelineError) as context:
+                sniff_image(head)
+            self.assertEqual(context.exception.status, 400)
+
+    # @unittest.skip("Skipping this test method")
+    def test_check_header_pixels(self):
+        """Decompression bombs are rejected from their header alone."""
+        bomb = png_header(30000, 30000)
+        with self.assertRaises(PipelineError) as context:
+            check_header(bomb, False, 50_000_000)
+        self.assertEqual(context.exception.status, 413)
+        self.assertEqual(context.exception.message, "Image dimensions too large.")
+        self.assertEqual(check_header(png_header(100, 50), False, 5000), ImageHeader("png", 100, 50))
+        # complete files must hold their size
+        with self.assertRaises(PipelineError):
+            check_header(self.png[:20], True, 50_000_000)
+
+    # @unittest.skip("Skipping this test method")
+    def test_read_upload(self):
+        """Files and bytes that pass are returned whole, others raise before being read."""
+        self.assertEqual(read_upload(SimpleUploadedFile("3.jpg", self.puzzle)), self.puzzle)
+        self.assertEqual(read_upload(self.png), self.png)
+        for upload, kwargs, status in [
+            (SimpleUploadedFile("3.jpg", self.puzzle), {"max_bytes": 1000}, 413),
+            (self.puzzle, {"max_bytes": 1000}, 413),
+            (SimpleUploadedFile("3.jpg", self.puzzle), {"max_pixels": 1000}, 413),
+            (SimpleUploadedFile("3.jpg", b"not an image"), {}, 400),
+            (SimpleUploadedFile("3.jpg", self.puzzle[:200]), {}, 400),
+        ]:
+            with self.assertRaises(PipelineError) as context:
+                read_upload(upload, **kwargs)
+            self.assertEqual(context.exception.status, status)
+
+    # @unittest.skip("Skipping this test method")
+    @override_settings(SOLVER_UPLOAD_MAX_BYTES=500_000)
+    def test_upload_handler(self):
+        """Rejected files are replaced in order by their error, others reach the next handler."""
+        files = [
+            SimpleUploadedFile("3.jpg", self.puzzle),
+            SimpleUploadedFile("bomb.png", png_header(30000, 30000) + bytes(1000)),
+            SimpleUploadedFile("text.jpg", b"not an image"),
+            SimpleUploadedFile("big.png", self.png),
+            SimpleUploadedFile("3.png", self.png[:400_000]),
+        ]
+        body = encode_multipart(BOUNDARY, {"puzzle": files})
+        meta = {"CONTENT_TYPE": MULTIPART_CONTENT, "CONTENT_LENGTH": str(len(body))}
+        handlers = [AdmissionUploadHandler(), MemoryFileUploadHandler()]
+        _, parsed = MultiPartParser(meta, BytesIO(body), handlers).parse()
+        uploads = parsed.getlist("puzzle")
+
+        self.assertEqual([upload.name for upload in uploads], [file.name for file in files])
+        self.assertNotIsInstance(uploads[0], RejectedUpload)
+        self.assertEqual(uploads[0].read(), self.puzzle)
+        self.assertEqual(uploads[1].error.message, "Image dimensions too large.")
+        self.assertEqual(uploads[2].error.status, 400)
+        self.assertEqual(uploads[3].error.message, "Puzzle file too large.")
+        self.assertNotIsInstance(uploads[4], RejectedUpload)
+        with self.assertRaises(PipelineError):
+            read_upload(uploads[1])
+
+    # @unittest.skip("Skipping this test method")
+    def test_limit_body(self):
+        """Bodies over the limit are answered with 413, by length before reading or as soon as they grow past it."""
+        sent, called = run_limited(lambda path, content_type: 100, [(b"content-length", b"1000")], [bytes(1000)])
+        self.assertFalse(called)
+        self.assertEqual(sent[0]["status"], 413)
+        self.assertEqual(json.loads(sent[1]["body"])["message"], "Request body too large.")
+
+        sent, called = run_limited(lambda path, content_type: 100, [], [bytes(60), bytes(60), bytes(60)])
+        self.assertTrue(called)
+        self.assertEqual([message["status"] for message in sent if "status" in message], [413])
+
+        sent, called = run_limited(lambda path, content_type: 100, [(b"content-length", b"80")], [bytes(40), bytes(40)])
+        self.assertEqual(sent[0]["status"], 200)
+
+    # @unittest.skip("Skipping this test method")
+    @override_settings(SOLVER_UPLOAD_MAX_BYTES=100_000, SOLVER_BATCH_MAX_FILES=4, SOLVER_JOB_MAX_FILES=8)
+    def test_max_body_bytes(self):
+        """Each endpoint takes its own number of files, one for single photo and unknown paths."""
+        self.assertEqual(max_files("/api/v1/solve/"), 1)
+        self.assertEqual(max_files("/api/v1/solve/batch/"), 4)
+        self.assertEqual(max_files("/api/v1/jobs/"), 8)
+        self.assertEqual(max_files("/nowhere/"), 1)
+        self.assertEqual(max_body_bytes("/api/v1/solve/batch/") - max_body_bytes("/api/v1/solve/"), 300_000)
+
+        sent, called = run_limited(max_body_bytes, [], [bytes(100_000)] * 3, "/api/v1/solve/")
+        self.assertEqual(sent[0]["status"], 413)
+        sent, called = run_limited(max_body_bytes, [], [bytes(100_000)] * 3, "/api/v1/solve/batch/")
+        self.assertEqual(sent[0]["status"], 200)
+
+    # @unittest.skip("Skipping this test method")
+    @override_settings(SOLVER_UPLOAD_MAX_BYTES=100_000, SOLVER_JOB_MAX_FILES=8, SOLVER_JOB_MAX_GRIDS=10)
+    def test_max_body_bytes_grids(self):
+        """Json bodies to the jobs endpoint take its most grids, multipart bodies its most photos."""
+        self.assertEqual(max_body_bytes("/api/v1/jobs/", "application/json") - BODY_OVERHEAD, 10 * GRID_MAX_BYTES)
+        self.assertEqual(max_body_bytes("/api/v1/jobs/", "multipart/form-data; boundary=x") - BODY_OVERHEAD, 800_000)
+        self.assertEqual(max_body_bytes("/api/v1/solve/batch/", "application/json"), max_body_bytes("/api/v1/solve/batch/"))
+
+        body = json.dumps({"grids": ["0" * 81] * 1000}).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        sent, called = run_limited(max_body_bytes, headers, [body], "/api/v1/jobs/")
+        self.assertEqual((sent[0]["status"], called), (413, False))
+        headers[0] = (b"content-type", b"multipart/form-data; boundary=x")
+        sent, called = run_limited(max_body_bytes, headers, [body], "/api/v1/jobs/")
+        self.assertEqual((sent[0]["status"], called), (200, True))
+
+    # @unittest.skip("Skipping this test method")
+    @override_settings(SOLVER_UPLOAD_MAX_BYTES=1000)
+    def test_body_limit_middleware(self):
+        """Requests declaring a body over the limit of their endpoint are answered 413 without running the view."""
+        middleware = BodyLimitMiddleware(lambda request: HttpResponse("ok"))
+        factory = RequestFactory()
+        request = factory.post("/api/v1/solve/", bytes(70_000), content_type="application/octet-stream")
+        response = middleware(request)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(json.loads(response.content)["message"], "Request body too large.")
+        request = factory.post("/api/v1/solve/", bytes(1000), content_type="application/octet-stream")
+        self.assertEqual(middleware(request).status_code, 200)
+
+    # @unittest.skip("Skipping this test method")
+    def test_upload_handler_max_files(self):
+        """Files past the number their endpoint takes are dropped unread."""
+        files = [SimpleUploadedFile("3.jpg", self.puzzle), SimpleUploadedFile("4.jpg", self.puzzle)]
+        body = encode_multipart(BOUNDARY, {"puzzle": files})
+        meta = {"CONTENT_TYPE": MULTIPART_CONTENT, "CONTENT_LENGTH": str(len(body))}
+        for path, dropped in [("/api/v1/solve/", True), ("/api/v1/solve/batch/", False)]:
+            request = RequestFactory().post(path)
+            handlers = [AdmissionUploadHandler(request), MemoryFileUploadHandler(request)]
+            first, second = MultiPartParser(meta, BytesIO(body), handlers).parse()[1].getlist("puzzle")
+            self.assertNotIsInstance(first, RejectedUpload)
+            self.assertEqual(isinstance(second, RejectedUpload), dropped)
+        self.assertEqual(second.read(), self.puzzle)
@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase
+import numpy as np
+import unittest
+import yaml
+
+from ..board import Board
+
+
+########################################################################################################################
+# Global Variables
+with open("./data/data/data.yaml", "r") as file:
+    data = yaml.safe_load(file)
+
+test_unsolved_string = data["test_unsolved_string"]
+test_unsolved = data["test_unsolved"]
+test_unsolved_16x16_string = data["test_unsolved_16x16_string"]
+########################################################################################################################
+
+
+class BoardTestCase(SimpleTestCase):
+    unconverted = test_unsolved_string
+    unsolved = test_unsolved
+
+    # @unittest.skip("Skipping this test method")
+    def test_conversions(self):
+        """String, list and numpy conversions agree with each other."""
+        board = Board.from_string(self.unconverted)
+        self.assertEqual(board.to_list(), self.unsolved)
+        self.assertEqual(board.to_string(), self.unconverted)
+        self.assertEqual(Board.from_list(self.unsolved), board)
+        self.assertEqual(Board.from_string(self.unconverted.replace("0", ".")), board)
+        self.assertEqual(board[0, 4], 6)
+        self.assertEqual(len(board.empties()), 58)
+
+    # @unittest.skip("Skipping this test method")
+    def test_sizes(self):
+        """16x16 boards round trip through strings with letters for digits above 9."""
+        board = Board.from_string(test_unsolved_16x16_string)
+        self.assertEqual(board.size, 16)
+        self.assertEqual(board.box_size, 4)
+        self.assertEqual(board[0, 12], 11)
+        self.assertEqual(board.to_string(), test_unsolved_16x16_string)
+        self.assertEqual(Board.from_string(test_unsolved_16x16_string.lower()), board)
+        self.assertEqual(Board.from_list(board.to_list()), board)
+        self.assertEqual(board.to_numpy().shape, (16, 16))
+
+    # @unittest.skip("Skipping this test method")
+    def test_numpy_shares_memory(self):
+        """Numpy conversions do not copy cells."""
+        board = Board.from_string(self.unconverted)
+        view = board.to_numpy()
+        board[0, 0] = 2
+        self.assertEqual(view[0, 0], 2)
+
+        array = np.array(self.unsolved, dtype=np.uint8)
+        wrapped = Board.from_numpy(array)
+        array[8, 8] = 9
+        self.assertEqual(wrapped[80], 9)
+        self.assertEqual(wrapped.copy().to_list(), array.tolist())
+
+    # @unittest.skip("Skipping this test method")
+    def test_invalid(self):
+        """Improper input raises ValueError."""
+        with self.assertRaises(ValueError):
+            Board.from_string(self.unconverted[:-2])
+        with self.assertRaises(ValueError):
+            Board.from_string(self.unconverted[:-1] + "x")
+        with self.assertRaises(ValueError):
+            Board.from_list(self.unsolved[:-1])
@@ -0,0 +1,99 @@
+import cv2
+from django.test import SimpleTestCase
+import numpy as np
+import os
+import unittest
+import yaml
+
+from ..cache import GridCache, grid_hash, grid_key
+from ..pipeline import locate_image
+
+#############################################################################
+# Global Variables
+with open("./data/data/data.yaml", "r") as file:
+    data = yaml.safe_load(file)
+
+test_unsolved_img = data["test_unsolved_img"]
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+unsolved_path = os.path.join(BASE_DIR, "data/puzzles/3.jpg")
+other_path = os.path.join(BASE_DIR, "data/puzzles/1.jpg")
+#############################################################################
+
+
+class GridCacheTestCase(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        img = cv2.imread(unsolved_path)
+        cls.located = locate_image(img)
+        cls.key = grid_key(cls.located.warped, cls.located.cells)
+        recompressed = cv2.imdecode(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 30])[1], cv2.IMREAD_COLOR)
+        resized = cv2.resize(img, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        cls.variants = [locate_image(recompressed), locate_image(resized)]
+        cls.other = locate_image(cv2.imread(other_path))
+
+    # @unittest.skip("Skipping this test method")
+    def test_grid_hash(self):
+        """Hash is stable under recompression and resizing and differs between puzzles."""
+        self.assertEqual(grid_hash(self.located.warped), self.key.hash)
+        for variant in self.variants:
+            self.assertLessEqual((grid_hash(variant.warped) ^ self.key.hash).bit_count(), 48)
+        self.assertGreater((grid_hash(self.other.warped) ^ self.key.hash).bit_count(), 48)
+
+    # @unittest.skip("Skipping this test method")
+    def test_grid_key(self):
+        """Occupied cells are the givens of the puzzle."""
+        self.assertEqual(self.key.occupied.shape, (81,))
+        self.assertEqual(self.key.shapes.shape, (81, 16, 16))
+        self.assertTrue(np.array_equal(self.key.occupied, np.array(test_unsolved_img).ravel() > 0))
+
+    # @unittest.skip("Skipping this test method")
+    def test_lookup(self):
+        """Variants of a stored grid hit, other puzzles miss."""
+        cache = GridCache()
+        self.assertIsNone(cache.lookup(self.key))
+        cache.store(self.key, [[1]], [[2]], [[0.9]])
+        for variant in self.variants:
+            entry = cache.lookup(grid_key(variant.warped, variant.cells))
+            self.assertIsNotNone(entry)
+            self.assertEqual(entry.solved, [[2]])
+        self.assertIsNone(cache.lookup(grid_key(self.other.warped, self.other.cells)))
+        stats = cache.stats()
+        self.assertEqual(stats["lookups"], 4)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    # @unittest.skip("Skipping this test method")
+    def test_verify(self):
+        """Hash matches with different givens are rejected."""
+        cache = GridCache(max_distance=255)
+        cache.store(self.key, [[1]], [[2]], [[0.9]])
+        # blank the first given, the hash barely changes
+        cells = [cell.copy() for cell in self.located.cells]
+        cells[0][:] = 1.0
+        changed = grid_key(self.located.warped, cells)
+        self.assertEqual(changed.hash, self.key.hash)
+        self.assertIsNone(cache.lookup(changed))
+        # swap two different digits
+        cells = [cell.copy() for cell in self.located.cells]
+        givens = np.flatnonzero(self.key.occupied)
+        cells[givens[0]], cells[givens[1]] = cells[givens[1]], cells[givens[0]]
+        self.assertIsNone(cache.lookup(grid_key(self.located.warped, cells)))
+        self.assertIsNone(cache.lookup(grid_key(self.other.warped, self.other.cells)))
+        self.assertEqual(cache.stats()["rejected"], 3)
+
+    # @unittest.skip("Skipping this test method")
+    def test_eviction(self):
+        """Least recently used grids are evicted first."""
+        cache = GridCache(max_entries=2)
+        keys = [self.key._replace(hash=self.key.hash ^ (1 << (100 * n))) for n in range(3)]
+        cache.store(keys[0], [[0]], [[0]], [[0]])
+        cache.store(keys[1], [[1]], [[1]], [[1]])
+        cache.lookup(keys[0])
+        cache.store(keys[2], [[2]], [[2]], [[2]])
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(set(cache.entries), {keys[0].hash, keys[2].hash})
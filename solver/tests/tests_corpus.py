@@ -0,0 +1,96 @@
+import csv
+from django.test import SimpleTestCase
+import numpy as np
+import os
+import tempfile
+import unittest
+
+from ..board import Board
+from ..corpus import CORPUS_HEADER_SIZE, CorpusWriter, convert_csv, open_corpus, solve_corpus, write_corpus
+from ..engines import SearchStats
+from ..generator import generate_puzzle
+
+
+########################################################################################################################
+# Global Variables
+puzzles = [generate_puzzle(3, seed) for seed in range(12)]
+########################################################################################################################
+
+
+class CorpusTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.csv_path = os.path.join(self.directory.name, "puzzles.csv")
+        with open(self.csv_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["quizzes", "solutions"])
+            for puzzle in puzzles:
+                writer.writerow([puzzle["quizzes"], puzzle["solutions"]])
+
+    # @unittest.skip("Skipping this test method")
+    def test_convert_csv(self):
+        """Converted corpora hold the csv boards in order, whatever the chunk size."""
+        path = os.path.join(self.directory.name, "puzzles.grids")
+        self.assertEqual(convert_csv(self.csv_path, path, chunk_rows=5), len(puzzles))
+        corpus = open_corpus(path)
+        self.assertEqual((len(corpus), corpus.size), (len(puzzles), 9))
+        self.assertEqual(corpus.puzzles.shape, (len(puzzles), 81))
+        self.assertIsInstance(corpus.puzzles, np.memmap)
+        self.assertEqual(corpus.metadata, {"source": "puzzles.csv"})
+        for (puzzle, solution), expected in zip(corpus.boards(), puzzles):
+            self.assertEqual(puzzle.to_string(), expected["quizzes"])
+            self.assertEqual(solution.to_string(), expected["solutions"])
+        self.assertEqual(corpus[3].to_string(), puzzles[3]["quizzes"])
+        self.assertEqual(len(list(corpus.boards(2, 5))), 3)
+        # blocks are aligned after the header
+        self.assertEqual(corpus.puzzles.offset % 64, 0)
+        self.assertGreaterEqual(corpus.puzzles.offset, CORPUS_HEADER_SIZE)
+
+        self.assertEqual(convert_csv(self.csv_path, path, solutions=None, limit=4), 4)
+        corpus = open_corpus(path)
+        self.assertEqual(len(corpus), 4)
+        self.assertIsNone(corpus.solutions)
+
+    # @unittest.skip("Skipping this test method")
+    def test_write_corpus(self):
+        """Boards of any size round trip, and invalid cells leave no file behind."""
+        path = os.path.join(self.directory.name, "4x4.grids")
+        boards = np.array([list(Board.from_string("0030102000400410").cells)] * 3, dtype=np.uint8)
+        write_corpus(path, boards, metadata={"tier": "easy"})
+        corpus = open_corpus(path)
+        self.assertEqual((len(corpus), corpus.size, corpus.metadata), (3, 4, {"tier": "easy"}))
+        np.testing.assert_array_equal(corpus.puzzles, boards)
+
+        with self.assertRaises(ValueError):
+            with CorpusWriter(path + "2", 4, with_solutions=False) as writer:
+                writer.append(boards + 5)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["4x4.grids", "puzzles.csv"])
+
+        write_corpus(path, np.zeros((0, 16), dtype=np.uint8))
+        self.assertEqual(len(open_corpus(path)), 0)
+
+    # @unittest.skip("Skipping this test method")
+    def test_open_corpus_rejects(self):
+        """Files that are not corpora or are cut short are rejected."""
+        path = os.path.join(self.directory.name, "puzzles.grids")
+        with self.assertRaises(ValueError):
+            open_corpus(self.csv_path)
+        convert_csv(self.csv_path, path)
+        with open(path, "rb+") as file:
+            file.truncate(os.path.getsize(path) - 1)
+        with self.assertRaises(ValueError):
+            open_corpus(path)
+
+    # @unittest.skip("Skipping this test method")
+    def test_solve_corpus(self):
+        """Slices are solved in threads and checked against the stored solutions."""
+        path = os.path.join(self.directory.name, "puzzles.grids")
+        convert_csv(self.csv_path, path)
+        corpus = open_corpus(path)
+        stats = SearchStats()
+        result = solve_corpus(corpus, 2, 10, workers=3, stats=stats)
+        self.assertEqual((result["count"], result["unsolved"], result["matched"]), (8, 0, 8))
+        np.testing.assert_array_equal(result["solutions"], corpus.solutions[2:10])
+        self.assertGreaterEqual(stats.nodes, 8)
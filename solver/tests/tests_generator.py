@@ -0,0 +1,145 @@
+import csv
+from django.test import SimpleTestCase
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from ..board import Board
+from ..engines import count_solutions
+from ..generator import (
+    CORPUS_COLUMNS,
+    MAX_PUZZLES_FACTOR,
+    LogicalSolver,
+    generate_corpus,
+    generate_puzzle,
+    grade,
+    minimize,
+    puzzle_seed,
+    random_solution,
+    read_corpus,
+)
+from ..sudoku_solver import Sudoku
+
+
+########################################################################################################################
+# Global Variables
+singles = "000060080007000004050803100006000800700010005008000400005609020100000300040070000"
+locked = "790008040304000000000000009020040700800239400500000600417000020000500030000002900"
+hidden_pair = "010030040003080600207060000400000009800004500090506000000020900300000106000001005"
+search = "800000000003600000070090200050007000000045700000100030001000068008500010090000400"
+########################################################################################################################
+
+
+class GeneratorTestCase(SimpleTestCase):
+
+    # @unittest.skip("Skipping this test method")
+    def test_random_solution(self):
+        """Random solutions are solved boards of every size."""
+        rng = random.Random(0)
+        for box_size in (2, 3, 4):
+            solution = random_solution(box_size, rng)
+            self.assertEqual(solution.size, box_size * box_size)
+            self.assertTrue(Sudoku._is_solved(solution))
+
+    # @unittest.skip("Skipping this test method")
+    def test_minimize(self):
+        """Minimized puzzles have one solution and lose it when any clue is removed."""
+        rng = random.Random(1)
+        for box_size, symmetric in [(2, False), (3, False), (3, True)]:
+            solution = random_solution(box_size, rng)
+            puzzle = minimize(solution, rng, symmetric)
+            self.assertEqual(count_solutions(puzzle), 1)
+            last = len(puzzle) - 1
+            for idx in range(len(puzzle)):
+                if not puzzle[idx]:
+                    continue
+                self.assertEqual(puzzle[idx], solution[idx])
+                reduced = puzzle.copy()
+                reduced[idx] = 0
+                if symmetric:
+                    self.assertTrue(puzzle[last - idx])
+                    reduced[last - idx] = 0
+                self.assertEqual(count_solutions(reduced), 2)
+
+    # @unittest.skip("Skipping this test method")
+    def test_grade(self):
+        """Puzzles are graded by the hardest technique they need."""
+        for puzzle, tier, technique in [
+            (singles, "easy", "hidden_single"),
+            (locked, "medium", "locked_candidates"),
+            (hidden_pair, "hard", "hidden_pair"),
+            (search, "extreme", "search"),
+        ]:
+            graded = grade(Board.from_string(puzzle))
+            self.assertEqual((graded["tier"], graded["technique"]), (tier, technique))
+            self.assertGreaterEqual(graded["nodes"], 1)
+
+    # @unittest.skip("Skipping this test method")
+    def test_logical_solver(self):
+        """Logical solver fills puzzles it can solve with their solution and leaves the rest."""
+        solver = LogicalSolver(Board.from_string(hidden_pair))
+        self.assertTrue(solver.solve())
+        self.assertTrue(Sudoku._is_solved(Board(solver.cells, 9)))
+        self.assertGreater(solver.steps["hidden_pair"], 0)
+
+        solver = LogicalSolver(Board.from_string(search))
+        self.assertFalse(solver.solve())
+        self.assertIn(0, solver.cells)
+
+    # @unittest.skip("Skipping this test method")
+    def test_generate_puzzle(self):
+        """Puzzles depend only on their seed."""
+        first = generate_puzzle(3, puzzle_seed(7, 3))
+        self.assertEqual(first, generate_puzzle(3, puzzle_seed(7, 3)))
+        self.assertNotEqual(first["quizzes"], generate_puzzle(3, puzzle_seed(7, 4))["quizzes"])
+        self.assertEqual(first["clues"], 81 - first["quizzes"].count("0"))
+        self.assertEqual(Sudoku._is_solved(Board.from_string(first["solutions"])), True)
+
+    # @unittest.skip("Skipping this test method")
+    def test_generate_corpus(self):
+        """Corpus files hold the requested puzzles per tier, the same for any number of workers."""
+        with tempfile.TemporaryDirectory() as directory:
+            counts = generate_corpus(directory, 5, ("easy", "medium"), seed=3, workers=1)
+            self.assertEqual(counts, {"easy": 5, "medium": 5})
+            with open(os.path.join(directory, "medium.csv")) as file:
+                rows = list(csv.reader(file))
+            self.assertEqual(tuple(rows[0]), CORPUS_COLUMNS)
+            self.assertEqual({row[3] for row in rows[1:]}, {"locked_candidates"})
+            with open(os.path.join(directory, "manifest.json")) as file:
+                manifest = json.load(file)
+            self.assertEqual(manifest["counts"], counts)
+
+            pairs = read_corpus(os.path.join(directory, "easy.csv"))
+            self.assertEqual(len(pairs), 5)
+            for puzzle, solution in pairs:
+                self.assertEqual(count_solutions(puzzle), 1)
+                self.assertTrue(Sudoku._is_solved(solution))
+
+            generate_corpus(directory, 5, ("easy", "medium"), seed=3, workers=2)
+            with open(os.path.join(directory, "medium.csv")) as file:
+                self.assertEqual(list(csv.reader(file)), rows)
+
+    # @unittest.skip("Skipping this test method")
+    def test_generate_corpus_unfilled(self):
+        """Generation stops after count * MAX_PUZZLES_FACTOR puzzles, listing the tiers left short."""
+        with tempfile.TemporaryDirectory() as directory:
+            # 4x4 puzzles never need search
+            counts = generate_corpus(directory, 2, ("easy", "expert"), box_size=2, workers=1)
+            self.assertEqual(counts, {"easy": 2, "expert": 0})
+            with open(os.path.join(directory, "manifest.json")) as file:
+                manifest = json.load(file)
+            self.assertEqual(manifest["unfilled"], ["expert"])
+            self.assertEqual(manifest["puzzles_made"], 2 * MAX_PUZZLES_FACTOR)
+
+            generate_corpus(directory, 2, ("easy", "expert"), box_size=2, workers=1, max_puzzles=10)
+            with open(os.path.join(directory, "manifest.json")) as file:
+                self.assertEqual(json.load(file)["puzzles_made"], 10)
+
+    # @unittest.skip("Skipping this test method")
+    def test_generate_corpus_tiers(self):
+        """Unknown tiers are rejected."""
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                generate_corpus(directory, 1, ("trivial",))
@@ -0,0 +1,280 @@
+from datetime import timedelta
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from ..benchmarks import make_puzzle
+from ..jobs import (
+    INPUTS_FILE,
+    attempt_directory,
+    claim,
+    cleanup_expired,
+    job_directory,
+    job_status,
+    queue_metrics,
+    requeue_expired,
+    result_path,
+    run_job,
+    submit_grids,
+    submit_photos,
+    work,
+)
+from ..models import Job
+from ..utilities import create_mock_image
+
+
+#############################################################################
+# Global Variables
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+unsolved_path = os.path.join(BASE_DIR, "data/puzzles/3.jpg")
+easy = "003020600900305001001806400008102900700000008006708200002609500800203009005010300"
+conflicting = "113020600900305001001806400008102900700000008006708200002609500800203009005010300"
+#############################################################################
+
+
+class JobQueueTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(SOLVER_JOB_DIR=self.directory, SOLVER_JOB_MAX_ATTEMPTS=2)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    # @unittest.skip("Skipping this test method")
+    def test_grid_job(self):
+        """Grid jobs are solved by a worker, each grid with its own status."""
+        job = submit_grids([easy, conflicting], "bitset")
+        self.assertEqual(job_status(job)["status"], "queued")
+        self.assertEqual(work(burst=True), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.items, job.solved, job.attempts), (Job.DONE, 2, 1, 1))
+        with open(result_path(job)) as file:
+            results = json.load(file)["results"]
+        self.assertEqual(len(results[0]["solved"]), 81)
+        self.assertNotIn("0", results[0]["solved"])
+        self.assertEqual(results[1]["message"], "Puzzle contains conflicting digits.")
+        self.assertIsNotNone(job_status(job)["expires_at"])
+
+    # @unittest.skip("Skipping this test method")
+    def test_grid_job_limit(self):
+        """Grids past the node limit time out on their own, the rest of the job is solved."""
+        job = submit_grids([easy, make_puzzle(5, random.Random(1), 0.3).to_string()], "auto")
+        with override_settings(SOLVER_MAX_NODES=1000):
+            work(burst=True)
+        job.refresh_from_db()
+        with open(result_path(job)) as file:
+            response = json.load(file)
+        self.assertEqual(response["message"], "Solved 1 of 2 puzzles. 1 took too long to solve.")
+        self.assertEqual([result["status"] for result in response["results"]], [200, 503])
+
+    # @unittest.skip("Skipping this test method")
+    def test_lost_lease(self):
+        """A run whose job was reclaimed by another worker leaves the results of that worker alone."""
+        job = submit_grids([easy])
+        stopped = claim("stopped")
+        Job.objects.filter(id=job.id).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        requeue_expired()
+        other = claim("other")
+        self.assertTrue(run_job(other, "other"))
+        self.assertFalse(run_job(stopped, "stopped"))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts), (Job.DONE, "other", 2))
+        self.assertFalse(os.path.exists(attempt_directory(stopped)))
+        self.assertEqual(os.path.dirname(result_path(job)), attempt_directory(other))
+        with open(result_path(job)) as file:
+            self.assertEqual(json.load(file)["message"], "Solved 1 of 1 puzzles.")
+
+    # @unittest.skip("Skipping this test method")
+    def test_submit_grids_invalid(self):
+        """Malformed boards and unknown engines are refused without queueing a job."""
+        for grids, engine in [(["123"], None), ([easy, 7], None), ([easy], "fast")]:
+            with self.assertRaises(ValueError):
+                submit_grids(grids, engine)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(os.listdir(self.directory), [])
+
+    # @unittest.skip("Skipping this test method")
+    def test_submit_photos(self):
+        """Photos failing admission are kept as failed results in their place."""
+        with open(unsolved_path, "rb") as file:
+            photo = file.read()
+        job = submit_photos([("a.jpg", photo), ("b.gif", photo), ("c.png", create_mock_image(5, 5)[:20])], {"format": "json"})
+        with open(os.path.join(job_directory(job.id), INPUTS_FILE)) as file:
+            inputs = json.load(file)
+        self.assertEqual(inputs[0], {"name": "a.jpg", "file": "000000.upload"})
+        self.assertEqual(inputs[1]["message"], "Invalid file type, image must be a JPEG or PNG file.")
+        self.assertEqual(inputs[2]["status"], 400)
+        self.assertEqual(job.items, 3)
+
+    # @unittest.skip("Skipping this test method")
+    def test_retry(self):
+        """Jobs that raise are queued again with a delay, then failed once out of attempts."""
+        with open(unsolved_path, "rb") as file:
+            job = submit_photos([("a.jpg", file.read())], {"format": "json"})
+        os.remove(os.path.join(job_directory(job.id), "000000.upload"))
+
+        with self.assertLogs("solver.jobs", "ERROR"):
+            self.assertEqual(work(burst=True), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn("000000.upload", job.error)
+        # not due yet
+        self.assertIsNone(claim("test"))
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        with self.assertLogs("solver.jobs", "ERROR"):
+            work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    # @unittest.skip("Skipping this test method")
+    def test_requeue_expired(self):
+        """Jobs of workers that stopped renewing their lease are queued again until out of attempts."""
+        job = submit_grids([easy])
+        self.assertEqual(claim("stopped").id, job.id)
+        self.assertIsNone(claim("other"))
+        Job.objects.filter(id=job.id).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(requeue_expired(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.QUEUED, ""))
+
+        claim("stopped")
+        Job.objects.filter(id=job.id).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(requeue_expired(), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    # @unittest.skip("Skipping this test method")
+    def test_cleanup_expired(self):
+        """Finished jobs are deleted with their files once past their time to live."""
+        old = submit_grids([easy])
+        recent = submit_grids([easy])
+        pending = submit_grids([easy])
+        work(burst=True)
+        Job.objects.filter(id=pending.id).update(status=Job.QUEUED)
+        Job.objects.filter(id=old.id).update(finished_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(cleanup_expired(0), 0)
+        self.assertEqual(cleanup_expired(3600), 1)
+        self.assertEqual(set(Job.objects.values_list("id", flat=True)), {recent.id, pending.id})
+        self.assertFalse(os.path.exists(job_directory(old.id)))
+        self.assertTrue(os.path.exists(job_directory(recent.id)))
+
+    # @unittest.skip("Skipping this test method")
+    def test_queue_metrics(self):
+        """Metrics report depth by status and the throughput of finished jobs."""
+        submit_grids([easy, easy])
+        work(burst=True)
+        submit_grids([easy, easy, easy])
+        metrics = queue_metrics(60)
+        self.assertEqual((metrics["queued"], metrics["running"], metrics["done"], metrics["failed"]), (1, 0, 1, 0))
+        self.assertEqual(metrics["queued_items"], 3)
+        self.assertEqual(metrics["finished_jobs"], 1)
+        self.assertAlmostEqual(metrics["items_per_second"], 2 / 60, places=3)
+        self.assertGreaterEqual(metrics["oldest_queued_s"], 0)
+        self.assertGreaterEqual(metrics["mean_run_ms"], 0)
+
+
+class JobsAPITestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(SOLVER_JOB_DIR=self.directory)
+        self.settings.enable()
+        self.client = Client()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    # @unittest.skip("Skipping this test method")
+    def test_grid_job(self):
+        """Grid jobs are queued, polled and fetched once done."""
+        response = self.client.post(reverse("jobs"), {"grids": [easy], "engine": "auto"}, content_type="application/json")
+        self.assertEqual(response.status_code, 202)
+        response_data = json.loads(response.content)
+        self.assertEqual(response_data["job"]["status"], "queued")
+
+        job_url = response_data["url"]
+        self.assertNotIn("result_url", json.loads(self.client.get(job_url).content))
+        result_url = reverse("job-result", args=[response_data["job"]["id"]])
+        self.assertEqual(self.client.get(result_url).status_code, 409)
+
+        work(burst=True)
+        job = json.loads(self.client.get(job_url).content)
+        self.assertEqual((job["status"], job["solved"]), ("done", 1))
+        response = self.client.get(job["result_url"])
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(results["message"], "Solved 1 of 1 puzzles.")
+
+        metrics = json.loads(self.client.get(reverse("jobs")).content)
+        self.assertEqual(metrics["done"], 1)
+
+    # @unittest.skip("Skipping this test method")
+    def test_post_invalid(self):
+        """Jobs without puzzles, with malformed grids, too many files or too large a body are refused."""
+        response = self.client.post(reverse("jobs"), {}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse("jobs"), {"grids": ["12"]}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)["message"], "Invalid grids.")
+        response = self.client.post(reverse("jobs"), {"grids": easy}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+        with override_settings(SOLVER_JOB_MAX_FILES=1):
+            files = [SimpleUploadedFile(f"{index}.png", create_mock_image(5, 5), content_type="image/png") for index in range(2)]
+            response = self.client.post(reverse("jobs"), {"puzzle": files}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)["message"], "Too many puzzle files.")
+
+        # json bodies are limited by the most grids, not the most photos
+        with override_settings(SOLVER_JOB_MAX_GRIDS=2):
+            response = self.client.post(reverse("jobs"), {"grids": [easy] * 1000}, content_type="application/json")
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(json.loads(response.content)["message"], "Request body too large.")
+        self.assertFalse(Job.objects.exists())
+
+    # @unittest.skip("Skipping this test method")
+    def test_photo_job(self):
+        """Photo jobs are queued with their response options."""
+        with open(unsolved_path, "rb") as file:
+            puzzle = SimpleUploadedFile("unsolved.jpg", file.read(), content_type="image/jpeg")
+        response = self.client.post(reverse("jobs") + "?format=png", {"puzzle": [puzzle]}, format="multipart")
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.items, job.options["format"]), (Job.PHOTOS, 1, "png"))
+
+    # @unittest.skip("Skipping this test method")
+    def test_photo_job_accept(self):
+        """The response format of photo jobs is the supported type with the highest q in the Accept header."""
+        with open(unsolved_path, "rb") as file:
+            photo = file.read()
+        for accept, image_format in [
+            ("image/webp;q=0.1, application/json", "json"),
+            ("application/json;q=0, image/png;q=0.5, image/webp;q=0.5", "png"),
+            ("application/json;q=0, text/html", "jpeg"),
+        ]:
+            puzzle = SimpleUploadedFile("unsolved.jpg", photo, content_type="image/jpeg")
+            response = self.client.post(reverse("jobs"), {"puzzle": [puzzle]}, format="multipart", HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(Job.objects.get(id=json.loads(response.content)["job"]["id"]).options["format"], image_format)
+
+    # @unittest.skip("Skipping this test method")
+    def test_unknown_job(self):
+        """Unknown and expired jobs are not found."""
+        self.assertEqual(self.client.get(reverse("job", args=["00000000-0000-0000-0000-000000000000"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("job-result", args=["00000000-0000-0000-0000-000000000000"])).status_code, 404)
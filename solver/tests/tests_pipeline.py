@@ -0,0 +1,116 @@
+from django.test import SimpleTestCase, override_settings
+import numpy as np
+import os
+import random
+import unittest
+import yaml
+
+from ..benchmarks import make_puzzle
+from ..pipeline import (
+    PipelineError,
+    check_extension,
+    locate_puzzle,
+    render_solution,
+    solve_batch,
+    solve_grid,
+)
+from ..utilities import convert_file_to_nparray, create_mock_image, get_prediction_model
+
+#############################################################################
+# Global Variables
+with open("./data/data/data.yaml", "r") as file:
+    data = yaml.safe_load(file)
+
+test_unsolved_img = data["test_unsolved_img"]
+test_solved_img = data["test_solved_img"]
+test_unsolvable = data["test_unsolvable"]
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+unsolved_path = os.path.join(BASE_DIR, "data/puzzles/3.jpg")
+solved_solution_path = os.path.join(BASE_DIR, "data/puzzles/3_solution.jpg")
+#############################################################################
+
+
+class PipelineTestCase(SimpleTestCase):
+
+    border = np.array([[[44, 215]], [[1873, 215]], [[44, 1848]], [[1873, 1847]]], dtype=np.int32)
+    options = {"format": "jpeg", "quality": 95, "max_dimension": 0}
+
+    def setUp(self):
+        with open(unsolved_path, "rb") as file:
+            self.puzzle = file.read()
+
+    # @unittest.skip("Skipping this test method")
+    def test_check_extension(self):
+        """Only JPEG and PNG names are accepted."""
+        for name in ["a.jpg", "a.JPEG", "a.png"]:
+            check_extension(name)
+        for name in ["a.gif", "a.webp", "jpg"]:
+            with self.assertRaises(PipelineError) as context:
+                check_extension(name)
+            self.assertEqual(context.exception.message, "Invalid file type, image must be a JPEG or PNG file.")
+            self.assertEqual(context.exception.status, 400)
+
+    # @unittest.skip("Skipping this test method")
+    def test_locate_puzzle(self):
+        """Border and 81 model inputs are found in the photo."""
+        located = locate_puzzle(self.puzzle)
+        self.assertEqual(located.img.shape, (1920, 1920, 3))
+        self.assertTrue(np.array_equal(located.border, self.border))
+        self.assertEqual(len(located.cells), 81)
+        self.assertEqual(located.cells[0].shape, (32, 32))
+
+    # @unittest.skip("Skipping this test method")
+    def test_locate_puzzle_failures(self):
+        """Unreadable and borderless images raise the stage that failed."""
+        for upload, message in [
+            (b"not an image", "Failed to convert file to numpy array."),
+            (create_mock_image(5, 5), "Failed to find borders of sudoku puzzle."),
+        ]:
+            with self.assertRaises(PipelineError) as context:
+                locate_puzzle(upload)
+            self.assertEqual(context.exception.message, message)
+
+    # @unittest.skip("Skipping this test method")
+    def test_solve_grid(self):
+        """Grids are solved, conflicting grids are rejected."""
+        self.assertEqual(solve_grid(test_unsolved_img), test_solved_img)
+        with self.assertRaises(PipelineError) as context:
+            solve_grid(test_unsolvable)
+        self.assertEqual(context.exception.message, "Puzzle contains conflicting digits.")
+
+    # @unittest.skip("Skipping this test method")
+    def test_solve_grid_limits(self):
+        """Grids not answered within the node limit or the portfolio deadline answer 503, not unsolvable."""
+        grid = make_puzzle(5, random.Random(1), 0.3).to_list()
+        with override_settings(SOLVER_ENGINE="auto", SOLVER_MAX_NODES=10):
+            with self.assertRaises(PipelineError) as context:
+                solve_grid(grid)
+        self.assertEqual((context.exception.status, context.exception.message), (503, "Puzzle took too long to solve."))
+        with override_settings(SOLVER_ENGINE="portfolio", SOLVER_PORTFOLIO_STRATEGIES="bitset", SOLVER_PORTFOLIO_DEADLINE_MS=1):
+            with self.assertRaises(PipelineError) as context:
+                solve_grid(grid)
+        self.assertEqual(context.exception.status, 503)
+
+    # @unittest.skip("Skipping this test method")
+    def test_render_solution(self):
+        """Rendered solution matches the single image endpoint."""
+        located = locate_puzzle(self.puzzle)
+        image, content_type = render_solution(located, test_unsolved_img, test_solved_img, self.options)
+        self.assertEqual(content_type, "image/jpeg")
+        with open(solved_solution_path, "rb") as file:
+            expected = convert_file_to_nparray(file.read())
+        actual = convert_file_to_nparray(image)
+        self.assertLess(np.mean((actual.astype(float) - expected) ** 2), 5)
+
+    # @unittest.skip("Skipping this test method")
+    def test_solve_batch(self):
+        """Every upload gets a result in order, failures do not affect the others."""
+        uploads = [("3.jpg", self.puzzle), ("3.gif", self.puzzle), ("blank.jpg", create_mock_image(5, 5)), ("3.png", self.puzzle)]
+        results = solve_batch(uploads, get_prediction_model(), self.options, 2)
+        self.assertEqual([result["index"] for result in results], [0, 1, 2, 3])
+        self.assertEqual([result["status"] for result in results], [200, 400, 400, 200])
+        for result in (results[0], results[3]):
+            self.assertEqual(result["unsolved"], test_unsolved_img)
+            self.assertEqual(result["solved"], test_solved_img)
+            self.assertEqual(result["content_type"], "image/jpeg")
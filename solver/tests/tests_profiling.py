@@ -0,0 +1,86 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+import os
+import tempfile
+import time
+import unittest
+
+from ..profiling import PROFILE_FILE_HEADER, ProfileRing, SamplingProfiler, profile_request, profile_summary
+
+
+def busy_wait(seconds):
+    """Spin the interpreter for the given seconds."""
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+class ProfiledView:
+
+    @profile_request
+    def post(self, request):
+        busy_wait(0.05)
+        return HttpResponse("ok")
+
+
+class ProfilingTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # @unittest.skip("Skipping this test method")
+    def test_sampling_profiler(self):
+        """Samples of the profiled thread land in the function it is busy in."""
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_wait(0.1)
+        self.assertGreater(profiler.samples, 10)
+        busy = sum(count for stack, count in profiler.stacks.items() if stack[-1].startswith("busy_wait"))
+        self.assertGreater(busy / profiler.samples, 0.8)
+        # most sampled stack first, from the frame that started the profiler
+        line = profiler.folded().splitlines()[0]
+        self.assertRegex(line, r"^test_sampling_profiler \(tests_profiling\.py:\d+\);busy_wait \(tests_profiling\.py:\d+\) \d+$")
+
+    # @unittest.skip("Skipping this test method")
+    def test_profile_ring(self):
+        """Only the newest profiles are kept."""
+        ring = ProfileRing(self.directory.name, max_files=3)
+        names = [ring.write(f"view-{k}", f"a;b {k}\n") for k in range(5)]
+        self.assertEqual(ring.files(), names[2:])
+        with open(os.path.join(self.directory.name, names[-1])) as file:
+            self.assertEqual(file.read(), "a;b 4\n")
+
+    # @unittest.skip("Skipping this test method")
+    def test_profile_request(self):
+        """Views are profiled only when enabled and asked for with the right token."""
+        view = ProfiledView()
+        with override_settings(SOLVER_PROFILE_DIR=self.directory.name, SOLVER_PROFILE_MAX_FILES=2, SOLVER_PROFILE_TOKEN="secret"):
+            response = view.post(self.factory.post("/", HTTP_X_SOLVER_PROFILE="secret"))
+            name = response[PROFILE_FILE_HEADER]
+            self.assertIn("ProfiledView", name)
+            self.assertTrue(os.path.exists(os.path.join(self.directory.name, name)))
+
+            for headers in [{}, {"HTTP_X_SOLVER_PROFILE": "wrong"}]:
+                response = view.post(self.factory.post("/", **headers))
+                self.assertNotIn(PROFILE_FILE_HEADER, response)
+
+        with override_settings(SOLVER_PROFILE_DIR="", SOLVER_PROFILE_TOKEN="secret"):
+            response = view.post(self.factory.post("/", HTTP_X_SOLVER_PROFILE="secret"))
+            self.assertNotIn(PROFILE_FILE_HEADER, response)
+        # without a token nobody may profile
+        with override_settings(SOLVER_PROFILE_DIR=self.directory.name, SOLVER_PROFILE_TOKEN=""):
+            response = view.post(self.factory.post("/", HTTP_X_SOLVER_PROFILE="1"))
+            self.assertNotIn(PROFILE_FILE_HEADER, response)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    # @unittest.skip("Skipping this test method")
+    def test_profile_summary(self):
+        """Functions are ranked by the samples of stacks they appear in."""
+        summary = profile_summary("main;solve;search 6\nmain;solve 2\nmain;render 2\n")
+        self.assertEqual(summary[0], {"frame": "main", "total": 10, "own": 0, "share": 1.0})
+        self.assertEqual(summary[1], {"frame": "solve", "total": 8, "own": 2, "share": 0.8})
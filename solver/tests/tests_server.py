@@ -0,0 +1,23 @@
+from django.test import SimpleTestCase
+import unittest
+
+from ..server import warm_up_master, worker_threads
+from ..utilities import glyph_atlas
+
+
+class ServerTestCase(SimpleTestCase):
+
+    # @unittest.skip("Skipping this test method")
+    def test_worker_threads(self):
+        """Test cores are split between workers, at least one thread each."""
+        self.assertEqual(worker_threads(4, cpus=8), 2)
+        self.assertEqual(worker_threads(3, cpus=8), 2)
+        self.assertEqual(worker_threads(16, cpus=8), 1)
+        self.assertEqual(worker_threads(0, cpus=8), 8)
+
+    # @unittest.skip("Skipping this test method")
+    def test_warm_up_master(self):
+        """Test master warm up fills the glyph cache without loading the model."""
+        warm_up_master()
+        info = glyph_atlas.cache_info()
+        self.assertGreaterEqual(info.currsize, 4)
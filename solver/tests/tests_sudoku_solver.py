@@ -2,6 +2,7 @@ from django.test import SimpleTestCase
 import unittest
 import yaml
 
+from ..engines import ENGINES, SearchLimit, SearchStats
 from ..sudoku_solver import Sudoku, convert_board, solve_board
 
 
@@ -11,15 +12,21 @@ with open("./data/data/data.yaml", "r") as file:
     data = yaml.safe_load(file)
 
 test_unsolved_string = data["test_unsolved_string"]
+test_unsolved_4x4_string = data["test_unsolved_4x4_string"]
+test_unsolved_16x16_string = data["test_unsolved_16x16_string"]
 test_unsolvable = data['test_unsolvable']
 test_unsolved = data["test_unsolved"]
 test_solved = data["test_solved"]
 test_incorrect = data["test_incorrect"]
+test_incorrect_conflicts = [tuple(each) for each in data["test_incorrect_conflicts"]]
+test_unsolvable_conflicts = [tuple(each) for each in data["test_unsolvable_conflicts"]]
 test_unsolved_r = {key: set(value) for key, value in data["test_unsolved_r"].items()}
 test_unsolved_c = {key: set(value) for key, value in data["test_unsolved_c"].items()}
 test_unsolved_s = {key: set(value) for key, value in data["test_unsolved_s"].items()}
 test_unsolved_e = {tuple(each) for each in data["test_unsolved_e"]}
 test_invalids = data['test_invalids']
+# no repeated digits, but the last cell of the first row can only be 9, which its square already holds
+test_unsolvable_conflict_free = convert_board("123456780" + "000000009" + "0" * 63)
 ########################################################################################################################
 
 
@@ -39,6 +46,16 @@ class ConvertBoardTestCase(SimpleTestCase):
         actual = convert_board(self.uncoverted[:-2])
         self.assertNotEqual(self.unsolved, actual)
 
+    # @unittest.skip("Skipping this test method")
+    def test_convert_board_sizes(self):
+        """function converts 4x4 and 16x16 strings, digits above 9 as letters."""
+        actual = convert_board(test_unsolved_4x4_string)
+        self.assertEqual(actual[0], [0, 0, 3, 0])
+        actual = convert_board(test_unsolved_16x16_string)
+        self.assertEqual(len(actual), 16)
+        self.assertEqual(actual[0][12:14], [11, 8])
+        self.assertEqual(actual[1][10], 16)
+
 
 class SudokuClassTestCase(SimpleTestCase):
     unsolvable = test_unsolvable
@@ -81,6 +98,14 @@ class SudokuClassTestCase(SimpleTestCase):
         for item in test_invalids:
             self.assertFalse(self.sudoku.check_board_validity(item))
 
+    # @unittest.skip("Skipping this test method")
+    def test_staticmethod_find_conflicts(self):
+        """Repeated digits are reported by cell and valid boards report none."""
+        self.assertEqual(self.sudoku.find_conflicts(self.unsolved), [])
+        self.assertEqual(self.sudoku.find_conflicts(self.solved), [])
+        self.assertEqual(self.sudoku.find_conflicts(self.incorrect), test_incorrect_conflicts)
+        self.assertEqual(self.sudoku.find_conflicts(self.unsolvable), test_unsolvable_conflicts)
+
     # @unittest.skip("Skipping this test method")
     def test_staticmethod_generate_rcs_sets(self):
         """Proper returns"""
@@ -110,3 +135,67 @@ class SudokuClassTestCase(SimpleTestCase):
         self.assertEqual(solved1, self.solved)
         self.assertIsNone(failed)
 
+    # @unittest.skip("Skipping this test method")
+    def test_solve_board_engines(self):
+        """Every engine solves the puzzle and rejects the unsolvable one."""
+        self.assertEqual(Sudoku.find_conflicts(test_unsolvable_conflict_free), [])
+        for engine in ENGINES:
+            self.assertEqual(solve_board(self.unsolved, engine), self.solved)
+            self.assertIsNone(solve_board(test_unsolvable_conflict_free, engine))
+        with self.assertRaises(ValueError):
+            Sudoku(self.unsolved, "banana")
+
+    # @unittest.skip("Skipping this test method")
+    def test_solve_board_stats(self):
+        """Every engine counts its search, counters of several solves add up."""
+        for engine in ENGINES:
+            sudoku = Sudoku(self.unsolved, engine)
+            sudoku.solve_board()
+            stats = sudoku.stats
+            self.assertEqual(stats.engine, engine)
+            self.assertGreater(stats.nodes, 0)
+            self.assertGreater(stats.elapsed_ms, 0)
+            self.assertGreaterEqual(stats.guesses, stats.max_depth)
+            self.assertEqual(set(stats.as_dict()), set(SearchStats.__slots__))
+
+            total = SearchStats()
+            solve_board(self.unsolved, engine, total)
+            solve_board(self.unsolved, engine, total)
+            self.assertEqual(total.engine, engine)
+            self.assertEqual(total.nodes, 2 * stats.nodes)
+            self.assertEqual(total.max_depth, stats.max_depth)
+
+        heap = SearchStats()
+        solve_board(self.unsolved, "heap", heap)
+        self.assertEqual(heap.pushes, heap.nodes)
+        self.assertGreaterEqual(heap.max_bifurcation, 1)
+
+    # @unittest.skip("Skipping this test method")
+    def test_solve_board_max_nodes(self):
+        """Every engine raises SearchLimit once it searches max_nodes nodes, and solves within a large enough limit."""
+        empty = [[0] * 16 for _ in range(16)]
+        for engine in ENGINES:
+            stats = SearchStats()
+            with self.assertRaises(SearchLimit):
+                solve_board(empty, engine, stats, max_nodes=1)
+            self.assertGreater(stats.elapsed_ms, 0)
+            self.assertEqual(solve_board(self.unsolved, engine, max_nodes=10000), self.solved)
+        stats = SearchStats()
+        with self.assertRaises(SearchLimit):
+            solve_board(empty, "bitset", stats, max_nodes=150)
+        self.assertEqual(stats.nodes, 150)
+
+    # @unittest.skip("Skipping this test method")
+    def test_solve_board_sizes(self):
+        """4x4 and 16x16 puzzles are solved keeping their clues."""
+        for string in [test_unsolved_4x4_string, test_unsolved_16x16_string]:
+            unsolved = convert_board(string)
+            sudoku = Sudoku(unsolved)
+            self.assertEqual(sudoku.solved_set, set(range(1, len(unsolved) + 1)))
+            solved = sudoku.solve_board()
+            self.assertTrue(sudoku._is_solved(solved))
+            for row_unsolved, row_solved in zip(unsolved, solved):
+                for value, answer in zip(row_unsolved, row_solved):
+                    if value:
+                        self.assertEqual(value, answer)
+
@@ -0,0 +1,63 @@
+import cv2
+from django.test import SimpleTestCase
+import numpy as np
+import os
+import tempfile
+import unittest
+
+from ..benchmarks import CORNER_TOLERANCE, benchmark_synthetic
+from ..pipeline import locate_puzzle
+from ..synthetic import LABELS_FILE, random_params, read_dataset, render_puzzle, write_dataset
+
+
+########################################################################################################################
+# Global Variables
+grid = [[(3 * row + row // 3 + col) % 9 + 1 if (row + col) % 3 else 0 for col in range(9)] for row in range(9)]
+########################################################################################################################
+
+
+class SyntheticTestCase(SimpleTestCase):
+
+    # @unittest.skip("Skipping this test method")
+    def test_random_params(self):
+        """Parameters depend only on the seed and keep the grid inside the photo."""
+        self.assertEqual(random_params(np.random.default_rng(4)), random_params(np.random.default_rng(4)))
+        for seed in range(200):
+            params = random_params(np.random.default_rng(seed))
+            corners = np.array(params.corners)
+            self.assertTrue(((corners > 0) & (corners < 1)).all())
+            self.assertTrue(480 <= max(params.width, params.height) < 2000)
+
+    # @unittest.skip("Skipping this test method")
+    def test_render_puzzle(self):
+        """Renders are JPEGs of the sampled size with the grid at the given corners."""
+        params = random_params(np.random.default_rng(7))._replace(blur=0.0, noise=0.0, gradient=0.0)
+        rendered = render_puzzle(grid, params)
+        img = cv2.imdecode(np.frombuffer(rendered.data, np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(img.shape, (params.height, params.width, 3))
+        self.assertEqual(rendered.grid, grid)
+
+        located = locate_puzzle(rendered.data)
+        side = np.linalg.norm(rendered.corners[3] - rendered.corners[0]) / np.sqrt(2)
+        self.assertLessEqual(np.abs(located.border.reshape(4, 2) - rendered.corners).max(), side * CORNER_TOLERANCE)
+
+    # @unittest.skip("Skipping this test method")
+    def test_write_dataset(self):
+        """Datasets hold an image and a label per grid, the same for any number of threads."""
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            self.assertEqual(write_dataset(first, [grid] * 4, seed=2, workers=1), 4)
+            write_dataset(second, [grid] * 4, seed=2, workers=3)
+            labels = list(read_dataset(first))
+            self.assertEqual([label["file"] for label in labels], ["000000.jpg", "000001.jpg", "000002.jpg", "000003.jpg"])
+            self.assertEqual(labels[0]["grid"], grid)
+            self.assertEqual(labels[0]["corners"].shape, (4, 2))
+            for label in labels:
+                with open(label["path"], "rb") as a, open(os.path.join(second, label["file"]), "rb") as b:
+                    self.assertEqual(a.read(), b.read())
+            self.assertEqual(len(list(read_dataset(first, 2))), 2)
+            with open(os.path.join(first, LABELS_FILE)) as a, open(os.path.join(second, LABELS_FILE)) as b:
+                self.assertEqual(a.read(), b.read())
+
+            result = benchmark_synthetic(first)
+            self.assertEqual(result["count"], 4)
+            self.assertIsNone(result["cell_accuracy"])
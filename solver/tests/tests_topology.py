@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase
+import numpy as np
+import unittest
+
+from ..topology import (
+    CELL_UNIT_INDEX,
+    CELL_UNITS,
+    PEER_INDEX,
+    PEERS,
+    UNIT_INDEX,
+    UNITS,
+    box_size_for,
+    get_topology,
+)
+
+
+class TopologyTestCase(SimpleTestCase):
+
+    # @unittest.skip("Skipping this test method")
+    def test_tables(self):
+        """Every cell belongs to three units and has twenty peers."""
+        self.assertEqual(len(UNITS), 27)
+        self.assertTrue(all(len(unit) == 9 for unit in UNITS))
+        self.assertTrue(all(len(peers) == 20 for peers in PEERS))
+        self.assertEqual(CELL_UNITS[80], (8, 8, 8))
+        self.assertEqual(CELL_UNITS[30], (3, 3, 4))
+        for idx, units in enumerate(CELL_UNIT_INDEX):
+            for unit in units:
+                self.assertIn(idx, UNITS[unit])
+
+    # @unittest.skip("Skipping this test method")
+    def test_index_arrays(self):
+        """Numpy index arrays mirror the tuples and are read only."""
+        self.assertEqual(UNIT_INDEX.shape, (27, 9))
+        self.assertEqual(PEER_INDEX.shape, (81, 20))
+        self.assertEqual(CELL_UNIT_INDEX.shape, (81, 3))
+        self.assertTrue(np.array_equal(PEER_INDEX, np.array(PEERS)))
+        self.assertEqual(CELL_UNIT_INDEX[30].tolist(), [3, 12, 22])
+        with self.assertRaises(ValueError):
+            UNIT_INDEX[0, 0] = 1
+
+    # @unittest.skip("Skipping this test method")
+    def test_get_topology(self):
+        """Tables scale with box size and unsupported sizes raise ValueError."""
+        for box_size in [2, 3, 4, 5]:
+            topo = get_topology(box_size)
+            size = box_size * box_size
+            self.assertEqual(topo.unit_index.shape, (3 * size, size))
+            self.assertEqual(topo.peer_index.shape, (size * size, 3 * size - 2 * box_size - 1))
+            self.assertEqual(topo.full_mask.bit_count(), size)
+            self.assertEqual(box_size_for(size), box_size)
+        self.assertIs(get_topology(3).units, UNITS)
+        with self.assertRaises(ValueError):
+            get_topology(6)
+        with self.assertRaises(ValueError):
+            box_size_for(8)
@@ -0,0 +1,120 @@
+import asyncio
+import cv2
+from django.test import SimpleTestCase
+import json
+import numpy as np
+import os
+import unittest
+
+from ..pipeline import PipelineError
+from ..stream import stream_application, stream_options
+from ..tracking import GridTracker
+from ..utilities import convert_file_to_nparray, downscale_image
+
+#############################################################################
+# Global Variables
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+unsolved_path = os.path.join(BASE_DIR, "data/puzzles/3.jpg")
+#############################################################################
+
+
+def run_stream(messages, query_string=b""):
+    """Send websocket events to the stream application and return what it sent back, disconnecting after its first reply."""
+    sent = []
+
+    async def main():
+        events = asyncio.Queue()
+        for message in [{"type": "websocket.connect"}] + messages:
+            events.put_nowait(message)
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "websocket.send":
+                events.put_nowait({"type": "websocket.disconnect"})
+
+        scope = {"type": "websocket", "path": "/api/v1/stream/", "query_string": query_string}
+        await asyncio.wait_for(stream_application(scope, events.get, send), 30)
+
+    asyncio.run(main())
+    return sent
+
+
+class GridTrackerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        with open(unsolved_path, "rb") as file:
+            img = convert_file_to_nparray(file.read())
+        img, scale = downscale_image(img, 480)
+        self.frame = cv2.copyMakeBorder(img, 60, 60, 60, 60, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+        border = np.array([[[44, 215]], [[1873, 215]], [[44, 1848]], [[1873, 1847]]], dtype=np.float32)
+        self.corners = border * scale + 60
+
+    def moved(self, angle, tx, ty):
+        """Return frame rotated and shifted, with its matrix as a homography."""
+        height, width = self.frame.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        matrix[:, 2] += (tx, ty)
+        frame = cv2.warpAffine(self.frame, matrix, (width, height), borderValue=(255, 255, 255))
+        return frame, np.vstack([matrix, [0, 0, 1]])
+
+    # @unittest.skip("Skipping this test method")
+    def test_track(self):
+        """Corners follow the grid through small camera moves."""
+        tracker = GridTracker()
+        tracker.reset(cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY), self.corners)
+        self.assertGreater(len(tracker.points), 20)
+        for step in range(1, 11):
+            frame, matrix = self.moved(0.5 * step, 3 * step, -2 * step)
+            corners = tracker.track(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            self.assertIsNotNone(corners)
+            expected = cv2.perspectiveTransform(self.corners, matrix)
+            self.assertLess(np.abs(corners - expected).max(), 2)
+
+    # @unittest.skip("Skipping this test method")
+    def test_track_lost(self):
+        """Tracking stops when the grid leaves the frame."""
+        tracker = GridTracker()
+        tracker.reset(cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY), self.corners)
+        blank = np.full(self.frame.shape[:2], 255, np.uint8)
+        self.assertIsNone(tracker.track(blank))
+
+    # @unittest.skip("Skipping this test method")
+    def test_process_without_grid(self):
+        """Frames without a grid raise PipelineError and clear the tracked grid."""
+        tracker = GridTracker()
+        tracker.reset(cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY), self.corners)
+        tracker.keyframe_interval = 0
+        with self.assertRaises(PipelineError) as context:
+            tracker.process(np.full_like(self.frame, 255))
+        self.assertEqual(context.exception.message, "Failed to find borders of sudoku puzzle.")
+        self.assertIsNone(tracker.corners)
+
+
+class StreamTestCase(SimpleTestCase):
+
+    # @unittest.skip("Skipping this test method")
+    def test_stream_options(self):
+        """Query string options are parsed and checked."""
+        options = stream_options(b"format=JPG&quality=60&keyframe_interval=10")
+        self.assertEqual(options["format"], "jpeg")
+        self.assertEqual(options["quality"], 60)
+        self.assertEqual(options["keyframe_interval"], 10)
+        for query in [b"format=gif", b"quality=0", b"max_dimension=-1", b"keyframe_interval=0"]:
+            with self.assertRaises(ValueError):
+                stream_options(query)
+
+    # @unittest.skip("Skipping this test method")
+    def test_stream_rejects_options(self):
+        """Invalid options close the websocket before accepting it."""
+        sent = run_stream([], b"format=gif")
+        self.assertEqual(sent, [{"type": "websocket.close", "code": 1008}])
+
+    # @unittest.skip("Skipping this test method")
+    def test_stream_unreadable_frame(self):
+        """Unreadable frames are answered with a JSON status."""
+        sent = run_stream([{"type": "websocket.receive", "bytes": b"not an image"}])
+        self.assertEqual(sent[0], {"type": "websocket.accept"})
+        response_data = json.loads(sent[1]["text"])
+        self.assertEqual(response_data["frame"], 1)
+        self.assertEqual(response_data["status"], 400)
+        self.assertEqual(response_data["message"], "Invalid file type, image must be a JPEG or PNG file.")
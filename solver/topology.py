@@ -0,0 +1,103 @@
+from functools import lru_cache
+import numpy as np
+from typing import NamedTuple, Tuple
+
+
+########################################################################
+# supported boxes are 2x2 (4x4 board) up to 5x5 (25x25 board)
+SUPPORTED_BOX_SIZES = (2, 3, 4, 5)
+########################################################################
+
+
+class Topology(NamedTuple):
+    """Index tables of a board with box_size x box_size squares.
+
+    Cell indexes run row-major from 0 to size**2 - 1, units are numbered
+    rows 0 to size - 1, cols size to 2 * size - 1, then squares.
+    """
+
+    box_size: int
+    size: int
+    n_cells: int
+    # bitmask of digits 1 to size, bit n set for digit n
+    full_mask: int
+    rows: Tuple[Tuple[int, ...], ...]
+    cols: Tuple[Tuple[int, ...], ...]
+    squares: Tuple[Tuple[int, ...], ...]
+    units: Tuple[Tuple[int, ...], ...]
+    # (row, col, square) of each cell
+    cell_units: Tuple[Tuple[int, int, int], ...]
+    # the other cells sharing a unit with each cell
+    peers: Tuple[Tuple[int, ...], ...]
+    # numpy index arrays for gather/reduce over flat boards
+    unit_index: np.ndarray
+    peer_index: np.ndarray
+    cell_unit_index: np.ndarray
+
+
+@lru_cache(maxsize=None)
+def get_topology(box_size: int = 3) -> Topology:
+    """Build (once) the index tables of a board with the given box size."""
+    if box_size not in SUPPORTED_BOX_SIZES:
+        raise ValueError(f"Box size must be one of {SUPPORTED_BOX_SIZES}.")
+    b = box_size
+    size = b * b
+    rows = tuple(tuple(size * i + j for j in range(size)) for i in range(size))
+    cols = tuple(tuple(size * i + j for i in range(size)) for j in range(size))
+    squares = tuple(
+        tuple(size * (b * (k // b) + i) + b * (k % b) + j for i in range(b) for j in range(b))
+        for k in range(size)
+    )
+    cell_units = tuple(
+        (idx // size, idx % size, b * (idx // (size * b)) + (idx % size) // b)
+        for idx in range(size * size)
+    )
+    peers = tuple(
+        tuple(sorted(set(rows[r] + cols[c] + squares[s]) - {idx}))
+        for idx, (r, c, s) in enumerate(cell_units)
+    )
+
+    unit_index = np.array(rows + cols + squares, dtype=np.intp)
+    peer_index = np.array(peers, dtype=np.intp)
+    cell_unit_index = np.array(cell_units, dtype=np.intp) + np.array([0, size, 2 * size], dtype=np.intp)
+    for array in (unit_index, peer_index, cell_unit_index):
+        array.flags.writeable = False
+
+    return Topology(
+        box_size=b,
+        size=size,
+        n_cells=size * size,
+        full_mask=(1 << (size + 1)) - 2,
+        rows=rows,
+        cols=cols,
+        squares=squares,
+        units=rows + cols + squares,
+        cell_units=cell_units,
+        peers=peers,
+        unit_index=unit_index,
+        peer_index=peer_index,
+        cell_unit_index=cell_unit_index,
+    )
+
+
+def box_size_for(size: int) -> int:
+    """Return box size of a board with size rows, or raise ValueError."""
+    for box_size in SUPPORTED_BOX_SIZES:
+        if box_size * box_size == size:
+            return box_size
+    raise ValueError(f"Board size {size} is not supported.")
+
+
+########################################################################
+# standard 9x9 board
+_standard = get_topology(3)
+ROWS = _standard.rows
+COLS = _standard.cols
+SQUARES = _standard.squares
+UNITS = _standard.units
+CELL_UNITS = _standard.cell_units
+PEERS = _standard.peers
+UNIT_INDEX = _standard.unit_index
+PEER_INDEX = _standard.peer_index
+CELL_UNIT_INDEX = _standard.cell_unit_index
+########################################################################
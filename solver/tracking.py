@@ -0,0 +1,124 @@
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from .pipeline import PipelineError, locate_image, solve_grid
+from .utilities import display_numbers, downscale_image, get_prediction_model, overlay_solution, predict_batch
+
+
+########################################################################
+# fewest tracked points a homography is fitted from
+TRACK_MIN_POINTS = 12
+# features are detected again once fewer points are left
+TRACK_REFRESH_POINTS = 60
+# features detected inside the grid
+TRACK_MAX_POINTS = 200
+########################################################################
+
+
+class GridTracker:
+    """Follow a solved grid across video frames.
+
+    Keyframes run grid detection and digit recognition, and solve only when
+    the recognized digits change. Frames in between move the grid corners
+    with a homography fitted to optical flow of points inside the grid, and
+    only the overlay is redrawn.
+    """
+
+    def __init__(self, model=None, keyframe_interval: int = 30, max_dimension: int = 0):
+        self.model = model
+        self.keyframe_interval = keyframe_interval
+        self.max_dimension = max_dimension
+        self.unsolved: Optional[List[List[int]]] = None
+        self.solved: Optional[List[List[int]]] = None
+        self.mask: Optional[np.ndarray] = None
+        self.gray: Optional[np.ndarray] = None
+        self.corners: Optional[np.ndarray] = None
+        self.points: Optional[np.ndarray] = None
+        self.since_keyframe = 0
+
+    def process(self, frame: np.ndarray) -> Tuple[np.ndarray, Dict]:
+        """Return frame with the solution drawn on it and what was done, raise PipelineError without a solved grid."""
+        frame, _ = downscale_image(frame, self.max_dimension)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        corners = None
+        if (
+            self.corners is not None
+            and self.since_keyframe < self.keyframe_interval
+            and gray.shape == self.gray.shape
+        ):
+            corners = self.track(gray)
+
+        info = {"keyframe": corners is None}
+        if corners is None:
+            try:
+                info.update(self.keyframe(frame, gray))
+            except PipelineError:
+                self.corners = None
+                raise
+        else:
+            self.since_keyframe += 1
+
+        img_ans = overlay_solution(frame, self.mask, self.corners, frame.shape[:-1])
+        info["corners"] = self.corners.reshape(4, 2).round(1).tolist()
+        return img_ans, info
+
+    def keyframe(self, frame: np.ndarray, gray: np.ndarray) -> Dict:
+        """Detect and read the grid, solving it again only when its digits changed."""
+        located = locate_image(frame)
+        if self.model is None:
+            self.model = get_prediction_model()
+        try:
+            values, _ = predict_batch(np.stack(located.cells), self.model)
+        except Exception as e:
+            raise PipelineError("Failed to predict every square of the puzzle.", str(e))
+        unsolved = values.reshape(9, 9).tolist()
+
+        info = {"grid_confidence": round(located.confidence, 4)}
+        if unsolved != self.unsolved or self.mask is None or self.mask.shape != frame.shape:
+            solved = solve_grid(unsolved)
+            self.unsolved, self.solved = unsolved, solved
+            self.mask = display_numbers(unsolved, solved, frame.shape[:-1])
+            info.update({"unsolved": unsolved, "solved": solved})
+        self.reset(gray, located.border)
+        return info
+
+    def reset(self, gray: np.ndarray, corners: np.ndarray) -> None:
+        """Start tracking corners, in reorder order, from this frame."""
+        self.gray = gray
+        self.corners = np.float32(corners).reshape(4, 1, 2)
+        self.points = self.features(gray, self.corners)
+        self.since_keyframe = 0
+
+    def track(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """Move the corners to this frame, None when too few points follow one homography."""
+        if self.points is None or len(self.points) < TRACK_MIN_POINTS:
+            return None
+        points, status, _ = cv2.calcOpticalFlowPyrLK(
+            self.gray, gray, self.points, None, winSize=(21, 21), maxLevel=3
+        )
+        found = status.ravel() == 1
+        if found.sum() < TRACK_MIN_POINTS:
+            return None
+        matrix, inliers = cv2.findHomography(self.points[found], points[found], cv2.RANSAC, 3.0)
+        if matrix is None or inliers.sum() < TRACK_MIN_POINTS:
+            return None
+        corners = cv2.perspectiveTransform(self.corners, matrix)
+        # outline order is top left, top right, bottom right, bottom left
+        if not cv2.isContourConvex(corners[[0, 1, 3, 2]]):
+            return None
+
+        self.gray = gray
+        self.corners = corners
+        self.points = points[found][inliers.ravel() == 1].reshape(-1, 1, 2)
+        if len(self.points) < TRACK_REFRESH_POINTS:
+            self.points = self.features(gray, corners)
+        return corners
+
+    @staticmethod
+    def features(gray: np.ndarray, corners: np.ndarray) -> Optional[np.ndarray]:
+        """Return points worth tracking inside the grid, mostly line crossings and digit strokes."""
+        mask = np.zeros(gray.shape, np.uint8)
+        cv2.fillConvexPoly(mask, corners[[0, 1, 3, 2]].reshape(-1, 2).round().astype(np.int32), 255)
+        return cv2.goodFeaturesToTrack(gray, TRACK_MAX_POINTS, 0.01, 7, mask=mask)
@@ -1,6 +1,12 @@
 from django.urls import path
-from .views import Sudoku_API
+from .views import Grid_Cache_API, Job_API, Job_Result_API, Jobs_API, Portfolio_API, Sudoku_API, Sudoku_Batch_API
 
 urlpatterns = [
     path('solve/', Sudoku_API.as_view() ,name='solve'),
+    path('solve/batch/', Sudoku_Batch_API.as_view() ,name='solve-batch'),
+    path('cache/', Grid_Cache_API.as_view() ,name='grid-cache'),
+    path('portfolio/', Portfolio_API.as_view() ,name='portfolio'),
+    path('jobs/', Jobs_API.as_view() ,name='jobs'),
+    path('jobs/<uuid:job_id>/', Job_API.as_view() ,name='job'),
+    path('jobs/<uuid:job_id>/result/', Job_Result_API.as_view() ,name='job-result'),
 ]
\ No newline at end of file
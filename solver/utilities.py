@@ -1,5 +1,6 @@
 import copy
 import cv2
+from functools import lru_cache
 from keras.models import load_model, Model
 from io import BytesIO
 import matplotlib.pyplot as plt
@@ -16,22 +17,34 @@ img_height = 450
 img_width = 450
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 model_path = os.path.join(BASE_DIR, "solver/model_trained_10_3.keras")
+# extension, content type and quality flag of each response image format
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+    "png": (".png", "image/png", None),
+}
+# largest contours tested for a four sided grid outline
+GRID_CANDIDATES = 10
+# grids found with lower confidence are checked against the grid lines
+GRID_MIN_CONFIDENCE = 0.9
+# longest side of the image searched for grid lines
+GRID_HOUGH_DIMENSION = 600
 ########################################################################
 
 
 # find biggest contour
 def biggest_contour(contours: List[np.ndarray]) -> np.ndarray:
-    biggest = np.array([])
-    max_area = 0
-    for i in contours:
-        area = cv2.contourArea(i)
-        if area > 50:
-            peri = cv2.arcLength(i, True)
-            approx = cv2.approxPolyDP(i, 0.02 * peri, True)
-            if area > max_area and len(approx) == 4:
-                biggest = approx
-                max_area = area
-    return biggest
+    # largest first, so the first four sided contour is the biggest
+    areas = np.array([cv2.contourArea(i) for i in contours])
+    for k in np.argsort(-areas, kind="stable"):
+        if areas[k] <= 50:
+            break
+        i = contours[k]
+        peri = cv2.arcLength(i, True)
+        approx = cv2.approxPolyDP(i, 0.02 * peri, True)
+        if len(approx) == 4:
+            return approx
+    return np.array([])
 
 
 # convert file into numpy array
@@ -40,8 +53,62 @@ def convert_file_to_nparray(file) -> np.ndarray:
 
 
 # convert image from numpy array into jpg
-def convert_nparray_to_jpg(input: np.ndarray):
-    return cv2.imencode(".jpg", input)[1].tobytes()
+def convert_nparray_to_jpg(input: np.ndarray, quality: int | None = None):
+    return encode_image(input, "jpeg", quality)[0]
+
+
+# shrink image so its longest side is at most max_dimension, returns image and scale applied
+def downscale_image(img: np.ndarray, max_dimension: int | None) -> Tuple[np.ndarray, float]:
+    longest = max(img.shape[:2])
+    if not max_dimension or longest <= max_dimension:
+        return img, 1.0
+    scale = max_dimension / longest
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+
+# encode image from numpy array as jpeg, webp or png, returns bytes and content type
+def encode_image(
+    img: np.ndarray, image_format: str = "jpeg", quality: int | None = None
+) -> Tuple[bytes, str]:
+    extension, content_type, quality_flag = IMAGE_FORMATS[image_format]
+    params = []
+    if quality is not None and quality_flag is not None:
+        params = [quality_flag, int(quality)]
+    return cv2.imencode(extension, img, params)[1].tobytes(), content_type
+
+
+# render digits 1-9 once per color and cell size, cropped to their bounding boxes, empty when too small to show
+@lru_cache(maxsize=32)
+def glyph_atlas(color: Tuple[int], cell_size: Tuple[float]) -> List[Tuple[int, int, np.ndarray]]:
+    cell_width, cell_height = cell_size
+    width = int(img_width / 9)
+    height = int(img_height / 9)
+    atlas = [None]
+    for digit in range(1, 10):
+        # draw as display_numbers did on its 450x450 canvas, then scale like its final resize
+        tile = np.zeros((height, width, 3), np.uint8)
+        cv2.putText(
+            tile,
+            str(digit),
+            (int(width / 2) - 10, int(0.8 * height)),
+            cv2.FONT_HERSHEY_COMPLEX_SMALL,
+            2,
+            color,
+            2,
+            cv2.LINE_AA,
+        )
+        tile = cv2.resize(tile, (max(round(cell_width), 1), max(round(cell_height), 1)))
+        ys, xs = np.nonzero(tile.any(axis=2))
+        if not len(ys):
+            # cells of a few pixels leave no ink after resizing
+            glyph = np.zeros((0, 0, 3), np.uint8)
+            glyph.flags.writeable = False
+            atlas.append((0, 0, glyph))
+            continue
+        glyph = tile[ys.min() : ys.max() + 1, xs.min() : xs.max() + 1].copy()
+        glyph.flags.writeable = False
+        atlas.append((int(ys.min()), int(xs.min()), glyph))
+    return atlas
 
 
 # display solution on puzzle
@@ -51,28 +118,114 @@ def display_numbers(
     original_size: Tuple[int],
     color: List[int] = (0, 255, 0),
 ) -> np.ndarray:
-    temp = np.zeros((img_height, img_width, 3), np.uint8)
-    width = int(temp.shape[1] / 9)
-    height = int(temp.shape[0] / 9)
+    out_width, out_height = original_size
+    temp = np.zeros((out_height, out_width, 3), np.uint8)
+    cell_width = out_width / 9
+    cell_height = out_height / 9
+    atlas = glyph_atlas(tuple(int(c) for c in color), (cell_width, cell_height))
     for x in range(0, 9):
         for y in range(0, 9):
             prev = puzzle[y][x]
             if prev == 0:
-                val = str(solution[y][x])
-                cv2.putText(
-                    temp,
-                    val,
-                    (x * width + int(width / 2) - 10, int((y + 0.8) * height)),
-                    cv2.FONT_HERSHEY_COMPLEX_SMALL,
-                    2,
-                    color,
-                    2,
-                    cv2.LINE_AA,
-                )
-    temp = cv2.resize(temp, original_size)
+                dy, dx, glyph = atlas[solution[y][x]]
+                top = round(y * cell_height) + dy
+                left = round(x * cell_width) + dx
+                region = temp[top : top + glyph.shape[0], left : left + glyph.shape[1]]
+                region[...] = glyph[: region.shape[0], : region.shape[1]]
     return temp
 
 
+# find grid corners among the largest contours, falling back to grid lines, returns corners and confidence
+def detect_grid(img_proc: np.ndarray, top_k: int = GRID_CANDIDATES) -> Tuple[np.ndarray, float]:
+    contours = find_contours(img_proc)
+    areas = np.array([cv2.contourArea(i) for i in contours])
+    order = np.argsort(-areas, kind="stable")[:top_k]
+    if not len(order) or areas[order[0]] <= 50:
+        raise ValueError("No sudoku grid found.")
+    largest = areas[order[0]]
+
+    # grid line support, discounted for quads much smaller than the largest contour
+    def confidence_of(corners):
+        coverage = min(cv2.contourArea(reorder(corners)[[0, 1, 3, 2]]) / largest, 1.0)
+        return grid_confidence(corners, img_proc) * coverage
+
+    best, best_confidence = np.array([]), 0.0
+    for k in order:
+        if areas[k] <= 50:
+            break
+        peri = cv2.arcLength(contours[k], True)
+        approx = cv2.approxPolyDP(contours[k], 0.02 * peri, True)
+        if len(approx) == 4:
+            best, best_confidence = approx, confidence_of(approx)
+            break
+    if best_confidence < GRID_MIN_CONFIDENCE:
+        # outline is broken or not a grid, intersect the grid lines inside the largest contour
+        lines = hough_grid(img_proc, cv2.boundingRect(contours[order[0]]))
+        if lines is not None:
+            confidence = confidence_of(lines)
+            if confidence > best_confidence:
+                best, best_confidence = lines, confidence
+    if not best.size:
+        raise ValueError("No sudoku grid found.")
+    return best, best_confidence
+
+
+# share of the 10 horizontal and 10 vertical grid lines found on thresholded pixels once warped
+def grid_confidence(corners: np.ndarray, img_proc: np.ndarray) -> float:
+    pts1 = np.float32(reorder(np.asarray(corners)))
+    pts2 = np.float32([[0, 0], [img_width, 0], [0, img_height], [img_width, img_height]])
+    matrix = cv2.getPerspectiveTransform(pts1, pts2)
+    warped = cv2.warpPerspective(img_proc, matrix, (img_width, img_height), flags=cv2.INTER_NEAREST) > 0
+    # tolerate lines a few pixels off their place, photos bend the paper
+    band = 2
+    positions = np.linspace(0, img_height - 1, 10).round().astype(int)
+    rows = [warped[max(p - band, 0) : p + band + 1].any(axis=0) for p in positions]
+    positions = np.linspace(0, img_width - 1, 10).round().astype(int)
+    cols = [warped[:, max(p - band, 0) : p + band + 1].any(axis=1) for p in positions]
+    return float(np.mean(rows + cols))
+
+
+# find corners where the outermost horizontal and vertical lines inside rect meet, None if too few lines
+def hough_grid(img_proc: np.ndarray, rect: Tuple[int] | None = None) -> np.ndarray | None:
+    height, width = img_proc.shape[:2]
+    x, y, w, h = rect if rect is not None else (0, 0, width, height)
+    # long lines survive downscaling and the transform is much cheaper
+    scale = min(1.0, GRID_HOUGH_DIMENSION / max(w, h))
+    small = img_proc[y : y + h, x : x + w]
+    if scale < 1.0:
+        small = cv2.resize(small, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        small = np.where(small > 64, 255, 0).astype(np.uint8)
+    min_length = min(small.shape[:2]) // 3
+    lines = cv2.HoughLinesP(small, 1, np.pi / 180, min_length, minLineLength=min_length, maxLineGap=min_length // 10)
+    if lines is None:
+        return None
+    lines = lines.reshape(-1, 4).astype(float) / scale + [x, y, x, y]
+    dx = lines[:, 2] - lines[:, 0]
+    dy = lines[:, 3] - lines[:, 1]
+    horizontal = lines[np.abs(dx) > 2 * np.abs(dy)]
+    vertical = lines[np.abs(dy) > 2 * np.abs(dx)]
+    if len(horizontal) < 2 or len(vertical) < 2:
+        return None
+    # rank lines by where they cross the middle of rect
+    h_pos = horizontal[:, 1] + (x + w / 2 - horizontal[:, 0]) * (horizontal[:, 3] - horizontal[:, 1]) / (horizontal[:, 2] - horizontal[:, 0])
+    v_pos = vertical[:, 0] + (y + h / 2 - vertical[:, 1]) * (vertical[:, 2] - vertical[:, 0]) / (vertical[:, 3] - vertical[:, 1])
+    top, bottom = horizontal[np.argmin(h_pos)], horizontal[np.argmax(h_pos)]
+    left, right = vertical[np.argmin(v_pos)], vertical[np.argmax(v_pos)]
+
+    corners = []
+    for p, q in [(top, left), (bottom, left), (bottom, right), (top, right)]:
+        x1, y1, x2, y2 = p
+        x3, y3, x4, y4 = q
+        denominator = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+        a = x1 * y2 - y1 * x2
+        b = x3 * y4 - y3 * x4
+        corners.append(((a * (x3 - x4) - (x1 - x2) * b) / denominator, (a * (y3 - y4) - (y1 - y2) * b) / denominator))
+    corners = np.array(corners).round().reshape(4, 1, 2)
+    corners[..., 0] = corners[..., 0].clip(0, width - 1)
+    corners[..., 1] = corners[..., 1].clip(0, height - 1)
+    return corners.astype(np.int32)
+
+
 # find contours
 def find_contours(img: np.ndarray) -> List[np.ndarray]:
     contours, _ = cv2.findContours(img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -81,10 +234,38 @@ def find_contours(img: np.ndarray) -> List[np.ndarray]:
 
 # predict value of each cell
 def get_prediction(boxes: List[np.ndarray], model: Model) -> List[int]:
-    result_lst = [[] for _ in range(9)]
-    cells = []
+    result_lst, _, cells = predict_cells(boxes, model)
+    return result_lst, cells
+
+
+# predict value and confidence of each cell in one batch, cells already made by prepare_cells skip preparing
+def predict_cells(
+    boxes: List[np.ndarray], model: Model, cells: List[np.ndarray] | None = None
+) -> Tuple[List[List[int]], List[List[float]], List[np.ndarray]]:
+    if cells is None:
+        cells = prepare_cells(boxes)
+    values, confidences = predict_batch(np.stack(cells), model)
+    result_lst = values.reshape(9, 9).tolist()
+    confidences = confidences.reshape(9, 9).astype(float).tolist()
+    return result_lst, confidences, cells
+
+
+# predict values of stacked 32x32 cells, any number of puzzles at once, 0 below 0.8 confidence
+def predict_batch(cells: np.ndarray, model: Model) -> Tuple[np.ndarray, np.ndarray]:
     tf.get_logger().setLevel('ERROR')
-    for idx, image in enumerate(boxes):
+    batch = cells.reshape(-1, 32, 32, 1)
+    with tf.device('/cpu:0'):
+        pred = model.predict(batch, verbose=0)
+    prob_idx = np.argmax(pred, axis=1)
+    prob_hgh = pred[np.arange(len(pred)), prob_idx]
+    values = np.where(prob_hgh > 0.8, prob_idx + 1, 0)
+    return values, prob_hgh
+
+
+# crop, threshold and scale cells to the 32x32 model input
+def prepare_cells(boxes: List[np.ndarray]) -> List[np.ndarray]:
+    cells = []
+    for image in boxes:
         img = np.asarray(image)
         height, width = img.shape[0], img.shape[1]
         h_ten, w_ten = height // 7, width // 7
@@ -95,18 +276,7 @@ def get_prediction(boxes: List[np.ndarray], model: Model) -> List[int]:
         img = cv2.resize(img, (32, 32))
         img = img / 255
         cells.append(img)
-        img = img.reshape(1, 32, 32, 1)
-        # pred = model.predict(img)
-        with tf.device('/cpu:0'): 
-            pred = model.predict(img, verbose=0)
-        prob_idx = np.argmax(pred, axis=1)
-        prob_hgh = pred[0, prob_idx][0]
-        row = idx // 9
-        if prob_hgh > 0.8:
-            result_lst[row].append(int(prob_idx[0] + 1))
-        else:
-            result_lst[row].append(0)
-    return result_lst, cells
+    return cells
 
 
 # create model
@@ -114,6 +284,12 @@ def initialize_prediction_model() -> Model:
     return load_model(model_path)
 
 
+# load model once per process and share it between requests
+@lru_cache(maxsize=1)
+def get_prediction_model() -> Model:
+    return initialize_prediction_model()
+
+
 # overlay solution
 def overlay_solution(
     original: np.ndarray,
@@ -122,15 +298,23 @@ def overlay_solution(
     original_size: List[int],
 ) -> np.ndarray:
     orig_width, orig_height = original_size
-    temp_mask = copy.deepcopy(mask)
-    temp_orig = copy.deepcopy(original)
     pts2 = np.float32(border)
     pts1 = np.float32(
         [[0, 0], [orig_width, 0], [0, orig_height], [orig_width, orig_height]]
     )
     matrix = cv2.getPerspectiveTransform(pts1, pts2)
-    temp_mask = cv2.warpPerspective(temp_mask, matrix, (orig_height, orig_width))
-    img_ans = cv2.addWeighted(temp_mask, 1, temp_orig, 0.6, 1)
+    # dim the whole photo, same as cv2.addWeighted(mask, 1, original, 0.6, 1) where the mask is black
+    img_ans = cv2.convertScaleAbs(original, alpha=0.6, beta=1)
+    # warp and add the mask only inside the bounding box of the grid
+    height, width = img_ans.shape[:2]
+    x, y, w, h = cv2.boundingRect(pts2.reshape(-1, 2))
+    x0, y0 = max(x - 1, 0), max(y - 1, 0)
+    x1, y1 = min(x + w + 1, width), min(y + h + 1, height)
+    if x1 > x0 and y1 > y0:
+        shift = np.float64([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]])
+        roi_mask = cv2.warpPerspective(mask, shift @ matrix, (x1 - x0, y1 - y0))
+        roi = img_ans[y0:y1, x0:x1]
+        cv2.add(roi, roi_mask, dst=roi)
     return img_ans
 
 
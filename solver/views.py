@@ -1,30 +1,123 @@
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+from io import BytesIO
 import json
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.views import APIView
 import signal
+from typing import Optional
+import zipfile
 
-from .sudoku_solver import solve_board
+from .admission import read_upload
+from .cache import get_grid_cache, grid_key
+from .engines import SearchLimit, SearchStats
+from .jobs import job_status, queue_metrics, result_path, submit_grids, submit_photos
+from .journal import journal_request, journal_stages, mark_stage
+from .models import Job
+from .pipeline import PipelineError, archive_name, solve_batch
+from .portfolio import portfolio_stats
+from .profiling import profile_request
+from .sudoku_solver import Sudoku, solve_board
 from .utilities import (
-    biggest_contour,
     convert_file_to_nparray,
-    convert_nparray_to_jpg,
+    detect_grid,
     display_numbers,
-    find_contours,
-    get_prediction,
-    initialize_prediction_model,
+    downscale_image,
+    encode_image,
+    get_prediction_model,
     overlay_solution,
     perspective_warp,
+    predict_cells,
+    prepare_cells,
     preprocess_image,
     reorder,
     split_boxes,
 )
 
+########################################################################
+# response format names and the content types that select them
+FORMAT_NAMES = {"json": "json", "jpeg": "jpeg", "jpg": "jpeg", "webp": "webp", "png": "png"}
+ACCEPT_TYPES = {
+    "application/json": "json",
+    "image/jpeg": "jpeg",
+    "image/jpg": "jpeg",
+    "image/webp": "webp",
+    "image/png": "png",
+}
+########################################################################
+
+
+class SolutionContentNegotiation(DefaultContentNegotiation):
+    """Leave the Accept header and format parameter to the view instead of DRF renderers."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def accepted_format(accept: str) -> Optional[str]:
+    """Return format of the supported type with the highest q in an Accept header, the first listed on ties.
+
+    Types with q=0 or a malformed q are never chosen, None when no supported type is acceptable.
+    """
+    best, best_q = None, 0.0
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        if media_type.lower() not in ACCEPT_TYPES:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = ACCEPT_TYPES[media_type.lower()], q
+    return best
+
+
+def get_response_options(request) -> dict:
+    """Read format, quality and max_dimension from request parameters or Accept header, raise ValueError if invalid."""
+
+    def param(name):
+        value = request.query_params.get(name)
+        if value is None:
+            value = request.data.get(name)
+        return value
+
+    image_format = param("format")
+    if image_format is not None:
+        if image_format.lower() not in FORMAT_NAMES:
+            raise ValueError(f"Format must be one of {sorted(FORMAT_NAMES)}.")
+        image_format = FORMAT_NAMES[image_format.lower()]
+    else:
+        image_format = accepted_format(request.META.get("HTTP_ACCEPT", "")) or "jpeg"
+
+    quality = param("quality")
+    quality = settings.SOLVER_IMAGE_QUALITY if quality is None else int(quality)
+    if not 1 <= quality <= 100:
+        raise ValueError("Quality must be between 1 and 100.")
+
+    max_dimension = param("max_dimension")
+    max_dimension = settings.SOLVER_MAX_DIMENSION if max_dimension is None else int(max_dimension)
+    if max_dimension < 0:
+        raise ValueError("Max dimension must not be negative.")
+
+    return {"format": image_format, "quality": quality, "max_dimension": max_dimension}
+
 
 class Sudoku_API(APIView):
+    content_negotiation_class = SolutionContentNegotiation
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.model = initialize_prediction_model()
+        # loaded once per worker process
+        self.model = get_prediction_model()
 
+    @journal_request
+    @profile_request
     def post(self, request):
         response_data = {
             "message": "",
@@ -63,10 +156,34 @@ class Sudoku_API(APIView):
                     status=400,
                 )
 
+            # print("Options")
+            try:
+                # response format, quality and size
+                options = get_response_options(request)
+            except Exception as e:
+                response_data["message"] = "Invalid response options."
+                response_data["error"] = str(e)
+                return HttpResponse(
+                    json.dumps(response_data),
+                    status=400,
+                )
+
+            # print("Admit")
+            try:
+                # check image header and size before reading the whole file
+                puzzle_read = read_upload(puzzle)
+            except PipelineError as e:
+                response_data["message"] = e.message
+                response_data["error"] = e.error
+                return HttpResponse(
+                    json.dumps(response_data),
+                    status=e.status,
+                )
+            mark_stage(request, "admit")
+
             # print("Convert")
             try:
                 # convert image into nparray
-                puzzle_read = puzzle.read()
                 img = convert_file_to_nparray(puzzle_read)
             except Exception as e:
                 response_data["message"] = "Failed to convert file to numpy array."
@@ -75,6 +192,7 @@ class Sudoku_API(APIView):
                     json.dumps(response_data),
                     status=400,
                 )
+            mark_stage(request, "decode")
 
             # print("Process")
             try:
@@ -90,10 +208,8 @@ class Sudoku_API(APIView):
 
             # print("Border")
             try:
-                # find contours
-                contours = find_contours(img_proc)
                 # find outer border
-                border = biggest_contour(contours)
+                border, grid_confidence = detect_grid(img_proc)
                 border = reorder(border)
             except Exception as e:
                 response_data["message"] = "Failed to find borders of sudoku puzzle."
@@ -107,8 +223,9 @@ class Sudoku_API(APIView):
             try:
                 # apply perspective shift
                 img_persp = perspective_warp(border, img)
-                # split puzzle into cells
+                # split puzzle into cells, prepared once for the cache key and the model
                 cells = split_boxes(img_persp)
+                prepared = prepare_cells(cells)
             except Exception as e:
                 response_data["message"] = "Failed to locate each square of the puzzle."
                 response_data["error"] = str(e)
@@ -116,37 +233,98 @@ class Sudoku_API(APIView):
                     json.dumps(response_data),
                     status=400,
                 )
+            mark_stage(request, "locate")
 
-            # print("Predict")
-            try:
-                # extract unsolved puzzle
-                unsolved, _ = get_prediction(cells, self.model)
-            except Exception as e:
-                response_data["message"] = (
-                    "Failed to predict every square of the puzzle."
-                )
-                response_data["error"] = str(e)
-                return HttpResponse(
-                    json.dumps(response_data),
-                    status=400,
-                )
+            # print("Cache")
+            # grids solved before skip prediction and solving
+            cache = get_grid_cache()
+            cached = None
+            if cache is not None:
+                key = grid_key(img_persp, prepared)
+                cached = cache.lookup(key)
+                response_data["cache"] = "miss" if cached is None else "hit"
+            mark_stage(request, "cache")
 
-            # print("Solve")
-            try:
-                # solve board
-                solved = solve_board(unsolved)
-                if solved is None:
-                    raise ValueError("Puzzle input could not be solved")
-            except Exception as e:
-                response_data["message"] = "Puzzle unsolvable."
-                response_data["error"] = str(e)
+            if cached is not None:
+                unsolved, confidences, solved = cached.unsolved, cached.confidences, cached.solved
+            else:
+                # print("Predict")
+                try:
+                    # extract unsolved puzzle
+                    unsolved, confidences, _ = predict_cells(cells, self.model, prepared)
+                except Exception as e:
+                    response_data["message"] = (
+                        "Failed to predict every square of the puzzle."
+                    )
+                    response_data["error"] = str(e)
+                    return HttpResponse(
+                        json.dumps(response_data),
+                        status=400,
+                    )
+                mark_stage(request, "predict")
+
+                # print("Conflicts")
+                # reject puzzles with repeated digits before searching
+                conflicts = Sudoku.find_conflicts(unsolved)
+                if conflicts:
+                    response_data["message"] = "Puzzle contains conflicting digits."
+                    response_data["error"] = (
+                        f"Conflicting cells (row, col): {conflicts}"
+                    )
+                    response_data["conflicts"] = conflicts
+                    return HttpResponse(
+                        json.dumps(response_data),
+                        status=400,
+                    )
+
+                # print("Solve")
+                try:
+                    # solve board, counting the search
+                    stats = SearchStats()
+                    solved = solve_board(unsolved, settings.SOLVER_ENGINE, stats, settings.SOLVER_MAX_NODES or None)
+                    response_data["search_stats"] = stats.as_dict()
+                    if solved is None:
+                        raise ValueError("Puzzle input could not be solved")
+                except SearchLimit as e:
+                    response_data["message"] = "Puzzle took too long to solve."
+                    response_data["error"] = str(e)
+                    response_data["search_stats"] = stats.as_dict()
+                    return HttpResponse(
+                        json.dumps(response_data),
+                        status=503,
+                    )
+                except Exception as e:
+                    response_data["message"] = "Puzzle unsolvable."
+                    response_data["error"] = str(e)
+                    return HttpResponse(
+                        json.dumps(response_data),
+                        status=400,
+                    )
+                mark_stage(request, "solve")
+
+                if cache is not None:
+                    cache.store(key, unsolved, solved, confidences)
+
+            if options["format"] == "json":
+                # grids only, skip rendering
+                response_data["message"] = "Puzzle solved."
+                response_data["unsolved"] = unsolved
+                response_data["solved"] = solved
+                response_data["confidences"] = [
+                    [round(value, 4) for value in row] for row in confidences
+                ]
+                response_data["grid_confidence"] = round(grid_confidence, 4)
                 return HttpResponse(
                     json.dumps(response_data),
-                    status=400,
+                    content_type="application/json",
+                    status=200,
                 )
 
             # print("Overlay")
             try:
+                # shrink before rendering when a smaller image was asked for
+                img, scale = downscale_image(img, options["max_dimension"])
+                border = (border * scale).astype(border.dtype)
                 # overlay solution to input image
                 img_mask = display_numbers(unsolved, solved, img.shape[:-1])
                 img_ans = overlay_solution(img, img_mask, border, img.shape[:-1])
@@ -161,10 +339,14 @@ class Sudoku_API(APIView):
 
             # print("Convert back")
             try:
-                # convert from np.ndarray to jpg
-                img_jpg = convert_nparray_to_jpg(img_ans)
+                # convert from np.ndarray to requested image format
+                img_out, content_type = encode_image(
+                    img_ans, options["format"], options["quality"]
+                )
             except Exception as e:
-                response_data["message"] = "Failed to convert solved puzzle into JPG."
+                response_data["message"] = (
+                    f"Failed to convert solved puzzle into {options['format'].upper()}."
+                )
                 response_data["error"] = str(e)
                 return HttpResponse(
                     json.dumps(response_data),
@@ -172,7 +354,11 @@ class Sudoku_API(APIView):
                 )
             
             # signal.alarm(0)
-            return HttpResponse(img_jpg, content_type="image/jpeg", status=200)
+            mark_stage(request, "render")
+            response = HttpResponse(img_out, content_type=content_type, status=200)
+            if "cache" in response_data:
+                response["X-Grid-Cache"] = response_data["cache"]
+            return response
         
         # except TimeoutError as e:
         #     response_data["message"] = "Timeout exceeded."
@@ -188,3 +374,250 @@ class Sudoku_API(APIView):
 
     # def handler(self, signum, frame):
     #     raise TimeoutError("Timeout exceeded")
+
+
+class Sudoku_Batch_API(APIView):
+    content_negotiation_class = SolutionContentNegotiation
+
+    @journal_request
+    @profile_request
+    def post(self, request):
+        response_data = {
+            "message": "",
+            "error": "",
+        }
+        try:
+            # get images from request
+            puzzles = request.FILES.getlist("puzzle")
+            if not puzzles:
+                response_data["message"] = "Puzzle file not supplied."
+                response_data["error"] = (
+                    "User must supply one or more images of unsolved sudoku puzzles."
+                )
+                return HttpResponse(
+                    json.dumps(response_data),
+                    status=400,
+                )
+
+            # reject oversized batches
+            if len(puzzles) > settings.SOLVER_BATCH_MAX_FILES:
+                response_data["message"] = "Too many puzzle files."
+                response_data["error"] = (
+                    f"At most {settings.SOLVER_BATCH_MAX_FILES} puzzles may be sent at once."
+                )
+                return HttpResponse(
+                    json.dumps(response_data),
+                    status=400,
+                )
+
+            try:
+                # response format, quality and size
+                options = get_response_options(request)
+            except Exception as e:
+                response_data["message"] = "Invalid response options."
+                response_data["error"] = str(e)
+                return HttpResponse(
+                    json.dumps(response_data),
+                    status=400,
+                )
+
+            # each result carries its own status, message and error
+            results = solve_batch(
+                [(puzzle.name, puzzle) for puzzle in puzzles],
+                get_prediction_model(),
+                options,
+                settings.SOLVER_BATCH_WORKERS or None,
+                get_grid_cache(),
+                journal_stages(request),
+            )
+            solved = sum(result["status"] == 200 for result in results)
+            response_data["message"] = f"Solved {solved} of {len(results)} puzzles."
+
+            if options["format"] == "json":
+                response_data["results"] = results
+                return HttpResponse(
+                    json.dumps(response_data),
+                    content_type="application/json",
+                    status=200,
+                )
+
+            # zip of solution images plus status.json describing every upload
+            archive = BytesIO()
+            with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zip_file:
+                for result in results:
+                    image = result.pop("image", None)
+                    result.pop("content_type", None)
+                    if image is not None:
+                        result["file"] = archive_name(result["index"], result["name"], options["format"])
+                        zip_file.writestr(result["file"], image)
+                response_data["results"] = results
+                zip_file.writestr("status.json", json.dumps(response_data))
+
+            response = HttpResponse(archive.getvalue(), content_type="application/zip", status=200)
+            response["Content-Disposition"] = 'attachment; filename="solutions.zip"'
+            return response
+
+        except Exception as e:
+            response_data["message"] = "Unexpected error."
+            response_data["error"] = str(e)
+            return HttpResponse(
+                json.dumps(response_data),
+                status=500,
+            )
+
+
+class Grid_Cache_API(APIView):
+    def get(self, request):
+        # hit rate and verification counters of this process
+        cache = get_grid_cache()
+        if cache is None:
+            return HttpResponse(
+                json.dumps({"message": "Grid cache disabled.", "error": ""}),
+                content_type="application/json",
+                status=404,
+            )
+        return HttpResponse(
+            json.dumps(cache.stats()),
+            content_type="application/json",
+            status=200,
+        )
+
+
+class Portfolio_API(APIView):
+    def get(self, request):
+        # head start, race, timeout and win counters of this process
+        return HttpResponse(
+            json.dumps(portfolio_stats.stats()),
+            content_type="application/json",
+            status=200,
+        )
+
+
+class Jobs_API(APIView):
+    content_negotiation_class = SolutionContentNegotiation
+
+    def post(self, request):
+        response_data = {
+            "message": "",
+            "error": "",
+        }
+        try:
+            puzzles = request.FILES.getlist("puzzle")
+            grids = None if puzzles else request.data.get("grids")
+            if not puzzles and grids is None:
+                response_data["message"] = "Puzzles not supplied."
+                response_data["error"] = (
+                    "User must supply images of unsolved sudoku puzzles or a list of grids."
+                )
+                return HttpResponse(
+                    json.dumps(response_data),
+                    status=400,
+                )
+
+            if puzzles:
+                # reject oversized jobs
+                if len(puzzles) > settings.SOLVER_JOB_MAX_FILES:
+                    response_data["message"] = "Too many puzzle files."
+                    response_data["error"] = (
+                        f"At most {settings.SOLVER_JOB_MAX_FILES} puzzles may be sent in one job."
+                    )
+                    return HttpResponse(
+                        json.dumps(response_data),
+                        status=400,
+                    )
+                try:
+                    # response format, quality and size of the results
+                    options = get_response_options(request)
+                except Exception as e:
+                    response_data["message"] = "Invalid response options."
+                    response_data["error"] = str(e)
+                    return HttpResponse(
+                        json.dumps(response_data),
+                        status=400,
+                    )
+                job = submit_photos([(puzzle.name, puzzle) for puzzle in puzzles], options)
+            else:
+                if not isinstance(grids, list) or len(grids) > settings.SOLVER_JOB_MAX_GRIDS:
+                    response_data["message"] = "Invalid grids."
+                    response_data["error"] = (
+                        f"Grids must be a list of at most {settings.SOLVER_JOB_MAX_GRIDS} board strings."
+                    )
+                    return HttpResponse(
+                        json.dumps(response_data),
+                        status=400,
+                    )
+                try:
+                    job = submit_grids(grids, request.data.get("engine"))
+                except ValueError as e:
+                    response_data["message"] = "Invalid grids."
+                    response_data["error"] = str(e)
+                    return HttpResponse(
+                        json.dumps(response_data),
+                        status=400,
+                    )
+
+            response_data["message"] = "Job queued."
+            response_data["job"] = job_status(job)
+            response_data["url"] = reverse("job", args=[job.id])
+            return HttpResponse(
+                json.dumps(response_data),
+                content_type="application/json",
+                status=202,
+            )
+
+        except Exception as e:
+            response_data["message"] = "Unexpected error."
+            response_data["error"] = str(e)
+            return HttpResponse(
+                json.dumps(response_data),
+                status=500,
+            )
+
+    def get(self, request):
+        # queue depth and throughput of every worker
+        return HttpResponse(
+            json.dumps(queue_metrics()),
+            content_type="application/json",
+            status=200,
+        )
+
+
+class Job_API(APIView):
+    def get(self, request, job_id):
+        job = Job.objects.filter(id=job_id).first()
+        if job is None:
+            return HttpResponse(
+                json.dumps({"message": "Job not found.", "error": "Job may have expired."}),
+                content_type="application/json",
+                status=404,
+            )
+        response_data = job_status(job)
+        if job.status == Job.DONE:
+            response_data["result_url"] = reverse("job-result", args=[job.id])
+        return HttpResponse(
+            json.dumps(response_data),
+            content_type="application/json",
+            status=200,
+        )
+
+
+class Job_Result_API(APIView):
+    def get(self, request, job_id):
+        job = Job.objects.filter(id=job_id).first()
+        if job is None:
+            return HttpResponse(
+                json.dumps({"message": "Job not found.", "error": "Job may have expired."}),
+                content_type="application/json",
+                status=404,
+            )
+        path = result_path(job)
+        if path is None:
+            return HttpResponse(
+                json.dumps({"message": f"Job is {job.status}.", "error": job.error}),
+                content_type="application/json",
+                status=409,
+            )
+        # same body as the batch endpoint, a zip of solution images or its json
+        if path.endswith(".zip"):
+            return FileResponse(open(path, "rb"), as_attachment=True, filename="solutions.zip", content_type="application/zip")
+        return FileResponse(open(path, "rb"), content_type="application/json")